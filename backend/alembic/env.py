@@ -63,6 +63,14 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # The application passes its own connection when migrating at startup
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     # For SQLite, we need to use a sync engine for alembic
     # Update the URL to use sqlite instead of sqlite+aiosqlite
     sqlalchemy_url = config.get_main_option("sqlalchemy.url")
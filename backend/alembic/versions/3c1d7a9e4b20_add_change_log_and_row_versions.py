@@ -0,0 +1,47 @@
+"""Add change log and row versions for incremental sync
+
+Revision ID: 3c1d7a9e4b20
+Revises: 9592e005a278
+Create Date: 2026-10-19 09:12:41.518203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "3c1d7a9e4b20"
+down_revision: Union[str, None] = "9592e005a278"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SYNCED_TABLES = ("groups", "messages", "blacklisted_chats")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "change_log",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("row_id", sa.Integer(), nullable=False),
+        sa.Column("operation", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sqlite_autoincrement=True,
+    )
+    for table in SYNCED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column("version", sa.Integer(), nullable=False, server_default="0")
+            )
+            batch_op.create_index(f"ix_{table}_version", ["version"], unique=False)
+
+
+def downgrade() -> None:
+    for table in SYNCED_TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_index(f"ix_{table}_version")
+            batch_op.drop_column("version")
+    op.drop_table("change_log")
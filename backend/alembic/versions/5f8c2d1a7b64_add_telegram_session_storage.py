@@ -0,0 +1,76 @@
+"""Add Telegram session, peer and username tables
+
+Revision ID: 5f8c2d1a7b64
+Revises: e41a6b3d8f07
+Create Date: 2026-10-19 14:26:11.318402
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "5f8c2d1a7b64"
+down_revision: Union[str, None] = "e41a6b3d8f07"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "telegram_sessions",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("dc_id", sa.Integer(), nullable=False),
+        sa.Column("api_id", sa.Integer(), nullable=True),
+        sa.Column("test_mode", sa.Boolean(), nullable=True),
+        sa.Column("auth_key", sa.LargeBinary(), nullable=True),
+        sa.Column("date", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=True),
+        sa.Column("is_bot", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_table(
+        "telegram_peers",
+        sa.Column("session_name", sa.String(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column("access_hash", sa.BigInteger(), nullable=True),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("phone_number", sa.String(), nullable=True),
+        sa.Column("last_update_on", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("session_name", "id"),
+    )
+    op.create_index(
+        op.f("ix_telegram_peers_username"), "telegram_peers", ["username"], unique=False
+    )
+    op.create_index(
+        op.f("ix_telegram_peers_phone_number"),
+        "telegram_peers",
+        ["phone_number"],
+        unique=False,
+    )
+    op.create_table(
+        "telegram_usernames",
+        sa.Column("session_name", sa.String(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("peer_id", sa.BigInteger(), nullable=False),
+        sa.Column("last_update_on", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("session_name", "username"),
+    )
+    op.create_index(
+        op.f("ix_telegram_usernames_peer_id"),
+        "telegram_usernames",
+        ["peer_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_telegram_usernames_peer_id"), table_name="telegram_usernames")
+    op.drop_table("telegram_usernames")
+    op.drop_index(op.f("ix_telegram_peers_phone_number"), table_name="telegram_peers")
+    op.drop_index(op.f("ix_telegram_peers_username"), table_name="telegram_peers")
+    op.drop_table("telegram_peers")
+    op.drop_table("telegram_sessions")
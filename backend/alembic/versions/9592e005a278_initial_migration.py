@@ -20,12 +20,57 @@ depends_on: Union[str, Sequence[str], None] = None
 
 
 def upgrade() -> None:
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.create_table(
+        "groups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("identifier", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_groups_id", "groups", ["id"], unique=False)
+    op.create_index("ix_groups_identifier", "groups", ["identifier"], unique=True)
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_messages_id", "messages", ["id"], unique=False)
+    op.create_table(
+        "blacklisted_chats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("chat_id", sa.String(), nullable=False),
+        sa.Column("reason", sa.String(), nullable=False),
+        sa.Column("is_permanent", sa.Boolean(), nullable=True),
+        sa.Column("expiry_time", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_blacklisted_chats_id", "blacklisted_chats", ["id"], unique=False)
+    op.create_index(
+        "ix_blacklisted_chats_chat_id", "blacklisted_chats", ["chat_id"], unique=True
+    )
+    op.create_table(
+        "config",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("value", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_config_id", "config", ["id"], unique=False)
+    op.create_index("ix_config_key", "config", ["key"], unique=True)
 
 
 def downgrade() -> None:
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_index("ix_config_key", table_name="config")
+    op.drop_index("ix_config_id", table_name="config")
+    op.drop_table("config")
+    op.drop_index("ix_blacklisted_chats_chat_id", table_name="blacklisted_chats")
+    op.drop_index("ix_blacklisted_chats_id", table_name="blacklisted_chats")
+    op.drop_table("blacklisted_chats")
+    op.drop_index("ix_messages_id", table_name="messages")
+    op.drop_table("messages")
+    op.drop_index("ix_groups_identifier", table_name="groups")
+    op.drop_index("ix_groups_id", table_name="groups")
+    op.drop_table("groups")
@@ -0,0 +1,32 @@
+"""Add engine snapshots table for warm restarts
+
+Revision ID: a2d94c6e1f38
+Revises: 5f8c2d1a7b64
+Create Date: 2026-10-19 15:48:37.620914
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "a2d94c6e1f38"
+down_revision: Union[str, None] = "5f8c2d1a7b64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "engine_snapshots",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("engine_snapshots")
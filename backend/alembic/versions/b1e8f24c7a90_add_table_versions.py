@@ -0,0 +1,31 @@
+"""Add shared table versions for cached reads
+
+Revision ID: b1e8f24c7a90
+Revises: d5a7c3e91b46
+Create Date: 2026-10-20 09:14:27.318045
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b1e8f24c7a90"
+down_revision: Union[str, None] = "d5a7c3e91b46"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "table_versions",
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("table_name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("table_versions")
@@ -0,0 +1,52 @@
+"""Add control commands and engine state for multi-worker deployments
+
+Revision ID: b7e2f04c91d5
+Revises: 3c1d7a9e4b20
+Create Date: 2026-10-19 11:40:06.227481
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "b7e2f04c91d5"
+down_revision: Union[str, None] = "3c1d7a9e4b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "control_commands",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("command", sa.String(), nullable=False),
+        sa.Column("arguments", sa.Text(), nullable=True),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("result", sa.Text(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_control_commands_id", "control_commands", ["id"], unique=False)
+    op.create_index(
+        "ix_control_commands_status", "control_commands", ["status"], unique=False
+    )
+    op.create_table(
+        "engine_state",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("leader_id", sa.String(), nullable=False),
+        sa.Column("state", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("engine_state")
+    op.drop_index("ix_control_commands_status", table_name="control_commands")
+    op.drop_index("ix_control_commands_id", table_name="control_commands")
+    op.drop_table("control_commands")
@@ -0,0 +1,33 @@
+"""Add schema info table for the startup schema check
+
+Revision ID: c8f31e5b9a72
+Revises: a2d94c6e1f38
+Create Date: 2026-10-19 17:21:09.335870
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c8f31e5b9a72"
+down_revision: Union[str, None] = "a2d94c6e1f38"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "schema_info",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("revision", sa.String(), nullable=False),
+        sa.Column("fingerprint", sa.String(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("schema_info")
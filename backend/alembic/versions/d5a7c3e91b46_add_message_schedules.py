@@ -0,0 +1,36 @@
+"""Add schedule columns to messages
+
+Revision ID: d5a7c3e91b46
+Revises: f3b96a2c5d18
+Create Date: 2026-10-19 21:12:06.483519
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "d5a7c3e91b46"
+down_revision: Union[str, None] = "f3b96a2c5d18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("messages") as batch_op:
+        batch_op.add_column(sa.Column("send_at", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("recurrence", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("active_from", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("active_until", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("last_run_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages") as batch_op:
+        batch_op.drop_column("last_run_at")
+        batch_op.drop_column("active_until")
+        batch_op.drop_column("active_from")
+        batch_op.drop_column("recurrence")
+        batch_op.drop_column("send_at")
@@ -0,0 +1,31 @@
+"""Add rate limits table for the shared rate limiter
+
+Revision ID: e41a6b3d8f07
+Revises: b7e2f04c91d5
+Create Date: 2026-10-19 13:02:55.904116
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e41a6b3d8f07"
+down_revision: Union[str, None] = "b7e2f04c91d5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rate_limits",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("tat", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rate_limits")
@@ -0,0 +1,28 @@
+"""Add the cycle position to engine snapshots
+
+Revision ID: e9c4a7d2b583
+Revises: b1e8f24c7a90
+Create Date: 2026-10-20 11:02:45.610392
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "e9c4a7d2b583"
+down_revision: Union[str, None] = "b1e8f24c7a90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("engine_snapshots") as batch_op:
+        batch_op.add_column(sa.Column("last_group_id", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("engine_snapshots") as batch_op:
+        batch_op.drop_column("last_group_id")
@@ -0,0 +1,98 @@
+"""Add canonical group keys and merge duplicate groups
+
+Revision ID: f3b96a2c5d18
+Revises: c8f31e5b9a72
+Create Date: 2026-10-19 18:40:52.107744
+
+"""
+
+import datetime
+import re
+from typing import Dict, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "f3b96a2c5d18"
+down_revision: Union[str, None] = "c8f31e5b9a72"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of app.core.validation.canonical_group_key at this revision
+TELEGRAM_LINK_PATTERN = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:t|telegram)\.me/"
+    r"(?:(?:\+|joinchat/)(?P<invite>[\w-]+)|c/(?P<channel>\d+)|(?P<username>\w+))",
+    re.IGNORECASE,
+)
+
+
+def canonical_group_key(identifier: str) -> str:
+    value = identifier.strip()
+    link = TELEGRAM_LINK_PATTERN.match(value)
+    if link:
+        if link.group("invite"):
+            return f"invite:{link.group('invite')}"
+        if link.group("channel"):
+            return f"id:-100{link.group('channel')}"
+        return f"username:{link.group('username').lower()}"
+    if value.startswith("@"):
+        return f"username:{value[1:].rstrip('/').lower()}"
+    digits = value.lstrip("-")
+    if digits.isdigit():
+        return f"id:{'-' if digits != value else ''}{int(digits)}"
+    return f"raw:{value}"
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("groups") as batch_op:
+        batch_op.add_column(sa.Column("canonical_key", sa.String(), nullable=True))
+
+    connection = op.get_bind()
+    groups = sa.table(
+        "groups",
+        sa.column("id", sa.Integer),
+        sa.column("identifier", sa.String),
+        sa.column("canonical_key", sa.String),
+    )
+    change_log = sa.table(
+        "change_log",
+        sa.column("table_name", sa.String),
+        sa.column("row_id", sa.Integer),
+        sa.column("operation", sa.String),
+        sa.column("created_at", sa.DateTime),
+    )
+
+    # The oldest group of each key is kept, later duplicates are merged into it
+    kept: Dict[str, int] = {}
+    rows = connection.execute(
+        sa.select(groups.c.id, groups.c.identifier).order_by(groups.c.id)
+    ).all()
+    for group_id, identifier in rows:
+        key = canonical_group_key(identifier)
+        if key in kept:
+            connection.execute(sa.delete(groups).where(groups.c.id == group_id))
+            # Tombstone so incrementally syncing clients drop the duplicate
+            connection.execute(
+                sa.insert(change_log).values(
+                    table_name="groups",
+                    row_id=group_id,
+                    operation="delete",
+                    created_at=datetime.datetime.utcnow(),
+                )
+            )
+            continue
+        kept[key] = group_id
+        connection.execute(
+            sa.update(groups).where(groups.c.id == group_id).values(canonical_key=key)
+        )
+
+    with op.batch_alter_table("groups") as batch_op:
+        batch_op.alter_column("canonical_key", existing_type=sa.String(), nullable=False)
+        batch_op.create_index("ix_groups_canonical_key", ["canonical_key"], unique=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("groups") as batch_op:
+        batch_op.drop_index("ix_groups_canonical_key")
+        batch_op.drop_column("canonical_key")
@@ -3,19 +3,55 @@ API Routes Module
 Contains all API routes for the Telegram Userbot TMA
 """
 
-from fastapi import APIRouter, HTTPException, Request
-from typing import List, Optional
-from pydantic import BaseModel, field_validator
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import BaseModel, field_validator, model_validator
 from ..core.userbot import TelegramUserbot
+from ..core import validation
 from ..core.api_error_handler import handle_api_errors
 from ..core.rate_limiter import limiter, DEFAULT_LIMIT
+from ..core.webapp_auth import WebAppAuthError, webapp_auth
+from ..core.event_bus import event_bus
+from ..core.read_cache import read_cache
+from ..core.serialization import (
+    FastJSONResponse,
+    compressed_response,
+    dumps,
+    rows_to_dicts,
+)
+from ..core.database import SessionLocal, engine
+from ..core.control import engine_control
+from ..core.logging_config import get_log_levels, set_log_levels
+from ..core.config import settings
+from ..core.loop_monitor import loop_monitor
+from ..core.profiler import ProfilerBusyError, collapsed_text, memory_diff, sample_stacks
+from ..core.query_stats import query_metrics
+from ..core.tracing import tracer
+from ..core.leader import LeaderElection, create_leader_lock
+from ..core.base_repository import BaseRepository
+from ..core.repository import (
+    GroupRepository,
+    MessageRepository,
+    BlacklistRepository,
+    ConfigRepository,
+    ChangeLogRepository,
+)
 
 # Create router
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 # Global userbot instance (in a real implementation, this would be dependency injected)
 userbot: Optional[TelegramUserbot] = None
 
+# Election deciding which worker owns the Telegram client and posting engine
+engine_election: Optional[LeaderElection] = None
+
+# Seconds between keep-alive comments on idle event streams
+SSE_KEEPALIVE_INTERVAL = 15.0
+
 
 # Pydantic models for request/response
 class AuthRequest(BaseModel):
@@ -27,18 +63,24 @@ class PasswordAuthRequest(BaseModel):
     password: str
 
 
+class WebAppAuthRequest(BaseModel):
+    init_data: str
+
+    @field_validator('init_data')
+    @classmethod
+    def validate_init_data(cls, v):
+        if not v or len(v) > 4096:
+            raise ValueError('initData must be between 1 and 4096 characters')
+        return v
+
+
 class GroupRequest(BaseModel):
     identifier: str
 
     @field_validator('identifier')
     @classmethod
     def validate_group_identifier(cls, v):
-        if len(v) > 255:
-            raise ValueError('Group identifier must be at most 255 characters')
-        # Basic validation for group identifier format
-        if not (v.startswith('https://t.me/') or v.startswith('@') or v.lstrip('-').isdigit()):
-            raise ValueError('Group identifier must be a valid group link, username, or ID')
-        return v
+        return validation.validate_group_identifier(v)
 
 
 class BulkGroupsRequest(BaseModel):
@@ -49,36 +91,40 @@ class BulkGroupsRequest(BaseModel):
     def validate_group_identifiers(cls, v):
         if len(v) > 100:  # Limit bulk operations
             raise ValueError('Cannot add more than 100 groups at once')
-        for identifier in v:
-            if len(identifier) > 255:
-                raise ValueError('Each group identifier must be at most 255 characters')
-            if not (identifier.startswith('https://t.me/') or identifier.startswith('@') or identifier.lstrip('-').isdigit()):
-                raise ValueError('Each group identifier must be a valid group link, username, or ID')
-        return v
+        return validation.validate_group_identifiers(v)
 
 
 class MessageRequest(BaseModel):
     text: str
+    # Optional schedule; times without a timezone are UTC
+    send_at: Optional[datetime] = None
+    recurrence: Optional[str] = None
+    active_from: Optional[datetime] = None
+    active_until: Optional[datetime] = None
 
     @field_validator('text')
     @classmethod
     def validate_message_text(cls, v):
-        if not v or len(v) > 4096:  # Telegram message limit is 4096 characters
-            raise ValueError('Message text must be between 1 and 4096 characters')
-        
-        # Check for potential harmful content
-        import re
-        harmful_patterns = [
-            r'<script',  # Potential XSS
-            r'javascript:',  # Potential XSS
-            r'on\w+\s*=',  # Potential event handlers
-        ]
-        
-        for pattern in harmful_patterns:
-            if re.search(pattern, v, re.IGNORECASE):
-                raise ValueError('Message contains potentially harmful content')
-        
-        return v
+        return validation.validate_message_text(v)
+
+    @field_validator('send_at', 'active_from', 'active_until')
+    @classmethod
+    def validate_schedule_time(cls, v):
+        return validation.validate_schedule_time(v)
+
+    @field_validator('recurrence')
+    @classmethod
+    def validate_recurrence(cls, v):
+        return validation.validate_recurrence(v)
+
+    @model_validator(mode='after')
+    def validate_active_window(self):
+        validation.validate_active_window(self.active_from, self.active_until)
+        return self
+
+    def schedule(self) -> Dict[str, Any]:
+        """Schedule fields that are set"""
+        return self.model_dump(exclude={'text'}, exclude_none=True)
 
 
 class ConfigRequest(BaseModel):
@@ -88,20 +134,20 @@ class ConfigRequest(BaseModel):
     @field_validator('key')
     @classmethod
     def validate_config_key(cls, v):
-        if not v or len(v) > 100:
-            raise ValueError('Config key must be between 1 and 100 characters')
-        # Only allow alphanumeric, underscore, and hyphen
-        import re
-        if not re.match(r'^[a-zA-Z0-9_-]+$', v):
-            raise ValueError('Config key can only contain letters, numbers, underscores, and hyphens')
-        return v
+        return validation.validate_config_key(v)
 
     @field_validator('value')
     @classmethod
     def validate_config_value(cls, v):
-        if len(v) > 1000:
-            raise ValueError('Config value must be at most 1000 characters')
-        return v
+        return validation.validate_config_value(v)
+
+
+class LogLevelsRequest(BaseModel):
+    levels: Dict[str, str]
+
+
+class TracingRequest(BaseModel):
+    enabled: bool
 
 
 class BlacklistRequest(BaseModel):
@@ -112,53 +158,141 @@ class BlacklistRequest(BaseModel):
     @field_validator('chat_id')
     @classmethod
     def validate_chat_id(cls, v):
-        if not v or len(v) > 50:
-            raise ValueError('Chat ID must be between 1 and 50 characters')
-        # Should be a valid number for chat ID
-        try:
-            int(v.lstrip('-'))  # Telegram chat IDs can be negative (for supergroups)
-        except ValueError:
-            raise ValueError('Chat ID must be a valid integer (with optional negative sign)')
-        return v
+        return validation.validate_chat_id(v)
 
     @field_validator('reason')
     @classmethod
     def validate_reason(cls, v):
-        if not v or len(v) > 500:
-            raise ValueError('Reason must be between 1 and 500 characters')
-        return v
+        return validation.validate_reason(v)
 
     @field_validator('duration')
     @classmethod
     def validate_duration(cls, v):
-        if v is not None and v <= 0:
-            raise ValueError('Duration must be a positive integer if provided')
-        if v and v > 31536000:  # 1 year in seconds
-            raise ValueError('Duration cannot be more than 1 year')
-        return v
+        return validation.validate_duration(v)
 
 
 # Initialize userbot on startup
 async def initialize_userbot():
-    """Initialize userbot"""
-    global userbot
+    """
+    Initialize userbot
+
+    Every worker gets a userbot for database access, but only the elected
+    leader connects the Telegram client and runs the posting engine.
+    """
+    global userbot, engine_election
     userbot = TelegramUserbot()
+    engine_control.set_state_provider(_engine_state)
+    engine_election = LeaderElection(
+        create_leader_lock(engine), _become_leader, _step_down
+    )
+    engine_control.start(is_leader=False)
+    # Run the first round now so a single worker is ready immediately
+    await engine_election.check()
+    engine_election.start()
+
+
+async def _become_leader():
+    """Take ownership of the Telegram client and posting engine"""
+    engine_control.promote()
     try:
         await userbot.initialize()
         print("Userbot initialized successfully")
+        # Posting was running under the previous leader, so carry on
+        if userbot.resume_requested:
+            await userbot.start()
     except Exception as e:
         print(f"Error initializing userbot: {e}")
 
 
+async def _step_down():
+    """Release the Telegram client and posting engine"""
+    engine_control.demote()
+    if userbot:
+        await userbot.stop(suspend=True)
+
+
+def _engine_state() -> dict:
+    """Status snapshot published by the leader for other workers"""
+    running = bool(userbot and userbot.is_running)
+    return {
+        "running": running,
+        "user_info": userbot.auth.get_cached_me() if userbot and userbot.auth else None,
+        "message": "Userbot is running" if running else "Userbot is stopped",
+        "event_loop": loop_monitor.summary(),
+    }
+
+
 # Clean up on shutdown
 async def cleanup_userbot():
     """Clean up userbot"""
-    global userbot
-    if userbot:
-        await userbot.stop()
+    global userbot, engine_election
+    if engine_election:
+        await engine_election.stop()
+        await engine_control.stop()
+        engine_election = None
+    elif userbot:
+        await userbot.stop(suspend=True)
+
+
+# Engine commands, executed by the leader on behalf of any worker
+@engine_control.handler("send_code")
+async def _send_code():
+    if not userbot or not userbot.auth:
+        raise Exception("Userbot authentication not initialized")
+    return await userbot.auth.send_code()
+
+
+@engine_control.handler("sign_in")
+async def _sign_in(code: str, phone_code_hash: str):
+    if not userbot:
+        raise Exception("Userbot not initialized")
+    return await userbot.authenticate_new_session(code, phone_code_hash)
+
+
+@engine_control.handler("sign_in_password")
+async def _sign_in_password(password: str):
+    if not userbot:
+        raise Exception("Userbot not initialized")
+    return await userbot.authenticate_with_password(password)
+
+
+@engine_control.handler("start")
+async def _start():
+    if not userbot:
+        raise Exception("Userbot not initialized")
+    return await userbot.start()
+
+
+@engine_control.handler("stop")
+async def _stop():
+    if not userbot:
+        raise Exception("Userbot not initialized")
+    return await userbot.stop()
+
+
+@engine_control.handler("update_config")
+async def _update_config(key: str, value: str):
+    if not userbot:
+        raise Exception("Userbot not initialized")
+    return userbot.update_config(key, value)
+
+
+@engine_control.handler("set_log_levels")
+async def _set_log_levels(levels: Dict[str, str]):
+    return set_log_levels(levels)
 
 
 # Authentication endpoints
+@router.post("/auth/webapp")
+@limiter.limit("10/minute")  # More restrictive for auth endpoints
+async def webapp_login(request: Request, auth_request: WebAppAuthRequest):
+    """Exchange Telegram Mini App initData for a short-lived access token"""
+    try:
+        return webapp_auth.login(auth_request.init_data)
+    except WebAppAuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+
 @router.post("/auth/send-code")
 @limiter.limit("5/minute")  # More restrictive for auth endpoints
 @handle_api_errors
@@ -168,10 +302,10 @@ async def send_auth_code(request: Request):  # Note: request parameter is needed
     if not userbot:
         raise HTTPException(status_code=500, detail="Userbot not initialized")
     
-    if not userbot.auth:
+    if engine_control.is_leader and not userbot.auth:
         raise HTTPException(status_code=500, detail="Userbot authentication not initialized")
 
-    phone_code_hash = await userbot.auth.send_code()
+    phone_code_hash = await engine_control.dispatch("send_code")
     return {"phone_code_hash": phone_code_hash}
 
 
@@ -184,8 +318,10 @@ async def sign_in(request: Request, auth_request: AuthRequest):  # Note: request
     if not userbot:
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
-    await userbot.authenticate_new_session(
-        auth_request.code, auth_request.phone_code_hash
+    await engine_control.dispatch(
+        "sign_in",
+        code=auth_request.code,
+        phone_code_hash=auth_request.phone_code_hash,
     )
     return {"message": "Authentication successful"}
 
@@ -199,7 +335,9 @@ async def sign_in_password(request: Request, password_request: PasswordAuthReque
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        await userbot.authenticate_with_password(password_request.password)
+        await engine_control.dispatch(
+            "sign_in_password", password=password_request.password
+        )
         return {"message": "Authentication with password successful"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -215,7 +353,7 @@ async def start_userbot(request: Request):
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        await userbot.start()
+        await engine_control.dispatch("start")
         return {"message": "Userbot started successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -230,7 +368,7 @@ async def stop_userbot(request: Request):
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        await userbot.stop()
+        await engine_control.dispatch("stop")
         return {"message": "Userbot stopped successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -245,16 +383,67 @@ async def get_userbot_status(request: Request):
     if not userbot:
         return {"running": False, "message": "Userbot not initialized"}
 
-    user_info = await userbot.auth.get_me() if userbot.auth else None
+    # Only the leader holds the client; other workers report its heartbeat
+    if not engine_control.is_leader:
+        state = await engine_control.get_engine_state()
+        if state is None:
+            return {
+                "running": False,
+                "user_info": None,
+                "message": "Posting engine unavailable",
+            }
+        return state
+
+    user_info = userbot.auth.get_cached_me() if userbot.auth else None
     return {
         "running": userbot.is_running,
         "user_info": user_info,
         "message": (
             "Userbot is running" if userbot.is_running else "Userbot is stopped"
         ),
+        "event_loop": loop_monitor.summary(),
     }
 
 
+@router.get("/userbot/events")
+@limiter.limit(DEFAULT_LIMIT)
+async def stream_userbot_events(request: Request):
+    """
+    Stream status transitions, cycle progress and send events (SSE)
+
+    Workers other than the leader relay its events from the engine state
+    heartbeat, a few seconds behind.
+    """
+    global userbot
+    # Seed the bus with the current status so the stream starts with a snapshot
+    if event_bus.latest("status") is None:
+        if engine_control.is_leader:
+            state: Optional[dict] = _engine_state()
+        else:
+            state = await engine_control.get_engine_state()
+        if state is None:
+            state = {"running": False, "message": "Posting engine unavailable"}
+        event_bus.publish("status", running=state["running"], message=state["message"])
+
+    async def event_stream() -> AsyncIterator[str]:
+        subscription = event_bus.subscribe()
+        try:
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=SSE_KEEPALIVE_INTERVAL)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Group management endpoints
 @router.post("/groups")
 @limiter.limit(DEFAULT_LIMIT)
@@ -272,7 +461,7 @@ async def add_group(request: Request, group_request: GroupRequest):
 
 @router.post("/groups/bulk")
 @limiter.limit("20/minute")  # Limit bulk operations
-async def add_groups_bulk(request, bulk_request: BulkGroupsRequest):
+async def add_groups_bulk(request: Request, bulk_request: BulkGroupsRequest):
     """Add multiple groups to managed list"""
     global userbot
     if not userbot:
@@ -288,7 +477,7 @@ async def add_groups_bulk(request, bulk_request: BulkGroupsRequest):
 
 @router.delete("/groups/{identifier}")
 @limiter.limit(DEFAULT_LIMIT)
-async def remove_group(request, identifier: str):
+async def remove_group(request: Request, identifier: str):
     """Remove a group from managed list"""
     global userbot
     if not userbot:
@@ -302,21 +491,30 @@ async def remove_group(request, identifier: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# Fields returned for each list item
+GROUP_FIELDS = ("id", "identifier", "name")
+MESSAGE_FIELDS = ("id", "text", "send_at", "recurrence", "active_from", "active_until")
+CONFIG_FIELDS = ("key", "value", "description")
+BLACKLIST_FIELDS = ("id", "chat_id", "reason", "is_permanent", "expiry_time")
+
+
+def _load_groups() -> dict:
+    """Load all managed groups in a dedicated session"""
+    with SessionLocal() as db:
+        rows = GroupRepository(db).get_rows(GROUP_FIELDS)
+        return {"groups": rows_to_dicts(rows, GROUP_FIELDS)}
+
+
 @router.get("/groups")
 @limiter.limit(DEFAULT_LIMIT)
-async def get_groups(request):
+async def get_groups(request: Request):
     """Get all managed groups"""
     global userbot
     if not userbot:
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        groups = userbot.group_repo.get_all_groups()
-        return {
-            "groups": [
-                {"id": g.id, "identifier": g.identifier, "name": g.name} for g in groups
-            ]
-        }
+        return await read_cache.respond(request, "groups", ("groups",), _load_groups)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -331,7 +529,7 @@ async def add_message(request: Request, message_request: MessageRequest):
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        result = userbot.add_message(message_request.text)
+        result = userbot.add_message(message_request.text, **message_request.schedule())
         return {
             "message": (
                 "Message added successfully" if result else "Failed to add message"
@@ -343,7 +541,7 @@ async def add_message(request: Request, message_request: MessageRequest):
 
 @router.delete("/messages/{message_id}")
 @limiter.limit(DEFAULT_LIMIT)
-async def remove_message(request, message_id: int):
+async def remove_message(request: Request, message_id: int):
     """Remove a message from the queue"""
     global userbot
     if not userbot:
@@ -357,17 +555,25 @@ async def remove_message(request, message_id: int):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _load_messages() -> dict:
+    """Load all messages in a dedicated session"""
+    with SessionLocal() as db:
+        rows = MessageRepository(db).get_rows(MESSAGE_FIELDS)
+        return {"messages": rows_to_dicts(rows, MESSAGE_FIELDS)}
+
+
 @router.get("/messages")
 @limiter.limit(DEFAULT_LIMIT)
-async def get_messages(request):
+async def get_messages(request: Request):
     """Get all messages in the queue"""
     global userbot
     if not userbot:
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        messages = userbot.message_repo.get_all_messages()
-        return {"messages": [{"id": m.id, "text": m.text} for m in messages]}
+        return await read_cache.respond(
+            request, "messages", ("messages",), _load_messages
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -376,13 +582,20 @@ async def get_messages(request):
 @router.post("/config")
 @limiter.limit(DEFAULT_LIMIT)
 async def update_config(request: Request, config_request: ConfigRequest):
-    """Update configuration settings"""
+    """
+    Update configuration settings
+
+    Applied by the worker running the posting engine, which keeps the
+    intervals in memory.
+    """
     global userbot
     if not userbot:
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        result = userbot.update_config(config_request.key, config_request.value)
+        result = await engine_control.dispatch(
+            "update_config", key=config_request.key, value=config_request.value
+        )
         return {
             "message": (
                 "Configuration updated successfully"
@@ -394,26 +607,145 @@ async def update_config(request: Request, config_request: ConfigRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _load_config() -> dict:
+    """Load all configuration settings in a dedicated session"""
+    with SessionLocal() as db:
+        rows = ConfigRepository(db).get_rows(CONFIG_FIELDS)
+        return {"config": rows_to_dicts(rows, CONFIG_FIELDS)}
+
+
 @router.get("/config")
 @limiter.limit(DEFAULT_LIMIT)
-async def get_config(request):
+async def get_config(request: Request):
     """Get all configuration settings"""
     global userbot
     if not userbot:
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        configs = userbot.config_repo.get_all_configs()
-        return {
-            "config": [
-                {"key": c.key, "value": c.value, "description": c.description}
-                for c in configs
-            ]
-        }
+        return await read_cache.respond(request, "config", ("config",), _load_config)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _require_admin(request: Request) -> None:
+    """
+    Reject callers not listed as admins
+
+    Admins are identified by their Mini App user, so admin endpoints stay
+    closed while Mini App authentication is disabled.
+    """
+    if not webapp_auth.enabled or (
+        getattr(request.state, "telegram_user_id", None) not in settings.tma_admin_user_ids
+    ):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+# Logging endpoints
+@router.get("/logging/levels")
+@limiter.limit(DEFAULT_LIMIT)
+async def get_logging_levels(request: Request):
+    """Get the root log level and every logger with its own level"""
+    return {"levels": get_log_levels()}
+
+
+@router.put("/logging/levels")
+@limiter.limit(DEFAULT_LIMIT)
+async def update_logging_levels(request: Request, levels_request: LogLevelsRequest):
+    """
+    Change log levels at runtime, e.g. {"levels": {"app.core.userbot": "DEBUG"}}
+
+    Levels apply to this worker and to the worker running the posting engine.
+    """
+    _require_admin(request)
+    try:
+        levels = set_log_levels(levels_request.levels)
+        if not engine_control.is_leader:
+            await engine_control.dispatch("set_log_levels", levels=levels_request.levels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"levels": levels}
+
+
+# Admin profiling endpoints
+@router.post("/admin/profile/cpu")
+@limiter.limit("10/minute")
+async def profile_cpu(
+    request: Request,
+    seconds: float = Query(10.0, gt=0, le=60),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+):
+    """
+    Sample the stacks of all threads for some seconds
+
+    Returns collapsed stacks (`frame;frame;... count` per line), which
+    flamegraph.pl and speedscope render as a flame graph.
+    """
+    _require_admin(request)
+    try:
+        stacks = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        collapsed_text(stacks),
+        headers={"Content-Disposition": 'attachment; filename="profile.folded"'},
+    )
+
+
+@router.post("/admin/profile/memory")
+@limiter.limit("10/minute")
+async def profile_memory(
+    request: Request,
+    seconds: float = Query(30.0, ge=0, le=60),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Report the source lines whose allocations grew most over some seconds"""
+    _require_admin(request)
+    try:
+        return {"seconds": seconds, "top": await memory_diff(seconds, limit)}
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+# Metrics endpoints
+@router.get("/metrics")
+@limiter.limit(DEFAULT_LIMIT)
+async def get_metrics(request: Request):
+    """
+    Get this worker's runtime metrics
+
+    `queries` has SQL statement counts and time per request and per posting
+    cycle, with the number of scopes that repeated a statement (likely N+1).
+    `event_loop` has the scheduling lag and the stacks of recent callbacks
+    that blocked the loop.
+    """
+    _require_admin(request)
+    return {"queries": query_metrics.snapshot(), "event_loop": loop_monitor.snapshot()}
+
+
+# Tracing endpoints
+@router.get("/tracing/spans")
+@limiter.limit(DEFAULT_LIMIT)
+async def get_trace_spans(request: Request, clear: bool = Query(False)):
+    """
+    Export this worker's recorded spans as OTLP JSON
+
+    The response can be loaded into an OTLP-compatible trace viewer. With
+    `clear=true` the exported spans are dropped from the buffer.
+    """
+    _require_admin(request)
+    return tracer.export(clear=clear)
+
+
+@router.put("/tracing")
+@limiter.limit(DEFAULT_LIMIT)
+async def update_tracing(request: Request, tracing_request: TracingRequest):
+    """Turn span recording on or off for this worker"""
+    _require_admin(request)
+    tracer.configure(tracing_request.enabled)
+    return {"enabled": tracer.enabled, "spans": len(tracer.spans()), "dropped": tracer.dropped}
+
+
 # Blacklist management endpoints
 @router.post("/blacklist")
 @limiter.limit(DEFAULT_LIMIT)
@@ -461,27 +793,78 @@ async def remove_from_blacklist(request: Request, chat_id: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _load_blacklist() -> dict:
+    """Load all blacklisted chats in a dedicated session"""
+    with SessionLocal() as db:
+        rows = BlacklistRepository(db).get_rows(BLACKLIST_FIELDS)
+        return {"blacklisted_chats": rows_to_dicts(rows, BLACKLIST_FIELDS)}
+
+
 @router.get("/blacklist")
 @limiter.limit(DEFAULT_LIMIT)
-async def get_blacklist(request):
+async def get_blacklist(request: Request):
     """Get all blacklisted chats"""
     global userbot
     if not userbot:
         raise HTTPException(status_code=500, detail="Userbot not initialized")
 
     try:
-        blacklisted_chats = userbot.blacklist_repo.get_all_blacklisted_chats()
-        return {
-            "blacklisted_chats": [
-                {
-                    "id": b.id,
-                    "chat_id": b.chat_id,
-                    "reason": b.reason,
-                    "is_permanent": b.is_permanent,
-                    "expiry_time": b.expiry_time.isoformat() if b.expiry_time else None,
-                }
-                for b in blacklisted_chats
-            ]
-        }
+        return await read_cache.respond(
+            request, "blacklist", ("blacklisted_chats",), _load_blacklist
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# Incremental sync endpoint
+def _load_changes(since: int) -> bytes:
+    """Load and serialize rows changed and deleted after a sync version"""
+    with SessionLocal() as db:
+        change_log_repo = ChangeLogRepository(db)
+        version = change_log_repo.get_current_version()
+
+        # Tombstones older than the retained log are gone, so resend everything
+        reset = since > version or (
+            since > 0 and since < change_log_repo.get_oldest_version() - 1
+        )
+        if reset:
+            since = 0
+
+        changes: dict = {"version": version, "reset": reset}
+        sources: Tuple[Tuple[str, BaseRepository[Any], Tuple[str, ...]], ...] = (
+            ("groups", GroupRepository(db), GROUP_FIELDS),
+            ("messages", MessageRepository(db), MESSAGE_FIELDS),
+            ("blacklisted_chats", BlacklistRepository(db), BLACKLIST_FIELDS),
+        )
+        for key, repo, fields in sources:
+            changes[key] = {
+                "upserts": rows_to_dicts(
+                    repo.get_rows(fields, since_version=since), fields
+                ),
+                "deletes": (
+                    change_log_repo.get_deleted_ids(repo.model.__tablename__, since)
+                    if since
+                    else []
+                ),
+            }
+        return dumps(changes)
+
+
+@router.get("/sync")
+@limiter.limit(DEFAULT_LIMIT)
+async def sync_changes(request: Request, since: int = Query(0, ge=0)):
+    """
+    Get groups, messages and blacklist changes since a sync version
+
+    Clients apply deletes before upserts and store the returned version for
+    the next call. When `reset` is true the client must replace its state.
+    """
+    global userbot
+    if not userbot:
+        raise HTTPException(status_code=500, detail="Userbot not initialized")
+
+    try:
+        body = await run_in_threadpool(_load_changes, since)
+        return compressed_response(request, body)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
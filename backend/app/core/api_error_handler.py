@@ -7,8 +7,6 @@ from functools import wraps
 from fastapi import HTTPException
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -26,7 +24,7 @@ def handle_api_errors(func):
             raise
         except Exception as e:
             # Log the error for debugging
-            logger.error(f"Error in {func.__name__}: {str(e)}")
+            logger.error("Error in %s: %s", func.__name__, e)
             # Raise as HTTP 400 with the error message
             raise HTTPException(status_code=400, detail=str(e))
 
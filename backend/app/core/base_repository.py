@@ -3,9 +3,12 @@ Base Repository Module
 Contains the base repository class with common database operations
 """
 
-from typing import Type, Generic, Optional, List, Dict, Any, TypeVar
+import inspect
+from typing import Type, Generic, Optional, List, Dict, Any, TypeVar, Sequence
+from sqlalchemy import Row, select
 from sqlalchemy.orm import Session
 from app.models.database import Base
+from .tracing import traced
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -23,16 +26,51 @@ class BaseRepository(Generic[T]):
         self.model = model
         self.db = db
 
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # Public methods of every repository are traced as "<Repository>.<method>"
+        for name, value in list(vars(cls).items()):
+            if inspect.isfunction(value) and not name.startswith("_"):
+                setattr(cls, name, traced(f"{cls.__name__}.{name}")(value))
+
+    @traced()
     def get_by_id(self, id: int) -> Optional[T]:
         if self.db is None:
             raise ValueError("Database session not provided")
-        return self.db.query(self.model).filter(self.model.id == id).first()
+        # Served from the identity map when the row is already loaded
+        return self.db.get(self.model, id)
 
+    @traced()
     def get_all(self) -> List[T]:
         if self.db is None:
             raise ValueError("Database session not provided")
         return self.db.query(self.model).all()
 
+    @traced()
+    def get_rows(
+        self, fields: Sequence[str], since_version: Optional[int] = None
+    ) -> List[Row]:
+        """
+        Get plain result rows for the given columns, bypassing the ORM identity map
+
+        Args:
+            fields: Column names to select
+            since_version: Only return rows with a newer sync version (None or 0
+                returns every row, including those from before row versions existed)
+
+        Returns:
+            list: Rows with values in `fields` order
+        """
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        statement = select(*(getattr(self.model, field) for field in fields))
+        if since_version:
+            statement = statement.where(self.model.version > since_version).order_by(
+                self.model.version
+            )
+        return list(self.db.execute(statement).all())
+
+    @traced()
     def create(self, obj_data: Dict[str, Any]) -> T:
         if self.db is None:
             raise ValueError("Database session not provided")
@@ -42,6 +80,7 @@ class BaseRepository(Generic[T]):
         self.db.refresh(db_obj)
         return db_obj
 
+    @traced()
     def update(self, id: int, obj_data: Dict[str, Any]) -> Optional[T]:
         if self.db is None:
             raise ValueError("Database session not provided")
@@ -54,6 +93,7 @@ class BaseRepository(Generic[T]):
         self.db.refresh(db_obj)
         return db_obj
 
+    @traced()
     def delete(self, id: int) -> bool:
         if self.db is None:
             raise ValueError("Database session not provided")
@@ -0,0 +1,94 @@
+"""
+Change Log Module
+Records writes to synced tables and stamps rows with their sync version
+
+A version is the change log ID, assigned when the write happens rather than
+when its transaction commits. A client syncing past a version must never
+miss a lower one committed later, so versions have to become visible in
+order: SQLite allows one writing transaction at a time, and on Postgres the
+change log is locked against other writers until the transaction ends.
+Readers are not blocked.
+"""
+
+import datetime
+from typing import Any
+from sqlalchemy import event, insert, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Mapper
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models.database import BlacklistedChat, ChangeLog, Group, Message
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Number of change log entries kept for incremental sync
+CHANGE_LOG_RETENTION = 10000
+
+# Models whose changes are exposed through the sync endpoint
+SYNCED_MODELS = (Group, Message, BlacklistedChat)
+
+
+def record_change(
+    connection: Connection, table_name: str, row_id: int, operation: str
+) -> int:
+    """
+    Append an entry to the change log
+
+    Args:
+        connection: Connection of the current transaction
+        table_name: Name of the changed table
+        row_id: Primary key of the changed row
+        operation: UPSERT or DELETE
+
+    Returns:
+        int: Sync version assigned to the change
+    """
+    if connection.dialect.name == "postgresql":
+        # Held until commit, so versions commit in the order they are assigned
+        connection.execute(text("LOCK TABLE change_log IN SHARE ROW EXCLUSIVE MODE"))
+    result = connection.execute(
+        insert(ChangeLog.__table__).values(
+            table_name=table_name,
+            row_id=row_id,
+            operation=operation,
+            created_at=datetime.datetime.utcnow(),
+        )
+    )
+    return result.inserted_primary_key[0]
+
+
+def stamp_row(connection: Connection, table: Any, row_id: int) -> int:
+    """
+    Record an upsert and stamp the row with its new sync version
+
+    Args:
+        connection: Connection of the current transaction
+        table: Table of the changed row
+        row_id: Primary key of the changed row
+
+    Returns:
+        int: Sync version assigned to the row
+    """
+    version = record_change(connection, table.name, row_id, UPSERT)
+    connection.execute(
+        update(table).where(table.c.id == row_id).values(version=version)
+    )
+    return version
+
+
+def _after_upsert(mapper: Mapper, connection: Connection, target: Any) -> None:
+    version = stamp_row(connection, mapper.local_table, target.id)
+    set_committed_value(target, "version", version)
+
+
+def _after_delete(mapper: Mapper, connection: Connection, target: Any) -> None:
+    record_change(connection, target.__tablename__, target.id, DELETE)
+
+
+def track_changes() -> None:
+    """Register mapper hooks recording changes to synced models"""
+    for model in SYNCED_MODELS:
+        if not event.contains(model, "after_insert", _after_upsert):
+            event.listen(model, "after_insert", _after_upsert)
+            event.listen(model, "after_update", _after_upsert)
+            event.listen(model, "after_delete", _after_delete)
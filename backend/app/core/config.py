@@ -3,7 +3,7 @@ Configuration Management Module
 Handles loading and validation of environment variables
 """
 
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 
@@ -24,10 +24,52 @@ class Settings(BaseSettings):
 
     # Database
     database_url: str
+    # SQLite connection tuning: "production" (WAL and tuned pragmas) or "default"
+    sqlite_profile: str = "production"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size_kib: int = 64 * 1024
 
     # TMA Web UI
     next_public_api_url: str = "http://localhost:8000"
 
+    # TMA authentication: bot serving the Mini App (unset disables auth)
+    telegram_bot_token: Optional[str] = None
+    # Telegram user IDs allowed to use the Mini App, e.g. [123456789] (empty denies all)
+    tma_allowed_user_ids: List[int] = []
+    # Telegram user IDs allowed to use admin endpoints such as the profiler
+    tma_admin_user_ids: List[int] = []
+
+    # Rate limiting: "memory" (per process) or "database" (shared by all workers)
+    rate_limit_backend: str = "memory"
+
+    # Logging: root level, "json" or "text" output, one in N per-send lines,
+    # and levels per logger, e.g. {"app.core.userbot": "DEBUG"}
+    log_level: str = "INFO"
+    log_format: str = "json"
+    log_sample_every: int = 20
+    log_levels: Dict[str, str] = {}
+
+    # Tracing: record spans in a ring buffer of this many spans, and optionally
+    # write them as OTLP JSON to this file at shutdown
+    tracing_enabled: bool = False
+    tracing_buffer_size: int = 4096
+    tracing_export_path: Optional[str] = None
+
+    # Query stats: add an X-Query-Stats header to responses, and fail requests
+    # running more statements than the budget (meant for tests and development)
+    query_stats_header: bool = False
+    query_budget: Optional[int] = None
+
+    # Event loop monitor: measure scheduling lag this often (0 disables) and
+    # record the stack of any callback blocking the loop for longer than this
+    loop_monitor_interval_ms: int = 50
+    slow_callback_threshold_ms: int = 100
+
+    # Scheduled messages: occurrences missed while the engine was stopped are
+    # dropped ("skip"), sent once on start ("once") or all sent ("all")
+    schedule_catch_up: str = "once"
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -48,6 +90,34 @@ class Settings(BaseSettings):
             raise ValueError("TELEGRAM_API_HASH is required")
         return v
 
+    @field_validator("rate_limit_backend")
+    def validate_rate_limit_backend(cls, v):
+        """Validate rate limit backend"""
+        if v not in ("memory", "database"):
+            raise ValueError("RATE_LIMIT_BACKEND must be 'memory' or 'database'")
+        return v
+
+    @field_validator("sqlite_profile")
+    def validate_sqlite_profile(cls, v):
+        """Validate SQLite profile"""
+        if v not in ("default", "production"):
+            raise ValueError("SQLITE_PROFILE must be 'default' or 'production'")
+        return v
+
+    @field_validator("log_format")
+    def validate_log_format(cls, v):
+        """Validate log format"""
+        if v not in ("json", "text"):
+            raise ValueError("LOG_FORMAT must be 'json' or 'text'")
+        return v
+
+    @field_validator("schedule_catch_up")
+    def validate_schedule_catch_up(cls, v):
+        """Validate schedule catch-up policy"""
+        if v not in ("skip", "once", "all"):
+            raise ValueError("SCHEDULE_CATCH_UP must be 'skip', 'once' or 'all'")
+        return v
+
     @field_validator("secret_key")
     def validate_secret_key(cls, v):
         """Validate secret key"""
@@ -0,0 +1,365 @@
+"""
+Engine Control Module
+Routes engine commands to the leader process through the database
+
+Command arguments can hold secrets such as the 2FA password, so they are
+stored encrypted with a key derived from SECRET_KEY, which every worker
+shares, and are cleared once the command is served or expires. Any worker
+expires commands nobody served in time, so they do not wait for a leader.
+
+The leader's heartbeat carries its recent events, which the other workers
+republish on their own event bus, so live event streams are complete on
+every worker, one heartbeat behind the leader.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .database import SessionLocal
+from .event_bus import event_bus
+from .repository import (
+    CommandOutcome,
+    ControlCommandRepository,
+    EngineStateRepository,
+    PendingCommand,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds a forwarded command may wait for the leader before failing
+CONTROL_TIMEOUT = 30.0
+
+# Seconds between polls for pending commands (leader) or results (workers)
+CONTROL_POLL_INTERVAL = 0.25
+
+# Seconds between engine state heartbeats written by the leader
+STATE_HEARTBEAT_INTERVAL = 5.0
+
+# Engine state older than this is reported as unavailable
+STATE_STALE_AFTER = 3 * STATE_HEARTBEAT_INTERVAL
+
+# Finished commands are kept this long for debugging
+COMMAND_RETENTION = timedelta(hours=1)
+
+
+class ControlError(Exception):
+    """Raised when a forwarded command fails or times out"""
+
+
+def _cipher() -> Fernet:
+    """Cipher for command arguments, keyed by the secret shared by all workers"""
+    digest = hashlib.sha256(f"control-commands:{settings.secret_key}".encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(digest))
+
+
+def encrypt_arguments(arguments: Dict[str, Any]) -> str:
+    """Encrypt command arguments for the command table"""
+    return _cipher().encrypt(json.dumps(arguments).encode()).decode()
+
+
+def decrypt_arguments(token: Optional[str]) -> Dict[str, Any]:
+    """Decrypt command arguments read from the command table"""
+    if not token:
+        return {}
+    try:
+        return json.loads(_cipher().decrypt(token.encode()))
+    except InvalidToken:
+        raise ControlError("Command arguments were encrypted with a different SECRET_KEY")
+
+
+class ControlChannel:
+    """
+    Dispatch engine commands locally on the leader or forward them to it
+
+    Without a running election the process is standalone and executes every
+    command itself.
+    """
+
+    def __init__(self, session_factory: Optional[sessionmaker] = None):
+        """
+        Initialize control channel
+
+        Args:
+            session_factory: Session factory used for the command queue
+        """
+        self.session_factory = session_factory
+        self.is_leader = True
+        self.process_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._state_provider: Optional[Callable[[], Dict[str, Any]]] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        # Leader and ID of the last event relayed from its heartbeat
+        self._relayed: Tuple[Optional[str], int] = (None, 0)
+
+    def handler(
+        self, name: str
+    ) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+        """
+        Register a command handler
+
+        Args:
+            name: Command name
+
+        Returns:
+            Decorator registering the coroutine function
+        """
+
+        def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+            self._handlers[name] = func
+            return func
+
+        return decorator
+
+    def set_state_provider(self, provider: Callable[[], Dict[str, Any]]) -> None:
+        """
+        Set the function producing the engine state heartbeat
+
+        Args:
+            provider: Returns a JSON-serializable status snapshot
+        """
+        self._state_provider = provider
+
+    async def dispatch(self, name: str, **arguments: Any) -> Any:
+        """
+        Run a command on the leader
+
+        Args:
+            name: Command name
+            **arguments: JSON-serializable command arguments
+
+        Returns:
+            Any: Handler result
+        """
+        if self.is_leader:
+            return await self._handlers[name](**arguments)
+        return await self._forward(name, arguments)
+
+    async def _forward(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """Queue a command for the leader and wait for its result"""
+        session_factory = self.session_factory
+        if session_factory is None:
+            raise ControlError("Control channel has no database session")
+
+        def submit() -> int:
+            with session_factory() as db:
+                return ControlCommandRepository(db).create_command(
+                    name, encrypt_arguments(arguments)
+                )
+
+        def fetch(command_id: int) -> Optional[CommandOutcome]:
+            with session_factory() as db:
+                return ControlCommandRepository(db).get_outcome(command_id)
+
+        command_id = await run_in_threadpool(submit)
+        deadline = time.monotonic() + CONTROL_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CONTROL_POLL_INTERVAL)
+            outcome = await run_in_threadpool(fetch, command_id)
+            if outcome is None:
+                continue
+            if outcome.status == "done":
+                return json.loads(outcome.result) if outcome.result else None
+            raise ControlError(outcome.error or f"Command {name} failed")
+        # Nobody served it: drop the arguments rather than leave them pending
+        await self._expire_stale()
+        raise ControlError(f"Engine leader did not answer command {name}")
+
+    async def _expire_stale(self) -> int:
+        """
+        Expire commands that were not served in time
+
+        Returns:
+            int: Number of commands expired
+        """
+        session_factory = self.session_factory
+        if session_factory is None:
+            return 0
+
+        def expire() -> int:
+            with session_factory() as db:
+                return ControlCommandRepository(db).expire_pending_before(
+                    datetime.utcnow() - timedelta(seconds=CONTROL_TIMEOUT)
+                )
+
+        return await run_in_threadpool(expire)
+
+    async def _serve_pending(self) -> int:
+        """
+        Execute commands queued by other workers
+
+        Returns:
+            int: Number of commands handled
+        """
+        session_factory = self.session_factory
+        if session_factory is None:
+            return 0
+
+        def load() -> List[PendingCommand]:
+            with session_factory() as db:
+                return ControlCommandRepository(db).get_pending_commands()
+
+        def complete(command_id: int, status: str, **outcome: Any) -> None:
+            with session_factory() as db:
+                ControlCommandRepository(db).complete_command(command_id, status, **outcome)
+
+        commands = await run_in_threadpool(load)
+        for command_id, name, arguments, created_at in commands:
+            # The submitter has given up, so running it now would surprise
+            if created_at < datetime.utcnow() - timedelta(seconds=CONTROL_TIMEOUT):
+                await run_in_threadpool(complete, command_id, "expired")
+                continue
+            try:
+                handler = self._handlers[name]
+                result = await handler(**decrypt_arguments(arguments))
+                await run_in_threadpool(
+                    complete, command_id, "done", result=json.dumps(result)
+                )
+            except Exception as e:
+                logger.error("Error running control command %s: %s", name, e)
+                await run_in_threadpool(complete, command_id, "failed", error=str(e))
+        return len(commands)
+
+    async def _write_state(self) -> None:
+        """Write the engine state heartbeat"""
+        session_factory = self.session_factory
+        if session_factory is None or self._state_provider is None:
+            return
+        state = json.dumps(
+            {
+                **self._state_provider(),
+                "leader_id": self.process_id,
+                "events": [
+                    {"id": e.id, "type": e.type, "data": e.data}
+                    for e in event_bus.recent()
+                    # Status is relayed from the state itself
+                    if e.type != "status"
+                ],
+            }
+        )
+
+        def write() -> None:
+            with session_factory() as db:
+                EngineStateRepository(db).set_state(self.process_id, state)
+                ControlCommandRepository(db).delete_completed_before(
+                    datetime.utcnow() - COMMAND_RETENTION
+                )
+
+        await run_in_threadpool(write)
+
+    async def get_engine_state(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the leader's latest engine state
+
+        Returns:
+            dict: Status snapshot, or None if no fresh heartbeat exists
+        """
+        session_factory = self.session_factory
+        if session_factory is None:
+            return None
+
+        def read() -> Optional[Dict[str, Any]]:
+            with session_factory() as db:
+                engine_state = EngineStateRepository(db).get_state()
+                if engine_state is None:
+                    return None
+                age = (datetime.utcnow() - engine_state.updated_at).total_seconds()
+                if age > STATE_STALE_AFTER:
+                    return None
+                return json.loads(engine_state.state)
+
+        return await run_in_threadpool(read)
+
+    async def _follow(self) -> None:
+        """Relay the leader's status and events onto the local event bus"""
+        state = await self.get_engine_state()
+        if state is None:
+            state = {"running": False, "message": "Posting engine unavailable"}
+        latest = event_bus.latest("status")
+        if latest is None or latest.data.get("running") != state.get("running"):
+            event_bus.publish(
+                "status", running=state.get("running"), message=state.get("message")
+            )
+        self._relay_events(state.get("leader_id"), state.get("events") or [])
+
+    def _relay_events(self, leader_id: Optional[str], events: List[Dict[str, Any]]) -> None:
+        """Publish the leader's events not relayed yet"""
+        if not events:
+            return
+        source, last_id = self._relayed
+        # IDs going backwards mean the leader restarted under the same process ID
+        if leader_id == source and events[-1]["id"] >= last_id:
+            for event in events:
+                if event["id"] > last_id:
+                    event_bus.publish(event["type"], **event["data"])
+            last_id = max(last_id, events[-1]["id"])
+        else:
+            # A new leader: its earlier events happened before we followed it
+            last_id = events[-1]["id"]
+        self._relayed = (leader_id, last_id)
+
+    async def _run(self) -> None:
+        last_heartbeat = 0.0
+        while True:
+            try:
+                if self.is_leader:
+                    # Publish state right after commands so workers see the change
+                    served = await self._serve_pending()
+                    heartbeat_due = (
+                        time.monotonic() - last_heartbeat >= STATE_HEARTBEAT_INTERVAL
+                    )
+                    if served or heartbeat_due:
+                        await self._write_state()
+                        last_heartbeat = time.monotonic()
+                elif time.monotonic() - last_heartbeat >= STATE_HEARTBEAT_INTERVAL:
+                    await self._follow()
+                    # Without a leader nobody else would expire them
+                    await self._expire_stale()
+                    last_heartbeat = time.monotonic()
+            except Exception as e:
+                logger.error("Error in control channel: %s", e)
+            await asyncio.sleep(CONTROL_POLL_INTERVAL)
+
+    def start(self, is_leader: bool = False) -> None:
+        """
+        Start serving (leader) or following (other workers) in the background
+
+        Args:
+            is_leader: Whether this process currently leads
+        """
+        self.is_leader = is_leader
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def promote(self) -> None:
+        """Execute forwarded commands from now on"""
+        self.is_leader = True
+
+    def demote(self) -> None:
+        """Forward commands to the leader from now on"""
+        self.is_leader = False
+
+    async def stop(self) -> None:
+        """Stop the background loop and return to standalone mode"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.is_leader = True
+
+
+# Shared control channel instance
+engine_control = ControlChannel(SessionLocal)
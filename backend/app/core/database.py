@@ -5,9 +5,10 @@ Handles database connections and initialization
 
 from sqlalchemy.orm import sessionmaker
 from .config import settings
-
-# Import Base from models to ensure we use the same metadata
-from app.models.database import Base
+from .read_cache import track_table_versions
+from .change_log import track_changes
+from .query_stats import track_queries
+from .sqlite_profile import SQLiteProfile, apply_sqlite_profile
 
 # Create engine - switching to sync engine to avoid async issues in init_db
 
@@ -20,9 +21,29 @@ from sqlalchemy import create_engine
 # Create engine with the potentially converted URL
 engine = create_engine(db_url)
 
+# Let the API and the posting loop read and write SQLite concurrently
+if settings.sqlite_profile == "production":
+    apply_sqlite_profile(
+        engine,
+        SQLiteProfile(
+            busy_timeout=settings.sqlite_busy_timeout_ms,
+            mmap_size=settings.sqlite_mmap_size,
+            cache_size_kib=settings.sqlite_cache_size_kib,
+        ),
+    )
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Bump shared table versions with each write so cached read responses are invalidated
+track_table_versions(SessionLocal, engine)
+
+# Record writes to synced tables for incremental sync
+track_changes()
+
+# Count statements per request and per posting cycle
+track_queries(engine)
+
 
 def get_db_session():
     """
@@ -40,32 +61,18 @@ def get_db_session():
 def init_db():
     """
     Initialize database tables
+
+    Applies pending migrations and verifies the schema against the models,
+    unless the stored schema revision and fingerprint already match the code.
     """
+    # Alembic is only needed here, so keep it out of the import path
+    from .schema import ensure_schema
+
     try:
-        # Check the current database URL
-        print(f"Initializing database with URL from settings: {settings.database_url}")
-        
-        # Import models to register them with Base.metadata
-        # These imports are intentionally kept to ensure models are registered
-        import app.models.database  # noqa: F401
-        
-        # Check if database URL is async and convert to sync if needed
-        db_url = settings.database_url
-        if db_url.startswith("sqlite+aiosqlite"):
-            db_url = db_url.replace("sqlite+aiosqlite", "sqlite")
-        
-        print(f"Using converted URL: {db_url}")
-        
-        # Create a temporary engine to ensure we're using the right connection
-        from sqlalchemy import create_engine
-        temp_engine = create_engine(db_url)
-        
-        # Create all tables with the temporary engine
-        Base.metadata.create_all(bind=temp_engine)
-        print("Database tables initialized successfully")
-        
-        # Close the temporary engine
-        temp_engine.dispose()
+        if ensure_schema(engine):
+            print("Database schema migrated and verified")
+        else:
+            print("Database schema is up to date")
     except Exception as e:
         print(f"Error initializing database tables: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,29 @@
+"""
+Dialect Module
+Insert statements with upsert support for the configured database
+
+SQLite and Postgres both support INSERT ... ON CONFLICT, but only through
+their own dialect constructs; the generic `insert` has no
+`on_conflict_do_update`.
+"""
+
+from typing import Any, Union
+from sqlalchemy.dialects import postgresql, sqlite
+
+UpsertInsert = Union[postgresql.Insert, sqlite.Insert]
+
+
+def upsert_insert(dialect_name: str, table: Any) -> UpsertInsert:
+    """
+    Insert statement of the dialect, supporting on_conflict_do_update
+
+    Args:
+        dialect_name: Name of the database dialect, e.g. engine.dialect.name
+        table: Table or model to insert into
+
+    Returns:
+        Insert: Postgres insert for Postgres, SQLite insert otherwise
+    """
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
@@ -0,0 +1,205 @@
+"""
+Event Bus Module
+In-process publish/subscribe bus used to push live userbot events to clients
+
+Events are published in the process running the posting engine. The most
+recent ones are kept so the control channel can relay them to the other
+workers, see `ControlChannel._follow`.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of pending events per subscriber
+DEFAULT_QUEUE_SIZE = 100
+
+# Event types where only the latest value matters. A pending event of one of
+# these types is replaced by a newer one instead of queueing both.
+COALESCED_EVENTS = {"status", "cycle"}
+
+# Recent events kept for relaying to other workers
+HISTORY_SIZE = 200
+
+
+@dataclass
+class Event:
+    """A single event published on the bus"""
+
+    id: int
+    type: str
+    data: Dict[str, Any]
+    timestamp: float
+
+    def to_sse(self) -> str:
+        """
+        Format the event as a Server-Sent Events frame
+
+        Returns:
+            str: SSE frame terminated by a blank line
+        """
+        payload = json.dumps({**self.data, "timestamp": self.timestamp})
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    """Bounded event queue for a single subscriber"""
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE):
+        """
+        Initialize subscription
+
+        Args:
+            maxsize: Maximum number of pending events before old ones are dropped
+        """
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._events: "OrderedDict[Union[str, int], Event]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def push(self, event: Event) -> None:
+        """
+        Queue an event without blocking the publisher
+
+        Coalesced event types replace their pending predecessor. When the queue
+        is full the oldest pending event is dropped.
+
+        Args:
+            event: Event to queue
+        """
+        key: Union[str, int] = event.type if event.type in COALESCED_EVENTS else event.id
+        self._events.pop(key, None)
+        self._events[key] = event
+
+        if len(self._events) > self.maxsize:
+            self._events.popitem(last=False)
+            self.dropped += 1
+
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        Wait for the next event
+
+        Args:
+            timeout: Seconds to wait before giving up (None waits forever)
+
+        Returns:
+            Event: Next pending event, or None if the timeout expired
+        """
+        if not self._events:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        _, event = self._events.popitem(last=False)
+        if not self._events:
+            self._ready.clear()
+        return event
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class EventBus:
+    """Fan out published events to all active subscriptions"""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Initialize event bus
+
+        Args:
+            queue_size: Queue size for new subscriptions
+        """
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._ids = itertools.count(1)
+        self._latest: Dict[str, Event] = {}
+        self._history: Deque[Event] = deque(maxlen=HISTORY_SIZE)
+
+    def publish(self, event_type: str, **data: Any) -> Event:
+        """
+        Publish an event to every subscriber
+
+        Args:
+            event_type: Event type (e.g. "status", "cycle", "send")
+            **data: Event payload
+
+        Returns:
+            Event: The published event
+        """
+        event = Event(
+            id=next(self._ids), type=event_type, data=data, timestamp=time.time()
+        )
+        if event_type in COALESCED_EVENTS:
+            self._latest[event_type] = event
+        self._history.append(event)
+
+        for subscription in self._subscribers:
+            subscription.push(event)
+        return event
+
+    def subscribe(self) -> Subscription:
+        """
+        Create a new subscription
+
+        The latest event of each coalesced type is replayed so new subscribers
+        immediately know the current state.
+
+        Returns:
+            Subscription: The new subscription
+        """
+        subscription = Subscription(self.queue_size)
+        for event in sorted(self._latest.values(), key=lambda e: e.id):
+            subscription.push(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Remove a subscription
+
+        Args:
+            subscription: Subscription to remove
+        """
+        self._subscribers.discard(subscription)
+        if subscription.dropped:
+            logger.info("Subscriber dropped %s events", subscription.dropped)
+
+    def recent(self) -> List[Event]:
+        """
+        Get the most recently published events
+
+        Returns:
+            list: Up to HISTORY_SIZE events, oldest first
+        """
+        return list(self._history)
+
+    def latest(self, event_type: str) -> Optional[Event]:
+        """
+        Get the latest published event of a coalesced type
+
+        Args:
+            event_type: Event type
+
+        Returns:
+            Event: Latest event or None if none was published yet
+        """
+        return self._latest.get(event_type)
+
+    @property
+    def subscriber_count(self) -> int:
+        """Number of active subscriptions"""
+        return len(self._subscribers)
+
+
+# Shared event bus instance
+event_bus = EventBus()
@@ -0,0 +1,276 @@
+"""
+Leader Election Module
+Elects the single process that owns the Telegram client and posting engine
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional, Protocol
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Seconds between attempts to acquire (or verify) leadership
+LEADER_RETRY_INTERVAL = 2.0
+
+# Postgres advisory lock key shared by all workers ("tgub")
+ADVISORY_LOCK_KEY = 0x74677562
+
+# Postgres advisory lock key serializing startup work ("tgus")
+STARTUP_LOCK_KEY = 0x74677573
+
+
+class LeaderLock(Protocol):
+    """Exclusive lock held by the leader for as long as it lives"""
+
+    def try_acquire(self) -> bool:
+        """Try to take the lock without blocking"""
+
+    def is_held(self) -> bool:
+        """Check that the lock is still held"""
+
+    def release(self) -> None:
+        """Release the lock"""
+
+
+class FileLeaderLock:
+    """Leader lock based on an advisory file lock, released when the process dies"""
+
+    def __init__(self, path: str):
+        """
+        Initialize file lock
+
+        Args:
+            path: Path of the lock file
+        """
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is None:
+            logger.warning("File locking unavailable, assuming a single worker")
+        else:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def is_held(self) -> bool:
+        return self._fd is not None
+
+    def release(self) -> None:
+        if self._fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class AdvisoryLeaderLock:
+    """Leader lock based on a session-level Postgres advisory lock"""
+
+    def __init__(self, engine: Engine, key: int = ADVISORY_LOCK_KEY):
+        """
+        Initialize advisory lock
+
+        Args:
+            engine: Database engine
+            key: Advisory lock key
+        """
+        self.engine = engine
+        self.key = key
+        self._connection: Optional[Connection] = None
+
+    def try_acquire(self) -> bool:
+        if self._connection is not None:
+            return True
+
+        # The lock lives as long as this dedicated connection
+        connection = self.engine.connect()
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}
+        ).scalar()
+        connection.commit()
+        if not acquired:
+            connection.close()
+            return False
+
+        self._connection = connection
+        return True
+
+    def is_held(self) -> bool:
+        if self._connection is None:
+            return False
+        try:
+            self._connection.execute(text("SELECT 1"))
+            self._connection.commit()
+            return True
+        except Exception as e:
+            logger.warning("Lost leader lock connection: %s", e)
+            self._connection.invalidate()
+            self._connection = None
+            return False
+
+    def release(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": self.key}
+                )
+                self._connection.commit()
+            finally:
+                self._connection.close()
+                self._connection = None
+
+
+def _lock_file_path(engine: Engine, suffix: str) -> str:
+    """Derive a lock file path next to the SQLite database"""
+    database = engine.url.database
+    if database and database != ":memory:":
+        return f"{database}.{suffix}"
+    return f"engine.{suffix}"
+
+
+@contextmanager
+def startup_lock(engine: Engine) -> Iterator[None]:
+    """
+    Serialize one-off startup work (such as schema creation) across workers
+
+    Blocks until no other worker holds the lock.
+
+    Args:
+        engine: Database engine
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(
+                text("SELECT pg_advisory_lock(:key)"), {"key": STARTUP_LOCK_KEY}
+            )
+            try:
+                yield
+            finally:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": STARTUP_LOCK_KEY}
+                )
+        return
+
+    fd = os.open(_lock_file_path(engine, "startup.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def create_leader_lock(engine: Engine, lock_path: Optional[str] = None) -> LeaderLock:
+    """
+    Create the leader lock matching the database backend
+
+    Args:
+        engine: Database engine
+        lock_path: Lock file path for non-Postgres backends
+
+    Returns:
+        LeaderLock: Advisory lock on Postgres, file lock otherwise
+    """
+    if engine.dialect.name == "postgresql":
+        return AdvisoryLeaderLock(engine)
+
+    return FileLeaderLock(lock_path or _lock_file_path(engine, "leader.lock"))
+
+
+class LeaderElection:
+    """Periodically compete for leadership and run callbacks on transitions"""
+
+    def __init__(
+        self,
+        lock: LeaderLock,
+        on_elected: Callable[[], Awaitable[Any]],
+        on_demoted: Callable[[], Awaitable[Any]],
+        interval: float = LEADER_RETRY_INTERVAL,
+    ):
+        """
+        Initialize leader election
+
+        Args:
+            lock: Lock deciding leadership
+            on_elected: Called when this process becomes leader
+            on_demoted: Called when this process loses leadership
+            interval: Seconds between acquisition attempts and health checks
+        """
+        self.lock = lock
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.interval = interval
+        self.is_leader = False
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def check(self) -> bool:
+        """
+        Run one election round
+
+        Returns:
+            bool: True if this process is the leader afterwards
+        """
+        if not self.is_leader:
+            if await run_in_threadpool(self.lock.try_acquire):
+                self.is_leader = True
+                logger.info("Process %s elected engine leader", os.getpid())
+                await self.on_elected()
+        elif not await run_in_threadpool(self.lock.is_held):
+            self.is_leader = False
+            logger.warning("Process %s lost engine leadership", os.getpid())
+            await self.on_demoted()
+        return self.is_leader
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error("Error during leader election: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start competing for leadership in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop competing and release leadership"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                await self.on_demoted()
+            finally:
+                await run_in_threadpool(self.lock.release)
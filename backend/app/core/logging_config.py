@@ -0,0 +1,203 @@
+"""
+Logging Configuration Module
+Central, non-blocking logging setup with JSON output and runtime levels
+
+Records are put on a queue by a `QueueHandler` and written to stderr by a
+`QueueListener` thread, so a slow sink never stalls the event loop. Messages
+use %-style arguments and are only formatted in the listener; records whose
+arguments are not plain values are formatted on the caller's thread, since
+the objects could change before the listener gets to them. Records logged with
+`extra=SAMPLED` (such as a line per sent message) are kept once every
+`sample_every` times per message template.
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from typing import Any, Dict, Mapping, Optional
+
+# Mark a record as sampled: logger.info("Sent to %s", chat, extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+# Maximum records waiting for the listener; beyond this new records are dropped
+LOG_QUEUE_SIZE = 10000
+
+# Argument types that cannot change after the call, so formatting can wait
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+# LogRecord attributes that are not user-supplied extra fields
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", (), None)).keys()
+) | {"message", "asctime", "sampled"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["LazyQueueHandler"] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every `every` sampled records per message template"""
+
+    def __init__(self, every: int):
+        """
+        Initialize filter
+
+        Args:
+            every: Keep the first record of a template and then every Nth one
+        """
+        super().__init__()
+        self.every = max(1, every)
+        self._counts: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False) or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sample_rate = self.every
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves formatting to the listener thread"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Dropping a record beats blocking the event loop
+            pass
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Other handlers may still use the original record
+        record = copy.copy(record)
+        args = record.args
+        if args and not (
+            isinstance(args, tuple) and all(isinstance(a, _PLAIN_TYPES) for a in args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info and not record.exc_text:
+            # Tracebacks reference live frames; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_format: str = "json",
+    sample_every: int = 1,
+    levels: Optional[Mapping[str, str]] = None,
+    stream: Any = None,
+) -> None:
+    """
+    Route all logging through the queue and start the writer thread
+
+    Calling it again replaces the previous setup.
+
+    Args:
+        level: Root log level
+        log_format: "json" for structured lines or "text"
+        sample_every: Keep one in this many sampled records
+        levels: Levels of individual loggers, e.g. {"app.core.userbot": "DEBUG"}
+        stream: Output stream (defaults to stderr)
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if log_format == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+
+    _queue_handler = LazyQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(SamplingFilter(sample_every))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+    set_log_levels(levels or {})
+
+    _listener = logging.handlers.QueueListener(
+        _queue_handler.queue, output, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+def set_log_levels(levels: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Change logger levels at runtime
+
+    Args:
+        levels: Logger name ("root" for the root logger) to level name
+
+    Returns:
+        dict: The levels now configured
+    """
+    for level in levels.values():
+        if not isinstance(logging.getLevelName(level.upper()), int):
+            raise ValueError(f"Unknown log level: {level}")
+    for name, level in levels.items():
+        logging.getLogger(None if name == "root" else name).setLevel(level.upper())
+    return get_log_levels()
+
+
+def get_log_levels() -> Dict[str, str]:
+    """Levels of the root logger and every logger with an explicit level"""
+    levels = {"root": logging.getLevelName(logging.getLogger().level)}
+    for name, logger in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger) and logger.level != logging.NOTSET:
+            levels[name] = logging.getLevelName(logger.level)
+    return levels
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,174 @@
+"""
+Event Loop Monitor Module
+Measures event loop scheduling lag and catches callbacks that block the loop
+
+Repositories are synchronous, so a slow query called from a coroutine stops
+the Telegram client and every API request until it returns. A watchdog
+thread schedules a no-op callback on the loop every `interval` seconds and
+times how long the loop takes to run it; that delay is the scheduling lag.
+When a callback is still waiting after `threshold` seconds the loop is
+blocked, and the watchdog records the loop thread's current stack, which
+points at the blocking call. Unlike asyncio debug mode this adds one
+callback per interval and nothing to other callbacks, so it can run in
+production. Any block longer than `threshold + interval` is caught.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lag samples kept for percentiles (one minute at the default interval)
+LAG_WINDOW = 1200
+
+# Blocking events kept for the metrics endpoint
+SLOW_CALLBACK_HISTORY = 20
+
+# Stack frames recorded per blocking event
+STACK_LIMIT = 30
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoopMonitor:
+    """Watch an event loop from a background thread"""
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1):
+        """
+        Initialize monitor
+
+        Args:
+            interval: Seconds between lag measurements
+            threshold: Seconds the loop may be busy before it counts as blocked
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.slow_callbacks = 0
+        self._lags: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self._blocks: Deque[Dict[str, Any]] = deque(maxlen=SLOW_CALLBACK_HISTORY)
+        self._lock = threading.Lock()
+        self._answered = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Start watching a loop
+
+        Args:
+            loop: Loop to watch (defaults to the running loop), which may run
+                in another thread
+        """
+        if self.running:
+            return
+        self._loop = loop or asyncio.get_running_loop()
+        # Learned from inside the loop, ahead of the watchdog's first callback
+        self._loop_thread_id = None
+        self._loop.call_soon_threadsafe(self._record_loop_thread)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching"""
+        self._stopped.set()
+        self._answered.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _record_loop_thread(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+
+    def _pong(self) -> None:
+        self._answered.set()
+
+    def _watch(self) -> None:
+        loop = self._loop
+        assert loop is not None
+        while not self._stopped.is_set():
+            self._answered.clear()
+            sent = time.perf_counter()
+            try:
+                loop.call_soon_threadsafe(self._pong)
+            except RuntimeError:
+                # Loop closed
+                return
+            if not self._answered.wait(self.threshold):
+                stack = self._loop_stack()
+                while not self._answered.wait(self.interval):
+                    if self._stopped.is_set() or loop.is_closed():
+                        return
+                self._record_block(time.perf_counter() - sent, stack)
+            with self._lock:
+                self._lags.append(time.perf_counter() - sent)
+            self._stopped.wait(self.interval)
+
+    def _loop_stack(self) -> List[str]:
+        """Stack of the loop thread, innermost call last"""
+        thread_id = self._loop_thread_id
+        if thread_id is None:
+            return []
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return []
+        return [
+            line.rstrip()
+            for line in traceback.format_stack(frame, limit=STACK_LIMIT)
+        ]
+
+    def _record_block(self, seconds: float, stack: List[str]) -> None:
+        with self._lock:
+            self.slow_callbacks += 1
+            self._blocks.append(
+                {"at": time.time(), "duration_ms": round(seconds * 1000, 1), "stack": stack}
+            )
+        logger.warning(
+            "Event loop blocked for %.0f ms, stack when detected:\n%s",
+            seconds * 1000,
+            "\n".join(stack[-5:]),
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Lag percentiles in milliseconds and the number of blocking events"""
+        with self._lock:
+            ordered = sorted(self._lags)
+            last = self._lags[-1] if self._lags else 0.0
+            slow = self.slow_callbacks
+        return {
+            "lag_ms": round(last * 1000, 2),
+            "lag_p50_ms": round(_percentile(ordered, 0.5) * 1000, 2),
+            "lag_p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+            "lag_max_ms": round((ordered[-1] if ordered else 0.0) * 1000, 2),
+            "slow_callbacks": slow,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary with the most recent blocking events and their stacks"""
+        summary = self.summary()
+        with self._lock:
+            summary["recent_slow_callbacks"] = list(self._blocks)
+        summary["threshold_ms"] = self.threshold * 1000
+        return summary
+
+
+# Global monitor of the application's event loop, started with the app
+loop_monitor = LoopMonitor()
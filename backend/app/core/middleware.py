@@ -3,9 +3,185 @@ Middleware Configuration Module
 Configures various middleware for the FastAPI application
 """
 
-from slowapi.middleware import SlowAPIMiddleware
+import logging
+from typing import Optional
+from urllib.parse import parse_qs
 from fastapi import FastAPI
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .config import settings
+from .query_stats import collect_queries
 from .rate_limiter import limiter
+from .serialization import dumps
+from .tracing import tracer
+from .webapp_auth import WebAppAuthenticator, WebAppAuthError, webapp_auth
+
+# Audit trail of state-changing requests and the user who made them
+audit_logger = logging.getLogger("app.audit")
+
+# Paths reachable without an access token
+PUBLIC_PATHS = frozenset(
+    {"/", "/health", "/docs", "/redoc", "/openapi.json", "/api/v1/auth/webapp"}
+)
+
+# Methods that do not change state and are left out of the audit log
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class RateLimitHeadersMiddleware:
+    """Add remaining-quota headers to responses of rate-limited endpoints"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Shared with request.state so the limiter can leave its result here
+        state = scope.setdefault("state", {})
+
+        async def send_with_headers(message: Message) -> None:
+            result = state.get("rate_limit")
+            if message["type"] == "http.response.start" and result is not None:
+                headers = MutableHeaders(scope=message)
+                for name, value in result.headers().items():
+                    if name not in headers:
+                        headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class TracingMiddleware:
+    """Record each HTTP request as a span, the parent of the spans it opens"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with tracer.span(
+            f"{scope['method']} {scope['path']}",
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        ) as span:
+
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # Name the span after the route rather than the concrete path
+                endpoint = scope.get("endpoint")
+                if endpoint is not None:
+                    span.name = f"{scope['method']} {endpoint.__name__}"
+
+
+class QueryStatsMiddleware:
+    """Count the SQL statements of each request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with collect_queries("request", settings.query_budget) as stats:
+
+            async def send_with_stats(message: Message) -> None:
+                if message["type"] == "http.response.start" and settings.query_stats_header:
+                    MutableHeaders(scope=message)["x-query-stats"] = stats.header_value()
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
+
+
+class TelegramAuthMiddleware:
+    """
+    Require a WebApp access token and expose the verified Telegram user ID
+
+    The user ID is stored as `request.state.telegram_user_id`, where the rate
+    limiter and route handlers pick it up. Tokens are sent as
+    `Authorization: Bearer <token>`, or as an `access_token` query parameter
+    by clients that cannot set headers (EventSource).
+    """
+
+    def __init__(self, app: ASGIApp, authenticator: WebAppAuthenticator = webapp_auth):
+        self.app = app
+        self.authenticator = authenticator
+
+    @staticmethod
+    def _get_token(scope: Scope) -> Optional[str]:
+        authorization = Headers(scope=scope).get("authorization", "")
+        scheme, _, credentials = authorization.partition(" ")
+        if scheme.lower() == "bearer" and credentials:
+            return credentials.strip()
+        query = parse_qs(scope.get("query_string", b"").decode())
+        return query.get("access_token", [None])[0]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not self.authenticator.enabled
+            or scope["method"] == "OPTIONS"
+            or scope["path"] in PUBLIC_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        token = self._get_token(scope)
+        try:
+            if token is None:
+                raise WebAppAuthError("Not authenticated")
+            user_id = self.authenticator.authenticate(token)
+        except WebAppAuthError as e:
+            await self._reject(send, str(e))
+            return
+
+        scope.setdefault("state", {})["telegram_user_id"] = user_id
+        if scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_audit(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_audit)
+        finally:
+            audit_logger.info(
+                "user=%s %s %s -> %s", user_id, scope["method"], scope["path"], status
+            )
+
+    @staticmethod
+    async def _reject(send: Send, detail: str) -> None:
+        body = dumps({"detail": detail})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 401,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"www-authenticate", b"Bearer"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
 
 
 def add_middleware(app: FastAPI):
@@ -15,6 +191,10 @@ def add_middleware(app: FastAPI):
     Args:
         app: The FastAPI application instance
     """
-    # Add the SlowAPI middleware for rate limiting
+    # Rate limits are enforced per endpoint; this reports the remaining quota
     app.state.limiter = limiter
-    app.add_middleware(SlowAPIMiddleware)
+    app.add_middleware(RateLimitHeadersMiddleware)
+    app.add_middleware(QueryStatsMiddleware)
+    app.add_middleware(TracingMiddleware)
+    # Added last so it runs first and the limiter sees the verified user
+    app.add_middleware(TelegramAuthMiddleware)
@@ -0,0 +1,147 @@
+"""
+Profiler Module
+On-demand sampling and memory profiling of the running process
+
+The CPU profiler samples the stack of every thread (the event loop and the
+threadpool running repository calls) from a separate thread at a fixed
+interval, so the profiled code is not instrumented and only pays for the
+brief interpreter lock held while frames are copied. Samples are aggregated
+as collapsed stacks, one `root;...;leaf count` line per distinct stack, the
+input format of flamegraph.pl, speedscope and most flame graph viewers.
+
+The memory profiler compares two `tracemalloc` snapshots taken some seconds
+apart to show where allocations grew.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Bounds of a single profiling run
+MAX_PROFILE_SECONDS = 60
+MIN_SAMPLE_INTERVAL = 0.001
+
+# Frames kept per tracemalloc allocation traceback
+TRACEMALLOC_FRAMES = 10
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+_running = threading.Lock()
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    # Directory and file name are enough to tell modules apart
+    path = os.path.join(
+        os.path.basename(os.path.dirname(code.co_filename)),
+        os.path.basename(code.co_filename),
+    )
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})"
+
+
+def _collapse(frame: Optional[FrameType], thread_name: str) -> str:
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> "Counter[str]":
+    """
+    Sample the stacks of all other threads
+
+    Args:
+        seconds: How long to sample
+        interval: Seconds between samples
+
+    Returns:
+        Counter: Number of samples per collapsed stack
+    """
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    try:
+        seconds = min(max(seconds, 0.0), MAX_PROFILE_SECONDS)
+        interval = max(interval, MIN_SAMPLE_INTERVAL)
+        own_id = threading.get_ident()
+        stacks: "Counter[str]" = Counter()
+        deadline = time.perf_counter() + seconds
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    stacks[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+            if time.perf_counter() + interval > deadline:
+                return stacks
+            time.sleep(interval)
+    finally:
+        _running.release()
+
+
+def collapsed_text(stacks: "Counter[str]") -> str:
+    """Render samples as collapsed stack lines, most frequent first"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+async def memory_diff(seconds: float, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Compare allocations at the start and end of a time window
+
+    Tracing is started for the window if it is not already running, and
+    stopped again afterwards. Snapshots and the comparison walk every traced
+    allocation, so they run in the threadpool and only the wait stays on
+    the event loop.
+
+    Args:
+        seconds: Length of the window
+        limit: Number of source lines reported
+
+    Returns:
+        list: Source lines with the largest growth first
+    """
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already running")
+    started = not tracemalloc.is_tracing()
+    try:
+        if started:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        before = await run_in_threadpool(tracemalloc.take_snapshot)
+        await asyncio.sleep(min(max(seconds, 0.0), MAX_PROFILE_SECONDS))
+        after = await run_in_threadpool(tracemalloc.take_snapshot)
+    finally:
+        if started:
+            tracemalloc.stop()
+        _running.release()
+
+    return await run_in_threadpool(_compare_snapshots, before, after, limit)
+
+
+def _compare_snapshots(
+    before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int
+) -> List[Dict[str, Any]]:
+    """List the source lines whose allocations grew most between two snapshots"""
+    # Allocations of tracemalloc itself would dominate the diff
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff": stat.size_diff,
+            "count_diff": stat.count_diff,
+            "size": stat.size,
+            "count": stat.count,
+        }
+        for stat in diff[:limit]
+    ]
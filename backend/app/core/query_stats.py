@@ -0,0 +1,205 @@
+"""
+Query Stats Module
+Counts SQL statements and their time per request and per posting cycle
+
+Engine events record each statement into the `QueryStats` of the current
+scope, which is kept in a context variable and therefore follows the request
+or cycle into `run_in_threadpool` calls. Statements outside any scope are not
+recorded. When a scope ends its totals are added to `query_metrics`, and the
+same statement text run `REPEAT_THRESHOLD` or more times is reported as a
+likely N+1 pattern (a query per row where one query would do).
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Executions of one statement within a scope that are reported as N+1
+REPEAT_THRESHOLD = 3
+
+# Characters of a statement kept in reports
+STATEMENT_PREVIEW_LENGTH = 200
+
+_current_stats: ContextVar[Optional["QueryStats"]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a scope runs more statements than its budget allows"""
+
+
+class QueryStats:
+    """Statements run within one request or cycle"""
+
+    def __init__(self, scope: str):
+        """
+        Initialize stats
+
+        Args:
+            scope: Kind of work measured, e.g. "request" or "cycle"
+        """
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float) -> None:
+        """Record one executed statement"""
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.statements[statement] += 1
+
+    def repeated(self, threshold: int = REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """
+        Statements run at least `threshold` times, most frequent first
+
+        Returns:
+            list: (statement, executions) pairs
+        """
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def header_value(self) -> str:
+        """Summary for the X-Query-Stats debug header"""
+        return (
+            f"count={self.count}; time_ms={self.seconds * 1000:.1f}; "
+            f"repeated={len(self.repeated())}"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "scope": self.scope,
+            "count": self.count,
+            "time_ms": round(self.seconds * 1000, 3),
+            "repeated": [
+                {"statement": statement[:STATEMENT_PREVIEW_LENGTH], "count": count}
+                for statement, count in self.repeated()
+            ],
+        }
+
+
+class QueryMetrics:
+    """Running totals of query stats per scope"""
+
+    def __init__(self):
+        self._totals: Dict[str, Dict[str, Any]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stats: QueryStats) -> None:
+        """Add the stats of a finished scope"""
+        summary = stats.to_dict()
+        with self._lock:
+            totals = self._totals.setdefault(
+                stats.scope,
+                {"scopes": 0, "queries": 0, "time_ms": 0.0, "max_queries": 0, "n_plus_one": 0},
+            )
+            totals["scopes"] += 1
+            totals["queries"] += stats.count
+            totals["time_ms"] += summary["time_ms"]
+            totals["max_queries"] = max(totals["max_queries"], stats.count)
+            totals["n_plus_one"] += 1 if summary["repeated"] else 0
+            self._last[stats.scope] = summary
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totals and the most recent stats of every scope"""
+        with self._lock:
+            return {
+                scope: {**totals, "time_ms": round(totals["time_ms"], 3), "last": self._last[scope]}
+                for scope, totals in self._totals.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+            self._last.clear()
+
+
+@contextmanager
+def collect_queries(scope: str, budget: Optional[int] = None) -> Iterator[QueryStats]:
+    """
+    Count the statements run within the block
+
+    Args:
+        scope: Kind of work measured, e.g. "request" or "cycle"
+        budget: Maximum number of statements; more raise QueryBudgetExceeded
+
+    Yields:
+        QueryStats: Stats filled in as statements run
+    """
+    stats = QueryStats(scope)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        query_metrics.observe(stats)
+        for statement, count in stats.repeated():
+            logger.warning(
+                "Statement ran %s times in one %s (possible N+1): %.200s",
+                count,
+                scope,
+                statement,
+            )
+    if budget is not None and stats.count > budget:
+        raise QueryBudgetExceeded(
+            f"{stats.count} statements in one {scope}, budget is {budget}"
+        )
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats of the current scope, if any"""
+    return _current_stats.get()
+
+
+def _before_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    stats = _current_stats.get()
+    starts = conn.info.get("query_start")
+    if stats is not None and starts:
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+
+def _handle_error(context: Any) -> None:
+    # The failed statement never reaches after_cursor_execute
+    connection = context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def track_queries(engine: Engine) -> None:
+    """
+    Register engine hooks recording statements into the current scope
+
+    Args:
+        engine: Database engine
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# Global metrics, reported by the metrics endpoint
+query_metrics = QueryMetrics()
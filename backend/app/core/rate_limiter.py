@@ -1,15 +1,299 @@
 """
 Rate Limiting Module
 Provides rate limiting functionality for API endpoints
-"""
 
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-# The settings import is intentionally kept for future use
-from .config import settings  # noqa: F401
+Limits use the generic cell rate algorithm (GCRA): each key stores a single
+"theoretical arrival time", so a check is one O(1) read-modify-write. The
+state lives in process memory or in the application database, the latter
+shared by every worker.
+"""
 
-# Initialize the rate limiter
-limiter = Limiter(key_func=get_remote_address)
+import math
+import re
+import threading
+import time
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple
+from fastapi import HTTPException, Request
+from sqlalchemy import case, select
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from app.models.database import RateLimit
+from .config import settings
+from .dialect import upsert_insert
 
 # Define default rate limits
-DEFAULT_LIMIT = "100/minute"  # 100 requests per minute per IP
+DEFAULT_LIMIT = "100/minute"  # 100 requests per minute per user
+
+# Number of checks between purges of expired keys
+PURGE_INTERVAL = 1000
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True)
+class RateLimitItem:
+    """A parsed limit such as "100/minute" """
+
+    limit: int
+    period: int
+
+    @property
+    def emission_interval(self) -> float:
+        """Seconds each request adds to the theoretical arrival time"""
+        return self.period / self.limit
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimitItem":
+        """
+        Parse a limit string
+
+        Args:
+            value: Limit like "5/minute", "10 per hour" or "100/day"
+
+        Returns:
+            RateLimitItem: Parsed limit
+        """
+        match = re.fullmatch(r"\s*(\d+)\s*(?:/|per)\s*(second|minute|hour|day)s?\s*", value)
+        if not match:
+            raise ValueError(f"Invalid rate limit: {value}")
+        return cls(limit=int(match.group(1)), period=PERIODS[match.group(2)])
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate limit check"""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> Dict[str, str]:
+        """Response headers describing the remaining quota"""
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+def _evaluate(
+    item: RateLimitItem, tat: Optional[float], now: float
+) -> Tuple[bool, float]:
+    """
+    Apply GCRA to a stored theoretical arrival time
+
+    Returns:
+        tuple: Whether the request is allowed and the resulting arrival time
+    """
+    new_tat = max(tat or now, now) + item.emission_interval
+    return new_tat - now <= item.period, new_tat
+
+
+def _result(item: RateLimitItem, allowed: bool, tat: float, now: float) -> RateLimitResult:
+    """Build a result from the arrival time stored after the check"""
+    used = max(tat - now, 0.0)
+    interval = item.emission_interval
+    return RateLimitResult(
+        allowed=allowed,
+        limit=item.limit,
+        remaining=max(int((item.period - used) // interval), 0),
+        reset_after=used,
+        retry_after=max(used + interval - item.period, 0.0),
+    )
+
+
+class RateLimitBackend(Protocol):
+    """Storage for theoretical arrival times"""
+
+    def hit(self, key: str, item: RateLimitItem, now: float) -> RateLimitResult:
+        """Count a request against the key and report the outcome"""
+
+
+class MemoryBackend:
+    """Per-process storage; limits are not shared between workers"""
+
+    def __init__(self):
+        self._tats: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._checks = 0
+
+    def hit(self, key: str, item: RateLimitItem, now: float) -> RateLimitResult:
+        with self._lock:
+            allowed, new_tat = _evaluate(item, self._tats.get(key), now)
+            if allowed:
+                self._tats[key] = new_tat
+            tat = self._tats.get(key, now)
+
+            self._checks += 1
+            if self._checks % PURGE_INTERVAL == 0:
+                self._tats = {k: v for k, v in self._tats.items() if v > now}
+        return _result(item, allowed, tat, now)
+
+
+class DatabaseBackend:
+    """Storage in the rate_limits table, shared by every worker using the database"""
+
+    def __init__(self, engine: Engine):
+        """
+        Initialize database backend
+
+        Args:
+            engine: Database engine (SQLite or Postgres)
+        """
+        self.engine = engine
+        self.table = RateLimit.__table__
+        self._checks = 0
+
+    def hit(self, key: str, item: RateLimitItem, now: float) -> RateLimitResult:
+        table = self.table
+        interval = item.emission_interval
+        base = case((table.c.tat > now, table.c.tat), else_=now)
+
+        # Single conditional upsert: only advances the arrival time if allowed
+        statement = (
+            upsert_insert(self.engine.dialect.name, table)
+            .values(key=key, tat=now + interval)
+            .on_conflict_do_update(
+                index_elements=[table.c.key],
+                set_={"tat": base + interval},
+                where=base + interval - now <= item.period,
+            )
+            .returning(table.c.tat)
+        )
+        with self.engine.begin() as connection:
+            tat = connection.execute(statement).scalar()
+            allowed = tat is not None
+            if not allowed:
+                tat = connection.execute(
+                    select(table.c.tat).where(table.c.key == key)
+                ).scalar()
+
+            self._checks += 1
+            if self._checks % PURGE_INTERVAL == 0:
+                connection.execute(table.delete().where(table.c.tat < now))
+        return _result(item, allowed, tat or now, now)
+
+
+def get_rate_limit_key(request: Request) -> str:
+    """
+    Identify the caller: the authenticated Telegram user, or the client address
+
+    Behind a reverse proxy run uvicorn with --proxy-headers so the client
+    address is the real one.
+    """
+    user_id = getattr(request.state, "telegram_user_id", None)
+    if user_id is not None:
+        return f"user:{user_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class RateLimitExceeded(HTTPException):
+    """Raised when a caller exceeds a rate limit"""
+
+    def __init__(self, result: RateLimitResult):
+        super().__init__(
+            status_code=429,
+            detail=f"Rate limit exceeded: {result.limit} requests",
+            headers=result.headers(),
+        )
+
+
+class Limiter:
+    """Rate limiter applied to endpoints with the `limit` decorator"""
+
+    def __init__(
+        self,
+        backend: Optional[RateLimitBackend] = None,
+        key_func: Callable[[Request], str] = get_rate_limit_key,
+    ):
+        """
+        Initialize limiter
+
+        Args:
+            backend: Storage backend (defaults to per-process memory)
+            key_func: Function identifying the caller
+        """
+        self.backend = backend or MemoryBackend()
+        self.key_func = key_func
+        self.enabled = True
+
+    async def check(self, request: Request, item: RateLimitItem, scope: str) -> RateLimitResult:
+        """
+        Count a request and raise if the limit is exceeded
+
+        Args:
+            request: Incoming request
+            item: Limit to apply
+            scope: Name separating the counters of different endpoints
+
+        Returns:
+            RateLimitResult: Outcome of the check
+        """
+        key = f"{scope}:{self.key_func(request)}"
+        if isinstance(self.backend, MemoryBackend):
+            result = self.backend.hit(key, item, time.time())
+        else:
+            result = await run_in_threadpool(self.backend.hit, key, item, time.time())
+
+        # Picked up by RateLimitHeadersMiddleware
+        request.state.rate_limit = result
+        if not result.allowed:
+            raise RateLimitExceeded(result)
+        return result
+
+    def limit(self, value: str) -> Callable:
+        """
+        Decorate an endpoint with a rate limit
+
+        The endpoint must accept a `request: Request` argument.
+
+        Args:
+            value: Limit like "100/minute"
+        """
+        item = RateLimitItem.parse(value)
+
+        def decorator(func: Callable) -> Callable:
+            scope = f"{func.__module__}.{func.__name__}"
+
+            @wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                request = kwargs.get("request")
+                if request is None:
+                    request = next((a for a in args if isinstance(a, Request)), None)
+                if self.enabled and request is not None:
+                    await self.check(request, item, scope)
+                return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+
+def create_backend(name: str) -> RateLimitBackend:
+    """
+    Create a rate limit backend by name
+
+    Args:
+        name: "memory" or "database"
+
+    Returns:
+        RateLimitBackend: The backend
+    """
+    if name == "memory":
+        return MemoryBackend()
+    if name == "database":
+        from .database import engine
+
+        return DatabaseBackend(engine)
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+# Initialize the rate limiter
+limiter = Limiter(create_backend(settings.rate_limit_backend if settings else "memory"))
@@ -0,0 +1,274 @@
+"""
+Read Cache Module
+Caches serialized list responses keyed by table version, with single-flight
+loading and ETag support
+
+Table versions live in the `table_versions` table and are bumped inside the
+writing transaction, so a write committed by any worker or by the posting
+engine invalidates the cached responses of every worker. Checking a cached
+entry costs one primary key lookup.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from fastapi import Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from app.models.database import TableVersion
+from .dialect import upsert_insert
+from .serialization import CompressedBody, compressed_response, dumps
+
+
+class TableVersions:
+    """Per-table version counters kept in memory, for a single process"""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+
+    def get(self, table: str) -> int:
+        """Get the current version of a table"""
+        return self.snapshot((table,))[0]
+
+    def snapshot(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        """Get the current versions of several tables"""
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, table: str) -> int:
+        """
+        Increment the version of a table
+
+        Args:
+            table: Table name
+
+        Returns:
+            int: New version
+        """
+        self._versions[table] = self._versions.get(table, 0) + 1
+        return self._versions[table]
+
+
+def bump_table_versions(connection: Connection, tables: Iterable[str]) -> None:
+    """
+    Increment the stored versions of tables within a transaction
+
+    Args:
+        connection: Connection of the writing transaction
+        tables: Names of the written tables
+    """
+    table = TableVersion.__table__
+    for name in sorted(tables):
+        statement = upsert_insert(connection.dialect.name, table).values(
+            table_name=name, version=1
+        )
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.table_name],
+                set_={"version": table.c.version + 1},
+            )
+        )
+
+
+class SharedTableVersions(TableVersions):
+    """Per-table version counters stored in the database, shared by all workers"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.engine: Optional[Engine] = None
+
+    def bind(self, engine: Engine) -> None:
+        """Read and write versions in this database (in memory until bound)"""
+        self.engine = engine
+
+    def snapshot(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        """Get the current versions of several tables"""
+        if self.engine is None:
+            return super().snapshot(tables)
+        tables = tuple(tables)
+        table = TableVersion.__table__
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(table.c.table_name, table.c.version).where(
+                    table.c.table_name.in_(tables)
+                )
+            ).all()
+        stored: Dict[str, int] = {row.table_name: row.version for row in rows}
+        return tuple(stored.get(name, 0) for name in tables)
+
+    def bump(self, table: str) -> int:
+        """
+        Increment the version of a table in its own transaction
+
+        Args:
+            table: Table name
+
+        Returns:
+            int: New version
+        """
+        if self.engine is None:
+            return super().bump(table)
+        with self.engine.begin() as connection:
+            bump_table_versions(connection, (table,))
+        return self.get(table)
+
+
+# Shared table version counters, bound to the database by app.core.database
+table_versions = SharedTableVersions()
+
+
+def track_table_versions(session_factory: sessionmaker, engine: Engine) -> None:
+    """
+    Register session hooks that bump table versions with each write
+
+    The bump runs in the writing transaction, so it commits or rolls back
+    together with the write.
+
+    Args:
+        session_factory: Session factory whose sessions should be tracked
+        engine: Database holding the shared versions
+    """
+    table_versions.bind(engine)
+
+    @event.listens_for(session_factory, "after_flush")
+    def _record_flush(session: Session, flush_context: Any) -> None:
+        tables = {
+            table
+            for table in (
+                getattr(obj, "__tablename__", None)
+                for obj in (*session.new, *session.dirty, *session.deleted)
+            )
+            if table
+        }
+        if tables:
+            bump_table_versions(session.connection(), tables)
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def _record_statement(orm_execute_state: ORMExecuteState) -> Any:
+        if not (
+            orm_execute_state.is_insert
+            or orm_execute_state.is_update
+            or orm_execute_state.is_delete
+        ):
+            return None
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is None:
+            return None
+        result = orm_execute_state.invoke_statement()
+        bump_table_versions(orm_execute_state.session.connection(), (table.name,))
+        return result
+
+
+@dataclass
+class CachedResponse:
+    """Serialized response body for a given table version"""
+
+    version: Tuple[int, ...]
+    body: bytes
+    etag: str
+    encoded: CompressedBody
+
+
+class ReadCache:
+    """Cache of serialized read responses with single-flight loading"""
+
+    def __init__(self, versions: TableVersions = table_versions):
+        """
+        Initialize read cache
+
+        Args:
+            versions: Table version counters used to validate entries
+        """
+        self.versions = versions
+        self._entries: Dict[str, CachedResponse] = {}
+        self._inflight: Dict[Tuple[str, Tuple[int, ...]], "asyncio.Future[CachedResponse]"] = {}
+
+    async def get(
+        self, key: str, tables: Tuple[str, ...], loader: Callable[[], Any]
+    ) -> CachedResponse:
+        """
+        Get a cached response, loading it if the tables changed
+
+        Concurrent calls for the same key and version share one load.
+
+        Args:
+            key: Cache key
+            tables: Tables the response depends on
+            loader: Blocking function returning the JSON-serializable payload
+
+        Returns:
+            CachedResponse: Current serialized response
+        """
+        version = await run_in_threadpool(self.versions.snapshot, tables)
+        entry = self._entries.get(key)
+        if entry and entry.version == version:
+            return entry
+
+        flight_key = (key, version)
+        future = self._inflight.get(flight_key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, version, loader))
+            self._inflight[flight_key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        return await asyncio.shield(future)
+
+    async def _load(
+        self, key: str, version: Tuple[int, ...], loader: Callable[[], Any]
+    ) -> CachedResponse:
+        """Run the loader off the event loop and store the serialized result"""
+        payload = await run_in_threadpool(loader)
+        body = dumps(payload)
+        # Versions are shared, so every worker tags the same data alike
+        etag = '"{}-{}"'.format(key, ".".join(map(str, version)))
+        entry = CachedResponse(
+            version=version, body=body, etag=etag, encoded=CompressedBody(body)
+        )
+        current = self._entries.get(key)
+        if current is None or current.version <= version:
+            self._entries[key] = entry
+        return entry
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Drop cached entries
+
+        Args:
+            key: Cache key to drop (None drops everything)
+        """
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def respond(
+        self,
+        request: Request,
+        key: str,
+        tables: Tuple[str, ...],
+        loader: Callable[[], Any],
+    ) -> Response:
+        """
+        Build a response, answering 304 when the client's ETag is current
+
+        Args:
+            request: Incoming request
+            key: Cache key
+            tables: Tables the response depends on
+            loader: Blocking function returning the JSON-serializable payload
+
+        Returns:
+            Response: JSON response or 304 Not Modified
+        """
+        entry = await self.get(key, tables, loader)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        client_etags = {
+            tag.strip() for tag in request.headers.get("if-none-match", "").split(",")
+        }
+        if entry.etag in client_etags:
+            return Response(status_code=304, headers=headers)
+        return compressed_response(request, entry.encoded, headers)
+
+
+# Shared read cache instance
+read_cache = ReadCache()
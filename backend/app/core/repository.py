@@ -5,10 +5,23 @@ Repository Module
 Contains specific repository classes for each model
 """
 
-from typing import Optional, List
+from typing import Dict, Iterable, List, NamedTuple, Optional
 from sqlalchemy.orm import Session
 from .base_repository import BaseRepository
-from app.models.database import Group, Message, BlacklistedChat, Config
+from .change_log import stamp_row
+from .dialect import upsert_insert
+from . import validation
+from sqlalchemy import case, func, insert, null, or_, select, update
+from app.models.database import (
+    Group,
+    Message,
+    BlacklistedChat,
+    Config,
+    ChangeLog,
+    ControlCommand,
+    EngineState,
+    EngineSnapshot,
+)
 from datetime import datetime
 
 
@@ -21,37 +34,28 @@ class GroupRepository(BaseRepository[Group]):
         super().__init__(Group, db)
 
     def get_group_by_identifier(self, identifier: str) -> Optional[Group]:
-        """Get a group by its identifier"""
+        """Get a group by any form of its identifier"""
         if self.db is None:
             raise ValueError("Database session not provided")
         return (
             self.db.query(self.model)
-            .filter(self.model.identifier == identifier)
+            .filter(self.model.canonical_key == validation.canonical_group_key(identifier))
             .first()
         )
 
     def get_all_groups(self) -> List[Group]:
-        """Get all groups"""
+        """Get all groups in ID order"""
         if self.db is None:
             raise ValueError("Database session not provided")
-        return self.db.query(self.model).all()
+        return self.db.query(self.model).order_by(self.model.id).all()
 
     def create_group(self, identifier: str) -> Group:
-        """Create a new group"""
+        """Create a new group (validated by the caller, see app.core.validation)"""
         if self.db is None:
             raise ValueError("Database session not provided")
-        
-        # Additional validation at repository level
-        if len(identifier) > 255:
-            raise ValueError("Group identifier must be at most 255 characters")
-        
-        # Validate group identifier format
-        if not (identifier.startswith('https://t.me/') or 
-                identifier.startswith('@') or 
-                identifier.lstrip('-').isdigit()):
-            raise ValueError("Group identifier must be a valid group link, username, or ID")
-        
-        group = Group(identifier=identifier)
+        group = Group(
+            identifier=identifier, canonical_key=validation.canonical_group_key(identifier)
+        )
         self.db.add(group)
         self.db.commit()
         self.db.refresh(group)
@@ -76,38 +80,91 @@ class MessageRepository(BaseRepository[Message]):
             raise ValueError("Database session not provided")
         return self.db.query(self.model).all()
 
-    def create_message(self, text: str) -> Message:
-        """Create a new message"""
+    def get_cycle_messages(self) -> List[Message]:
+        """Get the messages sent every cycle, i.e. those without a schedule"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        return (
+            self.db.query(self.model)
+            .filter(self.model.send_at.is_(None), self.model.recurrence.is_(None))
+            .all()
+        )
+
+    def get_scheduled_messages(self) -> List[Message]:
+        """Get the messages with a send time or recurrence"""
         if self.db is None:
             raise ValueError("Database session not provided")
-        
-        # Additional validation at repository level
-        if not text or len(text) > 4096:
-            raise ValueError("Message text must be between 1 and 4096 characters")
-        
-        # Check for potential harmful content
-        import re
-        harmful_patterns = [
-            r'<script',  # Potential XSS
-            r'javascript:',  # Potential XSS
-            r'on\w+\s*=',  # Potential event handlers
-        ]
-        
-        for pattern in harmful_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                raise ValueError("Message contains potentially harmful content")
-        
-        message = Message(text=text)
+        return (
+            self.db.query(self.model)
+            .filter(or_(self.model.send_at.isnot(None), self.model.recurrence.isnot(None)))
+            .all()
+        )
+
+    def create_message(
+        self,
+        text: str,
+        send_at: Optional[datetime] = None,
+        recurrence: Optional[str] = None,
+        active_from: Optional[datetime] = None,
+        active_until: Optional[datetime] = None,
+    ) -> Message:
+        """Create a new message (validated by the caller, see app.core.validation)"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        message = Message(
+            text=text,
+            send_at=send_at,
+            recurrence=recurrence,
+            active_from=active_from,
+            active_until=active_until,
+        )
         self.db.add(message)
         self.db.commit()
         self.db.refresh(message)
         return message
 
+    def set_last_run(self, message_id: int, last_run_at: datetime) -> None:
+        """
+        Record when a scheduled message last ran
+
+        A bulk update, which skips the change log hooks: a run is not a change
+        clients need to sync.
+        """
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        self.db.execute(
+            update(self.model)
+            .where(self.model.id == message_id)
+            .values(last_run_at=last_run_at)
+        )
+        self.db.commit()
+
     def delete_message(self, message_id: int) -> bool:
         """Delete a message by ID"""
         return self.delete(message_id)
 
 
+class BlacklistEntry(NamedTuple):
+    """Blacklist write waiting to be upserted"""
+
+    chat_id: str
+    reason: str
+    is_permanent: bool = True
+    expiry_time: Optional[datetime] = None
+
+    def merge(self, newer: "BlacklistEntry") -> "BlacklistEntry":
+        """
+        Combine with a later write for the same chat, as the upsert does
+
+        A permanent entry stays permanent and a temporary one keeps the later expiry.
+        """
+        if self.is_permanent or newer.is_permanent:
+            return newer._replace(is_permanent=True, expiry_time=None)
+        if self.expiry_time and newer.expiry_time and self.expiry_time > newer.expiry_time:
+            return newer._replace(expiry_time=self.expiry_time)
+        return newer
+
+
 class BlacklistRepository(BaseRepository[BlacklistedChat]):
     """
     Repository class for BlacklistedChat model
@@ -128,47 +185,82 @@ class BlacklistRepository(BaseRepository[BlacklistedChat]):
             raise ValueError("Database session not provided")
         return self.db.query(self.model).filter(self.model.chat_id == chat_id).first()
 
+    @staticmethod
+    def validate_entry(entry: BlacklistEntry) -> None:
+        """Validate a blacklist write, raising ValueError if it is invalid"""
+        validation.validate_chat_id(entry.chat_id)
+        validation.validate_reason(entry.reason)
+
     def add_to_blacklist(
         self, chat_id: str, reason: str, is_permanent: bool = True, expiry_time=None
-    ) -> BlacklistedChat:
-        """Add a chat to the blacklist"""
+    ) -> Optional[BlacklistedChat]:
+        """Add a chat to the blacklist, or extend the entry already there"""
         if self.db is None:
             raise ValueError("Database session not provided")
-        
-        # Additional validation at repository level
-        if not chat_id or len(chat_id) > 50:
-            raise ValueError("Chat ID must be between 1 and 50 characters")
-        
+        self.upsert_blacklist([BlacklistEntry(chat_id, reason, is_permanent, expiry_time)])
+        return self.get_blacklisted_chat_by_id(chat_id)
+
+    def upsert_blacklist(self, entries: Iterable[BlacklistEntry]) -> int:
+        """
+        Write blacklist entries in one transaction
+
+        Entries are validated by the caller, see `validate_entry`.
+
+        Each entry is a single upsert: an existing entry gets the new reason,
+        keeps the later expiry and never goes from permanent back to temporary.
+
+        Returns:
+            int: Number of chats written
+        """
+        if self.db is None:
+            raise ValueError("Database session not provided")
+
+        merged: Dict[str, BlacklistEntry] = {}
+        for entry in entries:
+            previous = merged.get(entry.chat_id)
+            merged[entry.chat_id] = previous.merge(entry) if previous else entry
+        if not merged:
+            return 0
+
+        table = self.model.__table__
+        dialect = self.db.get_bind().dialect.name
         try:
-            int(chat_id.lstrip('-'))  # Telegram chat IDs can be negative (for supergroups)
-        except ValueError:
-            raise ValueError("Chat ID must be a valid integer (with optional negative sign)")
-        
-        if not reason or len(reason) > 500:
-            raise ValueError("Reason must be between 1 and 500 characters")
-        
-        # Validate reason for harmful content
-        import re
-        harmful_patterns = [
-            r'<script',  # Potential XSS
-            r'javascript:',  # Potential XSS
-            r'on\w+\s*=',  # Potential event handlers
-        ]
-        
-        for pattern in harmful_patterns:
-            if re.search(pattern, reason, re.IGNORECASE):
-                raise ValueError("Reason contains potentially harmful content")
-        
-        blacklisted_chat = BlacklistedChat(
-            chat_id=chat_id,
-            reason=reason,
-            is_permanent=is_permanent,
-            expiry_time=expiry_time,
-        )
-        self.db.add(blacklisted_chat)
-        self.db.commit()
-        self.db.refresh(blacklisted_chat)
-        return blacklisted_chat
+            for entry in merged.values():
+                statement = upsert_insert(dialect, table).values(
+                    chat_id=entry.chat_id,
+                    reason=entry.reason,
+                    is_permanent=entry.is_permanent,
+                    expiry_time=None if entry.is_permanent else entry.expiry_time,
+                    version=0,
+                )
+                excluded = statement.excluded
+                permanent = or_(table.c.is_permanent.is_(True), excluded.is_permanent.is_(True))
+                statement = statement.on_conflict_do_update(
+                    index_elements=[table.c.chat_id],
+                    set_={
+                        "reason": excluded.reason,
+                        "is_permanent": permanent,
+                        "expiry_time": case(
+                            (permanent, null()),
+                            (
+                                or_(
+                                    table.c.expiry_time.is_(None),
+                                    table.c.expiry_time < excluded.expiry_time,
+                                ),
+                                excluded.expiry_time,
+                            ),
+                            else_=table.c.expiry_time,
+                        ),
+                    },
+                ).returning(table.c.id)
+                row_id = self.db.execute(statement).scalar_one()
+                # Core statements skip the mapper hooks, so record the change here
+                stamp_row(self.db.connection(), table, row_id)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(merged)
 
     def remove_from_blacklist(self, chat_id: str) -> bool:
         """Remove a chat from the blacklist"""
@@ -182,17 +274,18 @@ class BlacklistRepository(BaseRepository[BlacklistedChat]):
         return True
 
     def is_blacklisted(self, chat_id: str) -> bool:
-        """Check if a chat is blacklisted"""
+        """
+        Check if a chat is blacklisted
+
+        Expired entries count as not blacklisted; clean_expired_blacklist
+        removes them, so a read never turns into a delete and commit.
+        """
         blacklisted_chat = self.get_blacklisted_chat_by_id(chat_id)
         if not blacklisted_chat:
             return False
-        if not blacklisted_chat.is_permanent and blacklisted_chat.expiry_time:
-            from datetime import datetime
-
-            if blacklisted_chat.expiry_time < datetime.utcnow():
-                # Entry has expired, remove it from blacklist
-                self.remove_from_blacklist(chat_id)
-                return False
+        expiry_time: Optional[datetime] = blacklisted_chat.expiry_time
+        if not blacklisted_chat.is_permanent and expiry_time is not None:
+            return expiry_time >= datetime.utcnow()
         return True
 
     def clean_expired_blacklist(self) -> int:
@@ -243,33 +336,9 @@ class ConfigRepository(BaseRepository[Config]):
         return default
 
     def set_config(self, key: str, value: str, description: Optional[str] = None) -> Config:
-        """Set a config value"""
+        """Set a config value (validated by the caller, see app.core.validation)"""
         if self.db is None:
             raise ValueError("Database session not provided")
-        
-        # Additional validation at repository level
-        if not key or len(key) > 100:
-            raise ValueError("Config key must be between 1 and 100 characters")
-        
-        # Only allow alphanumeric, underscore, and hyphen in key
-        import re
-        if not re.match(r'^[a-zA-Z0-9_-]+$', key):
-            raise ValueError("Config key can only contain letters, numbers, underscores, and hyphens")
-        
-        if len(value) > 1000:
-            raise ValueError("Config value must be at most 1000 characters")
-        
-        # Check for harmful patterns in value
-        harmful_patterns = [
-            r'<script',  # Potential XSS
-            r'javascript:',  # Potential XSS
-            r'on\w+\s*=',  # Potential event handlers
-        ]
-        
-        for pattern in harmful_patterns:
-            if re.search(pattern, value, re.IGNORECASE):
-                raise ValueError("Config value contains potentially harmful content")
-        
         config = self.get_config_by_key(key)
         if config:
             config.value = value
@@ -289,4 +358,267 @@ class ConfigRepository(BaseRepository[Config]):
         """Get all configuration settings"""
         if self.db is None:
             raise ValueError("Database session not provided")
-        return self.db.query(self.model).all()
\ No newline at end of file
+        return self.db.query(self.model).all()
+
+
+class ChangeLogRepository(BaseRepository[ChangeLog]):
+    """
+    Repository class for ChangeLog model
+    """
+
+    def __init__(self, db: Optional[Session] = None):
+        super().__init__(ChangeLog, db)
+
+    def get_current_version(self) -> int:
+        """Get the latest sync version"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        return self.db.query(func.max(self.model.id)).scalar() or 0
+
+    def get_oldest_version(self) -> int:
+        """Get the oldest retained sync version"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        return self.db.query(func.min(self.model.id)).scalar() or 0
+
+    def get_deleted_ids(self, table_name: str, version: int) -> List[int]:
+        """Get IDs of rows deleted from a table after the given version"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        rows = (
+            self.db.query(self.model.row_id)
+            .filter(
+                self.model.id > version,
+                self.model.table_name == table_name,
+                self.model.operation == "delete",
+            )
+            .distinct()
+            .all()
+        )
+        return [row.row_id for row in rows]
+
+    def prune(self, keep: int) -> int:
+        """Delete all but the newest `keep` change log entries"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        cutoff = self.get_current_version() - keep
+        if cutoff <= 0:
+            return 0
+        count = (
+            self.db.query(self.model)
+            .filter(self.model.id <= cutoff)
+            .delete(synchronize_session=False)
+        )
+        self.db.commit()
+        return count
+
+
+class PendingCommand(NamedTuple):
+    """Command waiting for the leader"""
+
+    id: int
+    command: str
+    arguments: Optional[str]
+    created_at: datetime
+
+
+class CommandOutcome(NamedTuple):
+    """Result of a finished command"""
+
+    status: str
+    result: Optional[str]
+    error: Optional[str]
+
+
+class EngineStateRecord(NamedTuple):
+    """Engine state heartbeat written by the leader"""
+
+    leader_id: str
+    state: str
+    updated_at: datetime
+
+
+class ControlCommandRepository(BaseRepository[ControlCommand]):
+    """
+    Repository class for ControlCommand model
+    """
+
+    def __init__(self, db: Optional[Session] = None):
+        super().__init__(ControlCommand, db)
+
+    def create_command(self, command: str, arguments: str) -> int:
+        """Queue a command for the leader process and return its ID"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        command_id = self.db.execute(
+            insert(self.model)
+            .values(command=command, arguments=arguments, created_at=datetime.utcnow())
+            .returning(self.model.id)
+        ).scalar_one()
+        self.db.commit()
+        return command_id
+
+    def get_pending_commands(self) -> List[PendingCommand]:
+        """Get pending commands in submission order"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        model = self.model
+        rows = self.db.execute(
+            select(model.id, model.command, model.arguments, model.created_at)
+            .where(model.status == "pending")
+            .order_by(model.id)
+        ).all()
+        return [PendingCommand(*row) for row in rows]
+
+    def get_outcome(self, command_id: int) -> Optional[CommandOutcome]:
+        """Get the outcome of a command, None while it is pending or if it is gone"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        model = self.model
+        row = self.db.execute(
+            select(model.status, model.result, model.error).where(model.id == command_id)
+        ).first()
+        if row is None or row.status == "pending":
+            return None
+        return CommandOutcome(*row)
+
+    def complete_command(
+        self,
+        command_id: int,
+        status: str,
+        result: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> Optional[ControlCommand]:
+        """Record the outcome of a command, discarding its arguments"""
+        return self.update(
+            command_id,
+            {
+                "arguments": None,
+                "status": status,
+                "result": result,
+                "error": error,
+                "completed_at": datetime.utcnow(),
+            },
+        )
+
+    def expire_pending_before(self, cutoff: datetime) -> int:
+        """Expire commands pending since before the cutoff, discarding their arguments"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        count = self.db.execute(
+            update(self.model)
+            .where(self.model.status == "pending", self.model.created_at < cutoff)
+            .values(status="expired", arguments=None, completed_at=datetime.utcnow())
+        ).rowcount
+        self.db.commit()
+        return count
+
+    def delete_completed_before(self, cutoff: datetime) -> int:
+        """Delete finished commands older than the cutoff"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        count = (
+            self.db.query(self.model)
+            .filter(
+                self.model.status != "pending",
+                self.model.created_at < cutoff,
+            )
+            .delete(synchronize_session=False)
+        )
+        self.db.commit()
+        return count
+
+
+class EngineStateRepository(BaseRepository[EngineState]):
+    """
+    Repository class for EngineState model
+    """
+
+    def __init__(self, db: Optional[Session] = None):
+        super().__init__(EngineState, db)
+
+    def get_state(self) -> Optional[EngineStateRecord]:
+        """Get the latest engine state heartbeat"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        model = self.model
+        row = self.db.execute(
+            select(model.leader_id, model.state, model.updated_at).where(model.id == 1)
+        ).first()
+        return EngineStateRecord(*row) if row is not None else None
+
+    def set_state(self, leader_id: str, state: str) -> None:
+        """Write the engine state heartbeat"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        engine_state = self.get_by_id(1)
+        if engine_state:
+            engine_state.leader_id = leader_id
+            engine_state.state = state
+            engine_state.updated_at = datetime.utcnow()
+        else:
+            engine_state = EngineState(
+                id=1, leader_id=leader_id, state=state, updated_at=datetime.utcnow()
+            )
+            self.db.add(engine_state)
+        self.db.commit()
+
+
+class StoredSnapshot(NamedTuple):
+    """Encoded engine snapshot with the cycle position recorded since"""
+
+    data: bytes
+    last_group_id: Optional[int]
+
+
+class EngineSnapshotRepository(BaseRepository[EngineSnapshot]):
+    """
+    Repository class for EngineSnapshot model
+    """
+
+    def __init__(self, db: Optional[Session] = None):
+        super().__init__(EngineSnapshot, db)
+
+    def get_snapshot(self) -> Optional[StoredSnapshot]:
+        """Get the latest encoded engine snapshot and cycle position"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        model = self.model
+        row = self.db.execute(
+            select(model.data, model.last_group_id).where(model.id == 1)
+        ).first()
+        return StoredSnapshot(*row) if row is not None else None
+
+    def save_snapshot(self, data: bytes, last_group_id: Optional[int] = None) -> EngineSnapshot:
+        """Replace the engine snapshot"""
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        snapshot = self.get_by_id(1)
+        if snapshot:
+            snapshot.data = data
+            snapshot.last_group_id = last_group_id
+            snapshot.updated_at = datetime.utcnow()
+        else:
+            snapshot = EngineSnapshot(
+                id=1, data=data, last_group_id=last_group_id, updated_at=datetime.utcnow()
+            )
+            self.db.add(snapshot)
+        self.db.commit()
+        return snapshot
+
+    def save_position(self, last_group_id: Optional[int]) -> bool:
+        """
+        Record the cycle position without rewriting the snapshot
+
+        Returns:
+            bool: True if a snapshot existed to record it on
+        """
+        if self.db is None:
+            raise ValueError("Database session not provided")
+        result = self.db.execute(
+            update(self.model)
+            .where(self.model.id == 1)
+            .values(last_group_id=last_group_id, updated_at=datetime.utcnow())
+        )
+        self.db.commit()
+        return result.rowcount > 0
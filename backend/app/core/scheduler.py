@@ -0,0 +1,322 @@
+"""
+Message Scheduler Module
+One-shot and recurring messages, kept in a heap ordered by due time
+
+A message is scheduled when it has a send time, a recurrence or both:
+
+    send_at             Send once at this time, or with a recurrence, the
+                        first occurrence is not before it
+    recurrence          Cron expression "minute hour day month weekday",
+                        e.g. "0 9 * * 1-5" for 09:00 on weekdays
+    active_from/until   Occurrences outside this window are not sent
+
+Times are naive UTC, as stored by the models. Scheduled messages are sent to
+every group when due and are left out of the regular posting cycles; a
+message with only an active window stays in the cycles while the window is
+open. The heap holds the next occurrence of each scheduled message, so
+finding the messages due costs O(log n) per due message instead of a scan of
+every message. The heap is rebuilt only when the messages change.
+
+Occurrences missed while the engine was stopped follow the catch-up policy:
+"skip" drops them, "once" sends the message once on start and "all" sends
+every missed occurrence of the last `CATCH_UP_WINDOW`.
+"""
+
+import heapq
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+CATCH_UP_POLICIES = ("skip", "once", "all")
+
+# Lateness still counted as on time rather than missed
+DEFAULT_GRACE = timedelta(seconds=60)
+
+# How far back the "all" policy sends missed occurrences
+CATCH_UP_WINDOW = timedelta(hours=24)
+
+# Years searched for the next match of a cron expression, e.g. "0 0 29 2 *"
+CRON_SEARCH_YEARS = 8
+
+_CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+
+def _parse_field(text: str, name: str, low: int, high: int) -> FrozenSet[int]:
+    """Values of one cron field, written as *, lists, ranges and steps"""
+    values: Set[int] = set()
+    for part in text.split(","):
+        span, _, step_text = part.partition("/")
+        try:
+            step = int(step_text) if step_text else 1
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                start, end = (int(value) for value in span.split("-", 1))
+            else:
+                start = int(span)
+                # "5/15" means every 15 starting at 5
+                end = high if step_text else start
+        except ValueError:
+            raise ValueError(f"Invalid cron {name} field: {text!r}")
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"Cron {name} field out of range ({low}-{high}): {text!r}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule(NamedTuple):
+    """Parsed five-field cron expression"""
+
+    minutes: FrozenSet[int]
+    hours: FrozenSet[int]
+    days: FrozenSet[int]
+    months: FrozenSet[int]
+    # 0 is Sunday
+    weekdays: FrozenSet[int]
+    # Whether the day or weekday field is restricted; when both are, either matches
+    any_day: bool
+    any_weekday: bool
+
+    @classmethod
+    def parse(cls, expression: str) -> "CronSchedule":
+        """
+        Parse a cron expression
+
+        Args:
+            expression: "minute hour day month weekday"
+
+        Returns:
+            CronSchedule: Parsed schedule
+        """
+        fields = expression.split()
+        if len(fields) != len(_CRON_FIELDS):
+            raise ValueError("Cron expression must have 5 fields: minute hour day month weekday")
+        minutes, hours, days, months, weekdays = (
+            _parse_field(text, name, low, high)
+            for text, (name, low, high) in zip(fields, _CRON_FIELDS)
+        )
+        # 7 is Sunday too
+        weekdays = frozenset(day % 7 for day in weekdays)
+        return cls(
+            minutes, hours, days, months, weekdays,
+            any_day=fields[2] == "*",
+            any_weekday=fields[4] == "*",
+        )
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_days = moment.day in self.days
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment: datetime) -> Optional[datetime]:
+        """
+        First matching minute after a time
+
+        Args:
+            moment: Time to search from (exclusive)
+
+        Returns:
+            datetime: Next occurrence, or None if the expression never matches
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        last_year = candidate.year + CRON_SEARCH_YEARS
+        while candidate.year <= last_year:
+            if candidate.month not in self.months:
+                year, month = divmod(candidate.month, 12)
+                candidate = candidate.replace(
+                    year=candidate.year + year, month=month + 1, day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        return None
+
+
+@lru_cache(maxsize=256)
+def parse_cron(expression: str) -> CronSchedule:
+    """Parse a cron expression, cached as recurring messages reuse theirs"""
+    return CronSchedule.parse(expression)
+
+
+class ScheduledMessage(NamedTuple):
+    """Scheduled message as used by the scheduler"""
+
+    id: int
+    text: str
+    send_at: Optional[datetime] = None
+    recurrence: Optional[str] = None
+    active_from: Optional[datetime] = None
+    active_until: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
+    def next_run(self, after: datetime) -> Optional[datetime]:
+        """
+        First occurrence after a time, within the active window
+
+        Args:
+            after: Time to search from (exclusive)
+
+        Returns:
+            datetime: Next occurrence, or None if there is none
+        """
+        if self.recurrence is None:
+            due = self.send_at if self.send_at is not None and self.send_at > after else None
+        else:
+            # Neither before the send time nor before the window opens
+            for start in (self.send_at, self.active_from):
+                if start is not None and start - timedelta(microseconds=1) > after:
+                    after = start - timedelta(microseconds=1)
+            due = parse_cron(self.recurrence).next_after(after)
+        if due is None:
+            return None
+        if self.active_from is not None and due < self.active_from:
+            return None
+        if self.active_until is not None and due > self.active_until:
+            return None
+        return due
+
+
+def scheduled_message_rows(messages: Iterable[object]) -> List[ScheduledMessage]:
+    """Reduce message models to the fields the scheduler uses"""
+    return [
+        ScheduledMessage(*(getattr(message, name) for name in ScheduledMessage._fields))
+        for message in messages
+    ]
+
+
+class MessageScheduler:
+    """Next occurrence of each scheduled message, in a heap ordered by due time"""
+
+    def __init__(self, catch_up: str = "once", grace: timedelta = DEFAULT_GRACE):
+        """
+        Initialize scheduler
+
+        Args:
+            catch_up: Policy for occurrences missed while stopped ("skip", "once" or "all")
+            grace: Lateness still counted as on time
+        """
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Catch-up policy must be one of {', '.join(CATCH_UP_POLICIES)}")
+        self.catch_up = catch_up
+        self.grace = grace
+        # Data version the messages were loaded at (None before the first load)
+        self.version: Optional[int] = None
+        self._messages: Dict[int, ScheduledMessage] = {}
+        self._due: Dict[int, datetime] = {}
+        # (due, message ID); entries no longer matching _due are skipped when popped
+        self._heap: List[Tuple[datetime, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _first_due(self, message: ScheduledMessage, now: datetime) -> Optional[datetime]:
+        """Next occurrence of a message, applying the catch-up policy if it was missed"""
+        start = message.last_run_at
+        if start is None:
+            # A recurrence has no missed occurrences from before the message existed
+            start = datetime.min if message.recurrence is None else message.created_at or now
+        due = message.next_run(start)
+        if due is None or due >= now - self.grace:
+            return due
+        if self.catch_up == "skip":
+            return message.next_run(now - self.grace)
+        if self.catch_up == "once":
+            return now
+        return message.next_run(max(start, now - CATCH_UP_WINDOW))
+
+    def _push(self, message_id: int, due: Optional[datetime]) -> None:
+        if due is None:
+            self._due.pop(message_id, None)
+            return
+        self._due[message_id] = due
+        heapq.heappush(self._heap, (due, message_id))
+
+    def load(
+        self, messages: Iterable[ScheduledMessage], now: datetime, version: Optional[int] = None
+    ) -> None:
+        """
+        Replace the scheduled messages
+
+        Messages that did not change keep their due time, so an occurrence
+        that is late because a posting cycle was running is not treated as
+        missed.
+
+        Args:
+            messages: All scheduled messages
+            now: Current UTC time
+            version: Data version the messages were read at
+        """
+        previous, previous_due = self._messages, self._due
+        self._messages = {message.id: message for message in messages}
+        self._due = {}
+        for message_id, message in self._messages.items():
+            if previous.get(message_id) == message and message_id in previous_due:
+                self._due[message_id] = previous_due[message_id]
+            else:
+                due = self._first_due(message, now)
+                if due is not None:
+                    self._due[message_id] = due
+        self._heap = [(due, message_id) for message_id, due in self._due.items()]
+        heapq.heapify(self._heap)
+        self.version = version
+
+    def _discard_stale(self) -> None:
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due_at(self) -> Optional[datetime]:
+        """Due time of the earliest scheduled message"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Tuple[ScheduledMessage, datetime]]:
+        """
+        Take the messages due at a time off the schedule
+
+        Args:
+            now: Current UTC time
+
+        Returns:
+            list: (message, occurrence) pairs, earliest first
+        """
+        due = []
+        self._discard_stale()
+        while self._heap and self._heap[0][0] <= now:
+            occurrence, message_id = heapq.heappop(self._heap)
+            del self._due[message_id]
+            due.append((self._messages[message_id], occurrence))
+            self._discard_stale()
+        return due
+
+    def complete(self, message_id: int, occurrence: datetime, now: datetime) -> datetime:
+        """
+        Record a sent occurrence and schedule the next one
+
+        Args:
+            message_id: ID of the message sent
+            occurrence: Occurrence that was due
+            now: Current UTC time
+
+        Returns:
+            datetime: Last run time to store on the message
+        """
+        # "all" works through missed occurrences one by one, the others resume from now
+        last_run_at = occurrence if self.catch_up == "all" else now
+        message = self._messages[message_id]._replace(last_run_at=last_run_at)
+        self._messages[message_id] = message
+        self._push(message_id, self._first_due(message, now))
+        return last_run_at
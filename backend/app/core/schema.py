@@ -0,0 +1,163 @@
+"""
+Schema Module
+Migrates the database to the models' revision and detects schema drift
+
+Verifying the schema means reflecting every table, which is slow against a
+remote database. Once the schema has been migrated and verified, the Alembic
+head and a fingerprint of the model metadata are stored in `schema_info`.
+Later starts compare both with the code and skip reflection when they match.
+A schema that still differs from the models after migrating raises
+SchemaDriftError instead of being patched up.
+"""
+
+import datetime
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import MetaData, delete, inspect, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from app.models.database import Base, SchemaInfo
+from .leader import startup_lock
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "alembic")
+
+# Baseline revision, matching the schema older releases built with create_all
+LEGACY_REVISION = "9592e005a278"
+
+
+class SchemaDriftError(Exception):
+    """Raised when the database schema does not match the models"""
+
+
+def schema_fingerprint(metadata: MetaData = Base.metadata) -> str:
+    """
+    Fingerprint the tables, columns and indexes of model metadata
+
+    Args:
+        metadata: Model metadata
+
+    Returns:
+        str: Hex digest that changes whenever the declared schema changes
+    """
+    lines: List[str] = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        lines.append(f"table {table.name}")
+        for column in table.columns:
+            lines.append(
+                f"column {column.name} {column.type!r} nullable={column.nullable} "
+                f"pk={column.primary_key} unique={column.unique}"
+            )
+        for index in sorted(table.indexes, key=lambda i: str(i.name)):
+            columns = ",".join(column.name for column in index.columns)
+            lines.append(f"index {index.name} {columns} unique={index.unique}")
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()[:32]
+
+
+@lru_cache(maxsize=1)
+def head_revision() -> str:
+    """Alembic head revision shipped with the code"""
+    head = ScriptDirectory.from_config(_alembic_config()).get_current_head()
+    if head is None:
+        raise SchemaDriftError("No Alembic revisions found")
+    return head
+
+
+def _alembic_config(connection: Optional[Connection] = None) -> Config:
+    """Alembic configuration running migrations on the given connection"""
+    config = Config()
+    config.set_main_option("script_location", os.path.abspath(ALEMBIC_DIR))
+    config.attributes["connection"] = connection
+    return config
+
+
+def read_schema_info(engine: Engine) -> Optional[Tuple[str, str]]:
+    """
+    Read the revision and fingerprint the schema was last verified at
+
+    Args:
+        engine: Database engine
+
+    Returns:
+        tuple: (revision, fingerprint) or None if the schema was never verified
+    """
+    table = SchemaInfo.__table__
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(
+                select(table.c.revision, table.c.fingerprint).where(table.c.id == 1)
+            ).first()
+    except DBAPIError:
+        # No schema_info table yet
+        return None
+    return (row.revision, row.fingerprint) if row else None
+
+
+def _schema_diffs(connection: Connection) -> List[Any]:
+    """Differences between the database and the models, as reported by Alembic"""
+    return compare_metadata(MigrationContext.configure(connection), Base.metadata)
+
+
+def _migrate(connection: Connection) -> None:
+    """Upgrade to the head revision and verify the result against the models"""
+    config = _alembic_config(connection)
+    current = MigrationContext.configure(connection).get_current_revision()
+
+    if current is None and inspect(connection).has_table("groups"):
+        # Created by create_all before the schema was managed by migrations;
+        # every migration after the baseline still has to run on it
+        logger.info("Stamping unversioned database at revision %s", LEGACY_REVISION)
+        command.stamp(config, LEGACY_REVISION)
+
+    command.upgrade(config, "head")
+
+    diffs = _schema_diffs(connection)
+    if diffs:
+        raise SchemaDriftError(
+            f"Database schema differs from the models: {diffs}. If the database "
+            "predates migrations, stamp its revision with `alembic stamp` and restart"
+        )
+
+    table = SchemaInfo.__table__
+    connection.execute(delete(table))
+    connection.execute(
+        table.insert().values(
+            id=1,
+            revision=head_revision(),
+            fingerprint=schema_fingerprint(),
+            updated_at=datetime.datetime.utcnow(),
+        )
+    )
+
+
+def ensure_schema(engine: Engine) -> bool:
+    """
+    Bring the database schema up to date with the code
+
+    Args:
+        engine: Database engine
+
+    Returns:
+        bool: True if the schema was migrated and verified, False if it was already current
+    """
+    expected = (head_revision(), schema_fingerprint())
+    if read_schema_info(engine) == expected:
+        return False
+
+    # Workers started together would race to migrate, so take turns
+    with startup_lock(engine):
+        if read_schema_info(engine) == expected:
+            return False
+        with engine.begin() as connection:
+            _migrate(connection)
+    logger.info("Database schema migrated and verified at revision %s", expected[0])
+    return True
@@ -0,0 +1,143 @@
+"""
+Serialization Module
+Fast JSON encoding and response compression for API responses
+"""
+
+import datetime
+import gzip
+import json
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+# orjson and brotli are optional; fall back to the standard library
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None  # type: ignore
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None  # type: ignore
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+
+# Compression levels tuned for encode speed on cached payloads
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _default(obj: Any) -> Any:
+    """Encode types the standard library json module does not support"""
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize an object to compact JSON bytes
+
+    Args:
+        obj: JSON-serializable object (datetimes are encoded as ISO 8601)
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(
+        obj, separators=(",", ":"), ensure_ascii=False, default=_default
+    ).encode()
+
+
+def rows_to_dicts(rows: Iterable[Sequence[Any]], keys: Sequence[str]) -> list:
+    """
+    Map SQL result rows to JSON objects without loading ORM instances
+
+    Args:
+        rows: Result rows with values in `keys` order
+        keys: JSON field names
+
+    Returns:
+        list: One dict per row
+    """
+    return [dict(zip(keys, row)) for row in rows]
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class CompressedBody:
+    """Serialized body with lazily computed compressed variants"""
+
+    def __init__(self, body: bytes):
+        """
+        Initialize compressed body
+
+        Args:
+            body: Uncompressed response body
+        """
+        self.body = body
+        self._encoded: Dict[str, bytes] = {}
+
+    def encode(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """
+        Pick the best encoding accepted by the client
+
+        Args:
+            accept_encoding: Value of the Accept-Encoding header
+
+        Returns:
+            tuple: Encoded body and Content-Encoding (None if uncompressed)
+        """
+        if len(self.body) < COMPRESSION_MIN_SIZE:
+            return self.body, None
+
+        accepted = {token.split(";")[0].strip() for token in accept_encoding.split(",")}
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            return self.body, None
+
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+            else:
+                self._encoded[encoding] = gzip.compress(self.body, compresslevel=GZIP_LEVEL)
+        return self._encoded[encoding], encoding
+
+
+def compressed_response(
+    request: Request,
+    body: Union[bytes, CompressedBody],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Build a JSON response compressed according to the client's Accept-Encoding
+
+    Args:
+        request: Incoming request
+        body: Serialized JSON body (a CompressedBody reuses earlier compression)
+        headers: Extra response headers
+
+    Returns:
+        Response: JSON response
+    """
+    if not isinstance(body, CompressedBody):
+        body = CompressedBody(body)
+    content, encoding = body.encode(request.headers.get("accept-encoding", ""))
+
+    response_headers = dict(headers or {})
+    response_headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=response_headers)
@@ -1,17 +1,27 @@
 """
 Session Management Module
 Handles secure storage and management of user sessions
+
+Sessions are kept decrypted in memory and only re-read when the file on disk
+changes. Writes go to a temporary file that atomically replaces the store,
+under an advisory lock shared by every process using the same file.
 """
 
+import copy
 import json
 import os
-from typing import Optional, Dict, Any
+import tempfile
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, Tuple
 from cryptography.fernet import Fernet
 import logging
 import base64  # noqa: F401
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,6 +52,78 @@ class SessionManager:
         self.cipher = Fernet(self.encryption_key)
         self.session_file = "sessions.json"
 
+        # Parsed file contents and decrypted sessions, valid for one file version
+        self._file_signature: Optional[Tuple[int, int, int]] = None
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._decrypted: Dict[str, Dict[str, Any]] = {}
+
+    def _get_file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """Identify the current version of the session file (None if missing)"""
+        try:
+            stat = os.stat(self.session_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold an exclusive advisory lock on the session store"""
+        fd = os.open(f"{self.session_file}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read_sessions(self) -> Dict[str, Dict[str, Any]]:
+        """Return the stored (encrypted) sessions, re-reading the file only if it changed"""
+        signature = self._get_file_signature()
+        if signature != self._file_signature:
+            sessions: Dict[str, Dict[str, Any]] = {}
+            if signature is not None:
+                with open(self.session_file, "r") as f:
+                    sessions = json.load(f)
+            self._sessions = sessions
+            self._decrypted = {}
+            self._file_signature = signature
+        return self._sessions
+
+    def _write_sessions(self, sessions: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Atomically replace the session file
+
+        Must be called while holding `_file_lock`.
+        """
+        directory = os.path.dirname(os.path.abspath(self.session_file))
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=".sessions-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(sessions, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.session_file)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        # Make the rename itself durable
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+        self._sessions = sessions
+        self._decrypted = {}
+        self._file_signature = self._get_file_signature()
+
     def encrypt_data(self, data: str) -> bytes:
         """
         Encrypt data using Fernet cipher
@@ -78,9 +160,6 @@ class SessionManager:
             bool: True if saved successfully
         """
         try:
-            # Load existing sessions
-            sessions = self.load_all_sessions()
-
             # Encrypt sensitive data
             encrypted_session = {}
             for key, value in session_data.items():
@@ -89,18 +168,17 @@ class SessionManager:
                 else:
                     encrypted_session[key] = value
 
-            # Save session
-            sessions[user_id] = encrypted_session
+            # Re-read under the lock so concurrent writers don't lose updates
+            with self._file_lock():
+                sessions = dict(self._read_sessions())
+                sessions[user_id] = encrypted_session
+                self._write_sessions(sessions)
 
-            # Write to file
-            with open(self.session_file, "w") as f:
-                json.dump(sessions, f, indent=2)
-
-            logger.info(f"Session saved for user {user_id}")
+            logger.info("Session saved for user %s", user_id)
             return True
 
         except Exception as e:
-            logger.error(f"Error saving session: {e}")
+            logger.error("Error saving session: %s", e)
             return False
 
     def load_session(self, user_id: str) -> Optional[Dict[str, Any]]:
@@ -114,11 +192,14 @@ class SessionManager:
             dict: Session data or None if not found
         """
         try:
-            sessions = self.load_all_sessions()
+            sessions = self._read_sessions()
 
             if user_id not in sessions:
                 return None
 
+            if user_id in self._decrypted:
+                return dict(self._decrypted[user_id])
+
             # Decrypt sensitive data
             encrypted_session = sessions[user_id]
             session_data = {}
@@ -134,10 +215,11 @@ class SessionManager:
                     # If decryption fails, keep original value
                     session_data[key] = value
 
-            return session_data
+            self._decrypted[user_id] = session_data
+            return dict(session_data)
 
         except Exception as e:
-            logger.error(f"Error loading session: {e}")
+            logger.error("Error loading session: %s", e)
             return None
 
     def load_all_sessions(self) -> Dict[str, Dict[str, Any]]:
@@ -148,12 +230,9 @@ class SessionManager:
             dict: All sessions
         """
         try:
-            if os.path.exists(self.session_file):
-                with open(self.session_file, "r") as f:
-                    return json.load(f)
-            return {}
+            return copy.deepcopy(self._read_sessions())
         except Exception as e:
-            logger.error(f"Error loading sessions: {e}")
+            logger.error("Error loading sessions: %s", e)
             return {}
 
     def delete_session(self, user_id: str) -> bool:
@@ -167,22 +246,19 @@ class SessionManager:
             bool: True if deleted successfully
         """
         try:
-            sessions = self.load_all_sessions()
+            with self._file_lock():
+                sessions = dict(self._read_sessions())
+                if user_id not in sessions:
+                    return False
 
-            if user_id in sessions:
                 del sessions[user_id]
+                self._write_sessions(sessions)
 
-                # Write updated sessions to file
-                with open(self.session_file, "w") as f:
-                    json.dump(sessions, f, indent=2)
-
-                logger.info(f"Session deleted for user {user_id}")
-                return True
-
-            return False
+            logger.info("Session deleted for user %s", user_id)
+            return True
 
         except Exception as e:
-            logger.error(f"Error deleting session: {e}")
+            logger.error("Error deleting session: %s", e)
             return False
 
     def get_encryption_key(self) -> bytes:
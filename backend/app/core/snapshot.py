@@ -0,0 +1,173 @@
+"""
+Engine Snapshot Module
+Compact binary snapshot of the posting engine for warm restarts
+
+The leader writes a snapshot as the posting cycle advances. A restarted (or
+newly elected) leader loads it to pick up where the engine stopped: chat IDs
+resolved from group links, the position in the current cycle and when the
+next cycle is due. The cycle inputs (groups, messages, blacklist, intervals)
+are only reused if the database has not changed since the snapshot was taken.
+"""
+
+import json
+import struct
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+from .serialization import dumps
+
+SNAPSHOT_MAGIC = b"TGES"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Magic, format version and CRC32 of the compressed payload
+_HEADER = struct.Struct(">4sHI")
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot cannot be decoded"""
+
+
+def config_fingerprint(items: Iterable[Tuple[str, str]]) -> int:
+    """
+    Fingerprint configuration key/value pairs
+
+    Args:
+        items: Configuration keys and values
+
+    Returns:
+        int: CRC32 over the sorted pairs
+    """
+    return zlib.crc32("\n".join(f"{k}={v}" for k, v in sorted(items)).encode())
+
+
+@dataclass
+class SnapshotData:
+    """State captured by an engine snapshot"""
+
+    # Change log version and config fingerprint the cycle inputs were read at
+    data_version: int
+    config_version: int
+    running: bool = False
+    groups: List[Tuple[int, str]] = field(default_factory=list)
+    # (ID, text, active from, active until); snapshots from before windows
+    # existed hold (ID, text)
+    messages: List[Tuple] = field(default_factory=list)
+    # Blacklisted chat IDs with their expiry (Unix seconds, None if permanent)
+    blacklist: List[Tuple[str, Optional[float]]] = field(default_factory=list)
+    message_interval: Tuple[int, int] = (5, 10)
+    cycle_interval: Tuple[int, int] = (4200, 4680)
+    resolved_peers: Dict[str, int] = field(default_factory=dict)
+    # Chat titles learned from sends, for the {group} message variable
+    chat_titles: Dict[str, str] = field(default_factory=dict)
+    # Last group handled in the cycle in progress (None between cycles)
+    last_group_id: Optional[int] = None
+    # When the next cycle is due (Unix seconds, None if not scheduled)
+    next_cycle_at: Optional[float] = None
+    created_at: float = field(default_factory=time.time)
+
+    def encode(self) -> bytes:
+        """
+        Serialize to the binary snapshot format
+
+        Returns:
+            bytes: Header followed by zlib-compressed JSON
+        """
+        payload = zlib.compress(dumps(asdict(self)), 6)
+        return _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, zlib.crc32(payload)) + payload
+
+    @classmethod
+    def decode(cls, data: bytes) -> "SnapshotData":
+        """
+        Deserialize a binary snapshot
+
+        Args:
+            data: Bytes produced by `encode`
+
+        Returns:
+            SnapshotData: Decoded snapshot
+        """
+        if len(data) < _HEADER.size:
+            raise SnapshotError("Snapshot is truncated")
+        magic, version, checksum = _HEADER.unpack_from(data)
+        payload = data[_HEADER.size:]
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError("Unsupported snapshot format")
+        if zlib.crc32(payload) != checksum:
+            raise SnapshotError("Snapshot checksum mismatch")
+
+        try:
+            fields: Dict[str, Any] = json.loads(zlib.decompress(payload))
+            fields["groups"] = [tuple(g) for g in fields["groups"]]
+            fields["messages"] = [tuple(m) for m in fields["messages"]]
+            fields["blacklist"] = [tuple(b) for b in fields["blacklist"]]
+            fields["message_interval"] = tuple(fields["message_interval"])
+            fields["cycle_interval"] = tuple(fields["cycle_interval"])
+            return cls(**fields)
+        except (ValueError, KeyError, TypeError, zlib.error) as e:
+            raise SnapshotError(f"Invalid snapshot payload: {e}")
+
+    def is_fresh(self, data_version: int, config_version: int) -> bool:
+        """Check whether the cycle inputs still match the database"""
+        return self.data_version == data_version and self.config_version == config_version
+
+    def active_blacklist(self, now: Optional[float] = None) -> Set[str]:
+        """
+        Chat IDs still blacklisted at the given time
+
+        Args:
+            now: Unix time (defaults to the current time)
+        """
+        now = time.time() if now is None else now
+        return {
+            chat_id
+            for chat_id, expires_at in self.blacklist
+            if expires_at is None or expires_at > now
+        }
+
+
+class SnapshotGroup(NamedTuple):
+    """Group as used by a posting cycle"""
+
+    id: int
+    identifier: str
+
+
+class SnapshotMessage(NamedTuple):
+    """Message as used by a posting cycle"""
+
+    id: int
+    text: str
+    # Active window (Unix seconds, None if open-ended)
+    active_from: Optional[float] = None
+    active_until: Optional[float] = None
+
+    def is_active(self, now: float) -> bool:
+        """Check whether the message is inside its active window"""
+        return (self.active_from is None or self.active_from <= now) and (
+            self.active_until is None or now <= self.active_until
+        )
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    """Unix seconds of a naive UTC datetime"""
+    return None if value is None else value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def group_rows(groups: Sequence[Any]) -> List[Tuple[int, str]]:
+    """Reduce group models to the fields a snapshot keeps"""
+    return [(group.id, group.identifier) for group in groups]
+
+
+def message_rows(messages: Sequence[Any]) -> List[Tuple]:
+    """Reduce message models to the fields a snapshot keeps"""
+    return [
+        (
+            message.id,
+            message.text,
+            _timestamp(message.active_from),
+            _timestamp(message.active_until),
+        )
+        for message in messages
+    ]
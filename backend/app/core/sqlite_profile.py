@@ -0,0 +1,71 @@
+"""
+SQLite Profile Module
+Connection pragmas tuning SQLite for concurrent API and engine access
+
+With the driver defaults SQLite uses a rollback journal and fsyncs on every
+commit, so a writer locks out readers and the API and posting loop take turns
+on every blacklist commit. The production profile switches to WAL, where
+readers never block the writer. Commits sync only at checkpoints and waiting
+writers retry for `busy_timeout` milliseconds instead of failing with
+"database is locked".
+"""
+
+from dataclasses import dataclass
+from typing import List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# "default" leaves the driver defaults, "production" applies SQLiteProfile
+SQLITE_PROFILES = ("default", "production")
+
+
+@dataclass(frozen=True)
+class SQLiteProfile:
+    """Pragmas applied to every new SQLite connection"""
+
+    journal_mode: str = "WAL"
+    # NORMAL is durable in WAL mode except for the last commits on power loss
+    synchronous: str = "NORMAL"
+    # Milliseconds a connection waits for a lock before giving up
+    busy_timeout: int = 5000
+    # Bytes of the database file read through memory-mapped I/O
+    mmap_size: int = 256 * 1024 * 1024
+    # Page cache per connection in KiB
+    cache_size_kib: int = 64 * 1024
+    temp_store: str = "MEMORY"
+
+    def pragmas(self) -> List[str]:
+        """PRAGMA statements implementing the profile"""
+        return [
+            f"PRAGMA journal_mode={self.journal_mode}",
+            f"PRAGMA synchronous={self.synchronous}",
+            f"PRAGMA busy_timeout={int(self.busy_timeout)}",
+            f"PRAGMA mmap_size={int(self.mmap_size)}",
+            # Negative values are sizes in KiB rather than pages
+            f"PRAGMA cache_size=-{int(self.cache_size_kib)}",
+            f"PRAGMA temp_store={self.temp_store}",
+        ]
+
+
+def apply_sqlite_profile(engine: Engine, profile: SQLiteProfile) -> None:
+    """
+    Apply a profile to every connection the engine opens
+
+    Does nothing for other database backends.
+
+    Args:
+        engine: Database engine
+        profile: Pragmas to apply
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    statements = profile.pragmas()
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
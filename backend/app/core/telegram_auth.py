@@ -3,8 +3,10 @@ Telegram Authentication Module
 Handles user authentication with Telegram MTProto API using PyroFork
 """
 
+import asyncio
 import logging
-from typing import Optional
+import time
+from typing import Any, Dict, Optional
 from pyrogram import Client
 from pyrogram.errors import (
     PhoneCodeInvalid,
@@ -12,11 +14,18 @@ from pyrogram.errors import (
     PasswordHashInvalid,
     FloodWait,
 )
+from .database import engine
+from .telegram_storage import DatabaseStorage
+from .tracing import traced
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds before cached account information is refreshed from Telegram
+ACCOUNT_INFO_TTL = 300.0
+
+# Pyrogram client name, also keying the stored session and peer cache
+CLIENT_NAME = "telegram_userbot"
+
 
 class TelegramAuth:
     """Handle Telegram user authentication"""
@@ -35,7 +44,11 @@ class TelegramAuth:
         self.phone_number = phone_number
         self.client: Optional[Client] = None
         self.session_string: Optional[str] = None
+        self._account_info: Optional[Dict[str, Any]] = None
+        self._account_info_at = 0.0
+        self._account_info_refresh: Optional["asyncio.Task[Dict[str, Any]]"] = None
 
+    @traced("telegram.send_code")
     async def send_code(self) -> str:
         """
         Send authentication code to user's phone number
@@ -44,11 +57,15 @@ class TelegramAuth:
             str: Phone code hash
         """
         try:
+            # A new login starts from a new authorization; the peer cache is kept
+            storage = DatabaseStorage(CLIENT_NAME, engine)
+            await storage.reset_authorization()
             self.client = Client(
-                "telegram_userbot",
+                CLIENT_NAME,
                 api_id=self.api_id,
                 api_hash=self.api_hash,
                 phone_number=self.phone_number,
+                storage=storage,
             )
 
             # Send code request
@@ -57,12 +74,13 @@ class TelegramAuth:
             return sent_code.phone_code_hash
 
         except FloodWait as e:
-            logger.error(f"Flood wait for {e.value} seconds")
+            logger.error("Flood wait for %s seconds", e.value)
             raise
         except Exception as e:
-            logger.error(f"Error sending code: {e}")
+            logger.error("Error sending code: %s", e)
             raise
 
+    @traced("telegram.sign_in")
     async def sign_in(self, code: str, phone_code_hash: str) -> bool:
         """
         Sign in with received code
@@ -97,9 +115,10 @@ class TelegramAuth:
             logger.error("Phone code expired")
             raise
         except Exception as e:
-            logger.error(f"Error signing in: {e}")
+            logger.error("Error signing in: %s", e)
             raise
 
+    @traced("telegram.check_password")
     async def sign_in_with_password(self, password: str) -> bool:
         """
         Sign in with password for 2FA enabled accounts
@@ -126,9 +145,10 @@ class TelegramAuth:
             logger.error("Invalid password")
             raise
         except Exception as e:
-            logger.error(f"Error signing in with password: {e}")
+            logger.error("Error signing in with password: %s", e)
             raise
 
+    @traced("telegram.start")
     async def start_client(self) -> bool:
         """
         Start the Telegram client with existing session
@@ -141,23 +161,33 @@ class TelegramAuth:
                 if not self.session_string:
                     raise Exception("No session string available")
 
-                # Initialize client with session string
+                # Keep the session and peer cache in the database, seeded
+                # from the session string on first start
                 self.client = Client(
-                    "telegram_userbot",
+                    CLIENT_NAME,
                     api_id=self.api_id,
                     api_hash=self.api_hash,
-                    session_string=self.session_string,
+                    storage=DatabaseStorage(
+                        CLIENT_NAME, engine, session_string=self.session_string
+                    ),
                 )
 
             # Start the client
             await self.client.start()
             logger.info("Telegram client started successfully")
+
+            # Capture account information so status checks need no RPC
+            try:
+                await self.get_me(force_refresh=True)
+            except Exception as e:
+                logger.warning("Could not fetch account information: %s", e)
             return True
 
         except Exception as e:
-            logger.error(f"Error starting client: {e}")
+            logger.error("Error starting client: %s", e)
             raise
 
+    @traced("telegram.stop")
     async def stop_client(self) -> bool:
         """
         Stop the Telegram client
@@ -172,7 +202,7 @@ class TelegramAuth:
                 return True
             return False
         except Exception as e:
-            logger.error(f"Error stopping client: {e}")
+            logger.error("Error stopping client: %s", e)
             raise
 
     def get_session_string(self) -> Optional[str]:
@@ -184,18 +214,81 @@ class TelegramAuth:
         """
         return self.session_string
 
-    async def get_me(self):
+    async def get_me(self, force_refresh: bool = False) -> Dict[str, Any]:
         """
         Get user information
+
+        Served from a TTL cache; concurrent refreshes share a single RPC.
+        A stale value is returned while the client is disconnected.
+
+        Args:
+            force_refresh: Ignore the cache and fetch from Telegram
+
+        Returns:
+            dict: User information
         """
+        if not force_refresh and self._account_info_is_fresh():
+            return self._account_info  # type: ignore
+
         if not self.client or not self.client.is_connected:
+            if self._account_info is not None:
+                return self._account_info
             raise Exception("Client not initialized or not connected. Call start_client() first.")
 
+        return await asyncio.shield(self._refresh_account_info())
+
+    def get_cached_me(self) -> Optional[Dict[str, Any]]:
+        """
+        Get cached user information without waiting on Telegram
+
+        Schedules a background refresh when the cached value has expired.
+
+        Returns:
+            dict: Cached user information or None if not fetched yet
+        """
+        if (
+            not self._account_info_is_fresh()
+            and self.client
+            and self.client.is_connected
+        ):
+            task = self._refresh_account_info()
+            task.add_done_callback(self._log_refresh_error)
+        return self._account_info
+
+    def _account_info_is_fresh(self) -> bool:
+        """Check whether cached account information is within its TTL"""
+        return (
+            self._account_info is not None
+            and time.monotonic() - self._account_info_at < ACCOUNT_INFO_TTL
+        )
+
+    def _refresh_account_info(self) -> "asyncio.Task[Dict[str, Any]]":
+        """Start a refresh unless one is already in flight"""
+        if self._account_info_refresh is None or self._account_info_refresh.done():
+            self._account_info_refresh = asyncio.ensure_future(
+                self._fetch_account_info()
+            )
+        return self._account_info_refresh
+
+    @traced("telegram.get_me")
+    async def _fetch_account_info(self) -> Dict[str, Any]:
+        """Fetch account information from Telegram and cache it"""
+        if not self.client:
+            raise Exception("Client not initialized")
+
         user = await self.client.get_me()
-        return {
+        self._account_info = {
             "id": user.id,
             "username": user.username,
             "first_name": user.first_name,
             "last_name": user.last_name,
             "phone_number": user.phone_number
         }
+        self._account_info_at = time.monotonic()
+        return self._account_info
+
+    @staticmethod
+    def _log_refresh_error(task: "asyncio.Task[Dict[str, Any]]") -> None:
+        """Log errors from background account information refreshes"""
+        if not task.cancelled() and task.exception():
+            logger.warning("Error refreshing account information: %s", task.exception())
@@ -0,0 +1,396 @@
+"""
+Telegram Storage Module
+Pyrogram session storage kept in the application database
+
+Pyrogram otherwise stores the auth key and peer cache in a local SQLite file,
+or in memory when started from a session string, in which case every peer
+has to be resolved again after a restart. This storage keeps both in the
+application database so restarts are warm and containers hold no state.
+Peers arrive with almost every update, so they are buffered and written in
+batches.
+"""
+
+import base64
+import logging
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+from pyrogram.storage import Storage
+from pyrogram.storage.sqlite_storage import get_input_peer
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from app.models.database import TelegramPeer, TelegramSession, TelegramUsername
+from .dialect import upsert_insert
+
+logger = logging.getLogger(__name__)
+
+# Buffered peers are written once this many are pending...
+PEER_BATCH_SIZE = 200
+
+# ...or once the oldest pending peer has waited this many seconds
+PEER_FLUSH_INTERVAL = 5.0
+
+SESSION_FIELDS = ("dc_id", "api_id", "test_mode", "auth_key", "date", "user_id", "is_bot")
+
+# (id, access_hash, type, username, phone_number), as pyrogram passes them
+PeerRow = Tuple[int, int, str, str, str]
+
+UpdateState = Tuple[int, int, int, int, int]
+
+# Default of the session accessors: called without a value they read the field,
+# as None is a value pyrogram writes
+_UNSET: Any = object()
+
+
+class DatabaseStorage(Storage):
+    """Pyrogram storage backed by the telegram_* tables"""
+
+    USERNAME_TTL = 8 * 60 * 60
+
+    def __init__(self, name: str, engine: Engine, session_string: Optional[str] = None):
+        """
+        Initialize database storage
+
+        Args:
+            name: Pyrogram client name, separating sessions in the same database
+            engine: Database engine
+            session_string: Session imported when the database holds none yet
+        """
+        super().__init__(name)
+        self.engine = engine
+        self.session_string = session_string
+        self._session: Dict[str, Any] = {}
+        # Account of the authorization reset for a new login, see reset_authorization
+        self._previous_user_id: Optional[int] = None
+        self._update_state: Dict[int, UpdateState] = {}
+        self._pending_peers: Dict[int, PeerRow] = {}
+        self._pending_usernames: Dict[int, List[str]] = {}
+        self._pending_since = 0.0
+
+    # Session
+
+    def _load_session(self) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(TelegramSession.__table__).where(
+                    TelegramSession.name == self.name
+                )
+            ).mappings().first()
+        return {field: row[field] for field in SESSION_FIELDS} if row else None
+
+    def _write_session(self) -> None:
+        table = TelegramSession.__table__
+        values = {"name": self.name, **self._session}
+        statement = upsert_insert(self.engine.dialect.name, table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={field: statement.excluded[field] for field in SESSION_FIELDS},
+        )
+        with self.engine.begin() as connection:
+            connection.execute(statement)
+
+    def _import_session_string(self, session_string: str) -> None:
+        """Unpack a session string into the session fields"""
+        packed = base64.urlsafe_b64decode(session_string + "=" * (-len(session_string) % 4))
+        if len(session_string) in (self.SESSION_STRING_SIZE, self.SESSION_STRING_SIZE_64):
+            fmt = (
+                self.OLD_SESSION_STRING_FORMAT
+                if len(session_string) == self.SESSION_STRING_SIZE
+                else self.OLD_SESSION_STRING_FORMAT_64
+            )
+            dc_id, test_mode, auth_key, user_id, is_bot = struct.unpack(fmt, packed)
+            api_id = None
+        else:
+            dc_id, api_id, test_mode, auth_key, user_id, is_bot = struct.unpack(
+                self.SESSION_STRING_FORMAT, packed
+            )
+        self._session.update(
+            dc_id=dc_id,
+            api_id=api_id,
+            test_mode=test_mode,
+            auth_key=auth_key,
+            date=0,
+            user_id=user_id,
+            is_bot=is_bot,
+        )
+
+    async def open(self):
+        stored = await run_in_threadpool(self._load_session)
+        self._session = dict.fromkeys(SESSION_FIELDS)
+        self._session.update(dc_id=2, date=0)
+        if self.session_string:
+            self._import_session_string(self.session_string)
+
+        if stored is not None:
+            if not self.session_string or stored["auth_key"] == self._session["auth_key"]:
+                self._session = stored
+                return
+            # A different account: its peers' access hashes are useless to us
+            await self.delete()
+            logger.info("Replaced stored Telegram session with the configured one")
+
+        await run_in_threadpool(self._write_session)
+
+    async def save(self):
+        self._session["date"] = int(time.time())
+        await self.flush()
+        await run_in_threadpool(self._write_session)
+
+    async def close(self):
+        await self.flush()
+
+    def _remove(self, session: bool, peers: bool) -> None:
+        """Delete the stored session and/or peer cache of this client"""
+        sessions = TelegramSession.__table__
+        tables = ([sessions] if session else []) + (
+            [TelegramPeer.__table__, TelegramUsername.__table__] if peers else []
+        )
+        with self.engine.begin() as connection:
+            for table in tables:
+                key = table.c.name if table is sessions else table.c.session_name
+                connection.execute(delete(table).where(key == self.name))
+
+    async def delete(self):
+        """Forget the authorization and peer cache of this client"""
+        self._pending_peers.clear()
+        self._pending_usernames.clear()
+        await run_in_threadpool(self._remove, True, True)
+
+    async def reset_authorization(self) -> None:
+        """
+        Forget the authorization so the next connection starts a new login
+
+        The peer cache is kept, as access hashes stay valid for the same
+        account; it is dropped once a different account signs in.
+        """
+        stored = await run_in_threadpool(self._load_session)
+        self._previous_user_id = stored["user_id"] if stored else None
+        await run_in_threadpool(self._remove, True, False)
+
+    async def _accessor(self, field: str, value: Any) -> Any:
+        if value is _UNSET:
+            return self._session.get(field)
+        if self._session.get(field) != value:
+            self._session[field] = value
+            await run_in_threadpool(self._write_session)
+
+    async def dc_id(self, value: Optional[int] = _UNSET):
+        return await self._accessor("dc_id", value)
+
+    async def api_id(self, value: Optional[int] = _UNSET):
+        return await self._accessor("api_id", value)
+
+    async def test_mode(self, value: Optional[bool] = _UNSET):
+        return await self._accessor("test_mode", value)
+
+    async def auth_key(self, value: Optional[bytes] = _UNSET):
+        return await self._accessor("auth_key", value)
+
+    async def date(self, value: Optional[int] = _UNSET):
+        # Written with the next save rather than on every change
+        if value is _UNSET:
+            return self._session.get("date")
+        self._session["date"] = value
+
+    async def user_id(self, value: Optional[int] = _UNSET):
+        previous = self._previous_user_id
+        if value is not _UNSET and value is not None and previous is not None:
+            self._previous_user_id = None
+            if value != previous:
+                # The cached access hashes belong to the account signed in before
+                self._pending_peers.clear()
+                self._pending_usernames.clear()
+                await run_in_threadpool(self._remove, False, True)
+        return await self._accessor("user_id", value)
+
+    async def is_bot(self, value: Optional[bool] = _UNSET):
+        return await self._accessor("is_bot", value)
+
+    async def update_state(self, value: Union[int, UpdateState] = _UNSET):
+        # Only needed to recover missed updates, which the userbot skips
+        if value is _UNSET:
+            return list(self._update_state.values())
+        if isinstance(value, int):
+            self._update_state.pop(value, None)
+        else:
+            self._update_state[value[0]] = value
+
+    async def remove_state(self, chat_id):
+        self._update_state.pop(chat_id, None)
+
+    # Peers
+
+    async def update_peers(self, peers: List[PeerRow]):
+        if not peers:
+            return
+        if not self._pending_peers:
+            self._pending_since = time.monotonic()
+        for peer in peers:
+            self._pending_peers[peer[0]] = peer
+        await self._maybe_flush()
+
+    async def update_usernames(self, usernames: List[Tuple[int, str]]):
+        if not usernames:
+            return
+        if not self._pending_peers and not self._pending_usernames:
+            self._pending_since = time.monotonic()
+        grouped: Dict[int, List[str]] = {}
+        for peer_id, username in usernames:
+            grouped.setdefault(peer_id, []).append(username)
+        self._pending_usernames.update(grouped)
+        await self._maybe_flush()
+
+    async def _maybe_flush(self) -> None:
+        pending = len(self._pending_peers) + len(self._pending_usernames)
+        if (
+            pending >= PEER_BATCH_SIZE
+            or time.monotonic() - self._pending_since >= PEER_FLUSH_INTERVAL
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write buffered peers and usernames in one transaction"""
+        if not self._pending_peers and not self._pending_usernames:
+            return
+        peers = list(self._pending_peers.values())
+        usernames = self._pending_usernames
+        self._pending_peers = {}
+        self._pending_usernames = {}
+        try:
+            await run_in_threadpool(self._write_peers, peers, usernames)
+        except Exception as e:
+            logger.error("Error writing Telegram peer cache: %s", e)
+
+    def _write_peers(self, peers: List[PeerRow], usernames: Dict[int, List[str]]) -> None:
+        now = int(time.time())
+        peer_table = TelegramPeer.__table__
+        username_table = TelegramUsername.__table__
+
+        with self.engine.begin() as connection:
+            if peers:
+                statement = upsert_insert(self.engine.dialect.name, peer_table)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[peer_table.c.session_name, peer_table.c.id],
+                    set_={
+                        column: statement.excluded[column]
+                        for column in (
+                            "access_hash",
+                            "type",
+                            "username",
+                            "phone_number",
+                            "last_update_on",
+                        )
+                    },
+                )
+                connection.execute(
+                    statement,
+                    [
+                        {
+                            "session_name": self.name,
+                            "id": peer_id,
+                            "access_hash": access_hash,
+                            "type": peer_type,
+                            "username": username,
+                            "phone_number": phone_number,
+                            "last_update_on": now,
+                        }
+                        for peer_id, access_hash, peer_type, username, phone_number in peers
+                    ],
+                )
+
+            if usernames:
+                connection.execute(
+                    delete(username_table).where(
+                        username_table.c.session_name == self.name,
+                        username_table.c.peer_id.in_(list(usernames)),
+                    )
+                )
+                statement = upsert_insert(self.engine.dialect.name, username_table)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[username_table.c.session_name, username_table.c.username],
+                    set_={
+                        "peer_id": statement.excluded.peer_id,
+                        "last_update_on": statement.excluded.last_update_on,
+                    },
+                )
+                connection.execute(
+                    statement,
+                    [
+                        {
+                            "session_name": self.name,
+                            "username": username,
+                            "peer_id": peer_id,
+                            "last_update_on": now,
+                        }
+                        for peer_id, names in usernames.items()
+                        for username in names
+                    ],
+                )
+
+    def _find_peer(self, **criteria: Any) -> Optional[Tuple[int, int, str, int]]:
+        table = TelegramPeer.__table__
+        statement = (
+            select(table.c.id, table.c.access_hash, table.c.type, table.c.last_update_on)
+            .where(table.c.session_name == self.name)
+            .order_by(table.c.last_update_on.desc())
+            .limit(1)
+        )
+        for column, value in criteria.items():
+            statement = statement.where(table.c[column] == value)
+        with self.engine.connect() as connection:
+            row = connection.execute(statement).first()
+        return tuple(row) if row else None  # type: ignore
+
+    def _find_username(self, username: str) -> Optional[Tuple[int, int]]:
+        table = TelegramUsername.__table__
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(table.c.peer_id, table.c.last_update_on).where(
+                    table.c.session_name == self.name, table.c.username == username
+                )
+            ).first()
+        return tuple(row) if row else None  # type: ignore
+
+    async def get_peer_by_id(self, peer_id: int):
+        pending = self._pending_peers.get(peer_id)
+        if pending is not None:
+            return get_input_peer(*pending[:3])
+
+        row = await run_in_threadpool(self._find_peer, id=peer_id)
+        if row is None:
+            raise KeyError(f"ID not found: {peer_id}")
+        return get_input_peer(*row[:3])
+
+    async def get_peer_by_username(self, username: str):
+        for peer in self._pending_peers.values():
+            if peer[3] == username:
+                return get_input_peer(*peer[:3])
+        for peer_id, names in self._pending_usernames.items():
+            if username in names:
+                return await self.get_peer_by_id(peer_id)
+
+        row = await run_in_threadpool(self._find_peer, username=username)
+        if row is None:
+            alias = await run_in_threadpool(self._find_username, username)
+            if alias is None:
+                raise KeyError(f"Username not found: {username}")
+            if abs(time.time() - alias[1]) > self.USERNAME_TTL:
+                raise KeyError(f"Username expired: {username}")
+            row = await run_in_threadpool(self._find_peer, id=alias[0])
+            if row is None:
+                raise KeyError(f"Username not found: {username}")
+
+        if abs(time.time() - row[3]) > self.USERNAME_TTL:
+            raise KeyError(f"Username expired: {username}")
+        return get_input_peer(*row[:3])
+
+    async def get_peer_by_phone_number(self, phone_number: str):
+        for peer in self._pending_peers.values():
+            if peer[4] == phone_number:
+                return get_input_peer(*peer[:3])
+
+        row = await run_in_threadpool(self._find_peer, phone_number=phone_number)
+        if row is None:
+            raise KeyError(f"Phone number not found: {phone_number}")
+        return get_input_peer(*row[:3])
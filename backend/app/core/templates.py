@@ -0,0 +1,192 @@
+"""
+Message Templates Module
+Per-group variables in message texts, compiled once and rendered from a cache
+
+A message text may contain these placeholders:
+
+    {group}             Group title, or its identifier while the title is unknown
+    {identifier}        Group link, username or ID as added
+    {date}              Current UTC date, e.g. 2026-10-19
+    {rotate:a|b|c}      One of the options, moving on by one each cycle and
+                        spread across groups, e.g. for rotating links
+
+Anything else in braces is left as it is, so texts written before templates
+existed are sent unchanged. A text is compiled once into a render plan of
+literal chunks and variable slots. Rendered texts are kept in an LRU cache
+keyed by the text and the values of the variables it uses, so sending the
+same message to a group again costs a dictionary lookup. A text that renders
+longer than Telegram accepts raises TemplateError rather than being sent.
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple, Union
+from .validation import MAX_MESSAGE_LENGTH
+
+# Rendered texts kept in memory
+RENDER_CACHE_SIZE = 4096
+
+# Compiled texts kept in memory
+COMPILE_CACHE_SIZE = 1024
+
+PLACEHOLDER_PATTERN = re.compile(r"\{(group|identifier|date|rotate:([^{}]*))\}")
+
+
+class TemplateError(ValueError):
+    """Raised when a message text renders to a text Telegram would reject"""
+
+
+class TemplateContext(NamedTuple):
+    """Values available to a message sent to one group"""
+
+    group: str
+    identifier: str
+    date: str
+    # Position in the rotation; each {rotate:...} picks option rotation % count
+    rotation: int = 0
+
+
+_ROTATION = TemplateContext._fields.index("rotation")
+
+
+class Slot(NamedTuple):
+    """Variable in a compiled template"""
+
+    name: str
+    options: Tuple[str, ...] = ()
+
+
+class CompiledTemplate:
+    """Render plan of a message text"""
+
+    __slots__ = ("chunks", "uses", "rotation_period")
+
+    def __init__(self, chunks: Tuple[Union[str, Slot], ...]):
+        self.chunks = chunks
+        slots = [chunk for chunk in chunks if isinstance(chunk, Slot)]
+        # Context fields the output depends on, in TemplateContext order
+        used = {slot.name for slot in slots}
+        self.uses = tuple(
+            index for index, name in enumerate(TemplateContext._fields) if name in used
+        )
+        # Rotations this far apart render the same options
+        self.rotation_period = math.lcm(
+            *(len(slot.options) for slot in slots if slot.name == "rotation")
+        )
+
+    @property
+    def is_static(self) -> bool:
+        return not self.uses
+
+    def cache_key(self, context: TemplateContext) -> Tuple:
+        """Values of the variables this template uses"""
+        return tuple(
+            context.rotation % self.rotation_period if index == _ROTATION else context[index]
+            for index in self.uses
+        )
+
+    def render(self, context: TemplateContext) -> str:
+        parts = []
+        for chunk in self.chunks:
+            if isinstance(chunk, str):
+                parts.append(chunk)
+            elif chunk.name == "rotation":
+                parts.append(chunk.options[context.rotation % len(chunk.options)])
+            else:
+                parts.append(getattr(context, chunk.name))
+        return "".join(parts)
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_template(text: str) -> CompiledTemplate:
+    """
+    Compile a message text into literal chunks and variable slots
+
+    Args:
+        text: Message text
+
+    Returns:
+        CompiledTemplate: Render plan of the text
+    """
+    chunks: List[Union[str, Slot]] = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        if match.start() > position:
+            chunks.append(text[position:match.start()])
+        if match.group(2) is not None:
+            chunks.append(Slot("rotation", tuple(match.group(2).split("|"))))
+        else:
+            chunks.append(Slot(match.group(1)))
+        position = match.end()
+    if position < len(text):
+        chunks.append(text[position:])
+    return CompiledTemplate(tuple(chunks))
+
+
+class TemplateRenderer:
+    """Render message texts with an LRU cache of the output"""
+
+    def __init__(
+        self, cache_size: int = RENDER_CACHE_SIZE, max_length: int = MAX_MESSAGE_LENGTH
+    ):
+        """
+        Initialize renderer
+
+        Args:
+            cache_size: Maximum number of rendered texts kept
+            max_length: Longest rendered text allowed
+        """
+        self.cache_size = cache_size
+        self.max_length = max_length
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, text: str, context: TemplateContext) -> str:
+        """
+        Render a message text for one group
+
+        Args:
+            text: Message text
+            context: Values of the group being sent to
+
+        Returns:
+            str: Text to send
+        """
+        template = compile_template(text)
+        if template.is_static:
+            return self._check_length(text)
+
+        key = (text, template.cache_key(context))
+        with self._lock:
+            rendered = self._cache.get(key)
+            if rendered is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return rendered
+        rendered = self._check_length(template.render(context))
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = rendered
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rendered
+
+    def _check_length(self, rendered: str) -> str:
+        if len(rendered) > self.max_length:
+            raise TemplateError(
+                f"Rendered text is {len(rendered)} characters, over the limit of {self.max_length}"
+            )
+        return rendered
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared renderer used by the posting engine
+template_renderer = TemplateRenderer()
@@ -0,0 +1,302 @@
+"""
+Tracing Module
+Lightweight spans across API routes, repositories and Telegram calls
+
+A span records the name, attributes and monotonic duration of one operation.
+The current span is kept in a context variable, so spans opened while it is
+active become its children: across awaits, in tasks started from it and in
+`run_in_threadpool` calls. Finished spans go to a fixed-size ring buffer and
+are exported as OTLP JSON, which trace viewers such as Jaeger and the
+OpenTelemetry Collector import directly.
+
+Tracing is off by default. While disabled, `tracer.span()` returns a shared
+no-op span and `@traced` functions only pay for one attribute check.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Service name reported to trace viewers
+SERVICE_NAME = "telegram-userbot"
+
+# OTLP span status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation, used as a context manager"""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "attributes",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_time_ns",
+        "end_time_ns",
+        "error",
+        "_start",
+        "_token",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = ""
+        self.span_id = os.urandom(8).hex()
+        self.parent_id: Optional[str] = None
+        self.start_time_ns = 0
+        self.end_time_ns = 0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Set an attribute, e.g. the status code once a response is sent"""
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        if parent is None:
+            self.trace_id = os.urandom(16).hex()
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self._token = _current_span.set(self)
+        # Wall clock for the export, monotonic clock for the duration
+        self.start_time_ns = time.time_ns()
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        self.end_time_ns = self.start_time_ns + time.perf_counter_ns() - self._start
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.tracer._record(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_time_ns - self.start_time_ns) / 1e6
+
+
+class _NoopSpan:
+    """Stands in for a span while tracing is disabled"""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Encode an attribute value as an OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64-bit integers are strings in OTLP JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Create spans and keep the most recent finished ones"""
+
+    def __init__(self, buffer_size: int = 4096, enabled: bool = False):
+        """
+        Initialize tracer
+
+        Args:
+            buffer_size: Number of finished spans kept; older ones are dropped
+            enabled: Whether spans are recorded
+        """
+        self.enabled = enabled
+        self.dropped = 0
+        self._spans: Deque[Span] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool, buffer_size: Optional[int] = None) -> None:
+        """
+        Turn tracing on or off and resize the buffer
+
+        Args:
+            enabled: Whether spans are recorded
+            buffer_size: New buffer size, keeping the most recent spans
+        """
+        if buffer_size is not None and buffer_size != self._spans.maxlen:
+            with self._lock:
+                self._spans = deque(self._spans, maxlen=buffer_size)
+        self.enabled = enabled
+
+    def span(self, name: str, **attributes: Any) -> Any:
+        """
+        Start a span, to be used as `with tracer.span("name", key=value):`
+
+        Args:
+            name: Operation name
+            **attributes: Span attributes
+
+        Returns:
+            Span: The span, or a no-op span while tracing is disabled
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            if len(self._spans) == self._spans.maxlen:
+                self.dropped += 1
+            self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        """Finished spans, oldest first"""
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        """Drop all finished spans"""
+        with self._lock:
+            self._spans.clear()
+            self.dropped = 0
+
+    def export(self, clear: bool = False) -> Dict[str, Any]:
+        """
+        Export finished spans as an OTLP JSON trace request
+
+        Args:
+            clear: Drop the exported spans from the buffer
+
+        Returns:
+            dict: OTLP `ExportTraceServiceRequest` in its JSON encoding
+        """
+        with self._lock:
+            spans = list(self._spans)
+            if clear:
+                self._spans.clear()
+                self.dropped = 0
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": SERVICE_NAME}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [self._otlp_span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    @staticmethod
+    def _otlp_span(span: Span) -> Dict[str, Any]:
+        encoded: Dict[str, Any] = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_time_ns),
+            "endTimeUnixNano": str(span.end_time_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in span.attributes.items()
+            ],
+            "status": (
+                {"code": STATUS_ERROR, "message": span.error}
+                if span.error
+                else {"code": STATUS_OK}
+            ),
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+    def export_to_file(self, path: str, clear: bool = False) -> int:
+        """
+        Write finished spans to an OTLP JSON file
+
+        Args:
+            path: Output file path
+            clear: Drop the exported spans from the buffer
+
+        Returns:
+            int: Number of spans written
+        """
+        data = self.export(clear=clear)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        return len(data["resourceSpans"][0]["scopeSpans"][0]["spans"])
+
+
+def current_span() -> Optional[Span]:
+    """The innermost active span of the current context, if any"""
+    return _current_span.get()
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """
+    Record each call of a function or coroutine function as a span
+
+    Args:
+        name: Span name (defaults to the function's qualified name)
+
+    Returns:
+        Decorator wrapping the function
+    """
+
+    def decorator(func: F) -> F:
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with Span(tracer, span_name, {}):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with Span(tracer, span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+# Global tracer, configured from settings at startup
+tracer = Tracer()
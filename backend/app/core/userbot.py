@@ -5,53 +5,85 @@ Main implementation of the Telegram userbot functionality
 
 import asyncio
 import logging
-from typing import Optional, Any
-from pyrogram import Client, filters
-from pyrogram.types import Message
-from pyrogram.errors import (
-    FloodWait,
-    ChatWriteForbidden,
-    ChatForbidden,
-    ChatIdInvalid,
-    UserBlocked,
-    PeerIdInvalid,
-    ChannelInvalid,
-    UserBannedInChannel,
-    ChatRestricted,
-    SlowmodeWait,
-)
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Any, Tuple
 import random
-from datetime import datetime, timedelta
-from .telegram_auth import TelegramAuth
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
 from .config import settings
 from .session_manager import SessionManager
 from .repository import (
     GroupRepository,
     MessageRepository,
+    BlacklistEntry,
     BlacklistRepository,
     ConfigRepository,
+    ChangeLogRepository,
+    EngineSnapshotRepository,
+)
+from .change_log import CHANGE_LOG_RETENTION
+from .snapshot import (
+    SnapshotData,
+    SnapshotGroup,
+    SnapshotMessage,
+    config_fingerprint,
+    group_rows,
+    message_rows,
 )
 from .database import get_db_session
+from .event_bus import event_bus
+from .logging_config import SAMPLED
+from .query_stats import collect_queries
+from .scheduler import MessageScheduler, ScheduledMessage, scheduled_message_rows
+from .templates import TemplateContext, TemplateError, template_renderer
+from .tracing import traced, tracer
+from starlette.concurrency import run_in_threadpool
+
+# Pyrogram takes most of the import time; only the engine leader needs it,
+# so it is imported on first use
+if TYPE_CHECKING:
+    from pyrogram import Client
+    from .telegram_auth import TelegramAuth
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Longest sleep between checks for due scheduled messages, in seconds
+SCHEDULE_CHECK_INTERVAL = 10
+
 
 class TelegramUserbot:
     """Main Telegram userbot class"""
 
     def __init__(self):
         """Initialize the userbot"""
-        self.client: Optional[Client] = None
-        self.auth: Optional[TelegramAuth] = None
+        self.client: Optional["Client"] = None
+        self.auth: Optional["TelegramAuth"] = None
         self.session_manager = SessionManager()
         self.is_running = False
+        self._posting_task: Optional["asyncio.Task[None]"] = None
         self.db = get_db_session()
         self.group_repo = GroupRepository(self.db)
         self.message_repo = MessageRepository(self.db)
         self.blacklist_repo = BlacklistRepository(self.db)
         self.config_repo = ConfigRepository(self.db)
+        self.change_log_repo = ChangeLogRepository(self.db)
+        self.snapshot_repo = EngineSnapshotRepository(self.db)
+        # Chat IDs learned from sends, so group links are resolved only once
+        self.resolved_peers: Dict[str, int] = {}
+        # Chat titles learned from sends, for the {group} message variable
+        self.chat_titles: Dict[str, str] = {}
+        # Cycles started, moving {rotate:...} message variables on each cycle
+        self.cycles_started = 0
+        # Inputs and position of the current cycle, written as the snapshot
+        self._snapshot: Optional[SnapshotData] = None
+        # Snapshot loaded at startup, consumed by the first cycle
+        self._warm_start: Optional[SnapshotData] = None
+        self._warm_start_fresh = False
+        # Blacklist writes not yet flushed, see flush_blacklist_soon
+        self._pending_blacklist: Dict[str, BlacklistEntry] = {}
+        self._blacklist_flush: Optional["asyncio.Task[int]"] = None
+        # Next occurrences of scheduled messages
+        self.scheduler = MessageScheduler(settings.schedule_catch_up)
         self.config: dict[str, Any] = {
             "message_interval": (5, 10),  # 5-10 seconds between messages
             "cycle_interval": (4200, 4680),  # 1.1-1.3 hours between cycles (in seconds)
@@ -64,6 +96,8 @@ class TelegramUserbot:
         Returns:
             bool: True if initialization successful
         """
+        from .telegram_auth import TelegramAuth
+
         try:
             # Check if we have a session string
             session_data = self.session_manager.load_session("default")
@@ -96,11 +130,14 @@ class TelegramUserbot:
             # Load configuration from database
             self._load_config_from_db()
 
+            # Pick up where the previous leader stopped
+            self.load_snapshot()
+
             logger.info("Userbot initialized successfully")
             return True
 
         except Exception as e:
-            logger.error(f"Error initializing userbot: {e}")
+            logger.error("Error initializing userbot: %s", e)
             raise
 
     def _setup_event_handlers(self):
@@ -108,6 +145,9 @@ class TelegramUserbot:
         if not self.client:
             return
 
+        from pyrogram import Client, filters
+        from pyrogram.types import Message
+
         @self.client.on_message(filters.command("ping", prefixes=".") & filters.me)
         async def ping_handler(client: Client, message: Message):
             """Handle ping command"""
@@ -167,7 +207,7 @@ Telegram Userbot Commands:
             except ValueError:
                 self.config["cycle_interval"] = (4200, 4680)
         except Exception as e:
-            logger.error(f"Error loading configuration from database: {e}")
+            logger.error("Error loading configuration from database: %s", e)
             # Use default values
             self.config["message_interval"] = (5, 10)
             self.config["cycle_interval"] = (4200, 4680)
@@ -187,22 +227,36 @@ Telegram Userbot Commands:
                 await self.client.start()
 
             self.is_running = True
+            if self._posting_task is None or self._posting_task.done():
+                self._posting_task = asyncio.create_task(self.run_continuous_posting())
+            event_bus.publish("status", running=True, message="Userbot is running")
             logger.info("Userbot started successfully")
             return True
 
         except Exception as e:
-            logger.error(f"Error starting userbot: {e}")
+            logger.error("Error starting userbot: %s", e)
             raise
 
-    async def stop(self) -> bool:
+    async def stop(self, suspend: bool = False) -> bool:
         """
         Stop the userbot
 
+        Args:
+            suspend: Stopping for a shutdown or failover; the next leader
+                resumes posting if it was running
+
         Returns:
             bool: True if stopped successfully
         """
         try:
+            await self.flush_blacklist()
+            if self.client:
+                self.save_snapshot(running=suspend and self.is_running)
             self.is_running = False
+            if self._posting_task is not None and not self._posting_task.done():
+                self._posting_task.cancel()
+            self._posting_task = None
+            event_bus.publish("status", running=False, message="Userbot is stopped")
 
             if self.client and self.client.is_connected:
                 await self.client.stop()
@@ -214,7 +268,7 @@ Telegram Userbot Commands:
             return True
 
         except Exception as e:
-            logger.error(f"Error stopping userbot: {e}")
+            logger.error("Error stopping userbot: %s", e)
             raise
 
     async def authenticate_new_session(self, code: str, phone_code_hash: str) -> bool:
@@ -255,7 +309,7 @@ Telegram Userbot Commands:
             return True
 
         except Exception as e:
-            logger.error(f"Error authenticating new session: {e}")
+            logger.error("Error authenticating new session: %s", e)
             raise
 
     async def authenticate_with_password(self, password: str) -> bool:
@@ -295,7 +349,7 @@ Telegram Userbot Commands:
             return True
 
         except Exception as e:
-            logger.error(f"Error authenticating with password: {e}")
+            logger.error("Error authenticating with password: %s", e)
             raise
 
     def add_group(self, group_identifier: str) -> bool:
@@ -313,11 +367,11 @@ Telegram Userbot Commands:
             existing_group = self.group_repo.get_group_by_identifier(group_identifier)
             if not existing_group:
                 self.group_repo.create_group(group_identifier)
-                logger.info(f"Group {group_identifier} added to managed list")
+                logger.info("Group %s added to managed list", group_identifier)
                 return True
             return False
         except Exception as e:
-            logger.error(f"Error adding group: {e}")
+            logger.error("Error adding group: %s", e)
             return False
 
     def remove_group(self, group_identifier: str) -> bool:
@@ -334,29 +388,31 @@ Telegram Userbot Commands:
             group = self.group_repo.get_group_by_identifier(group_identifier)
             if group:
                 self.group_repo.delete_group(group.id)  # type: ignore
-                logger.info(f"Group {group_identifier} removed from managed list")
+                logger.info("Group %s removed from managed list", group_identifier)
                 return True
             return False
         except Exception as e:
-            logger.error(f"Error removing group: {e}")
+            logger.error("Error removing group: %s", e)
             return False
 
-    def add_message(self, message_text: str) -> bool:
+    def add_message(self, message_text: str, **schedule: Any) -> bool:
         """
         Add a message to the message queue
 
         Args:
             message_text: Text of the message to send
+            **schedule: send_at, recurrence, active_from and active_until of a
+                scheduled message (see app.core.scheduler)
 
         Returns:
             bool: True if added successfully
         """
         try:
-            self.message_repo.create_message(message_text)
-            logger.info(f"Message added to queue: {message_text[:50]}...")
+            self.message_repo.create_message(message_text, **schedule)
+            logger.info("Message added to queue: %.50s...", message_text)
             return True
         except Exception as e:
-            logger.error(f"Error adding message: {e}")
+            logger.error("Error adding message: %s", e)
             return False
 
     def remove_message(self, message_id: int) -> bool:
@@ -372,10 +428,10 @@ Telegram Userbot Commands:
         try:
             result = self.message_repo.delete_message(message_id)
             if result:
-                logger.info(f"Message {message_id} removed from queue")
+                logger.info("Message %s removed from queue", message_id)
             return result
         except Exception as e:
-            logger.error(f"Error removing message: {e}")
+            logger.error("Error removing message: %s", e)
             return False
 
     def update_config(self, config_key: str, config_value: Any) -> bool:
@@ -399,15 +455,15 @@ Telegram Userbot Commands:
                     min_val, max_val = map(int, str(config_value).split("-"))
                     self.config[config_key] = (min_val, max_val)
                 except ValueError:
-                    logger.error(f"Invalid format for {config_key}: {config_value}")
+                    logger.error("Invalid format for %s: %s", config_key, config_value)
                     return False
             else:
                 self.config[config_key] = config_value
 
-            logger.info(f"Configuration updated: {config_key} = {config_value}")
+            logger.info("Configuration updated: %s = %s", config_key, config_value)
             return True
         except Exception as e:
-            logger.error(f"Error updating configuration: {e}")
+            logger.error("Error updating configuration: %s", e)
             return False
 
     def add_to_blacklist(
@@ -425,26 +481,120 @@ Telegram Userbot Commands:
             bool: True if added successfully
         """
         try:
-            if duration:
-                # Temporary blacklist
-                expiry_time = datetime.utcnow() + timedelta(seconds=duration)
-                self.blacklist_repo.add_to_blacklist(
-                    chat_id, reason, False, expiry_time
-                )
-                logger.info(
-                    f"Chat {chat_id} temporarily "
-                    f"blacklisted for {duration} seconds: {reason}"
-                )
-            else:
-                # Permanent blacklist
-                self.blacklist_repo.add_to_blacklist(chat_id, reason, True)
-                logger.info(f"Chat {chat_id} permanently blacklisted: {reason}")
-
+            entry = self._blacklist_entry(chat_id, reason, duration)
+            self.blacklist_repo.add_to_blacklist(*entry)
+            self._log_blacklisted(entry, duration)
             return True
         except Exception as e:
-            logger.error(f"Error adding to blacklist: {e}")
+            logger.error("Error adding to blacklist: %s", e)
+            return False
+
+    def queue_blacklist(
+        self, chat_id: str, reason: str, duration: Optional[int] = None
+    ) -> bool:
+        """
+        Blacklist a chat with the next flush of queued writes
+
+        Writes for the same chat are merged: the later expiry wins and a
+        permanent entry stays permanent.
+
+        Args:
+            chat_id: Chat ID to blacklist
+            reason: Reason for blacklisting
+            duration: Duration in seconds for temporary blacklist (None for permanent)
+
+        Returns:
+            bool: True if queued
+        """
+        try:
+            entry = self._blacklist_entry(chat_id, reason, duration)
+            BlacklistRepository.validate_entry(entry)
+        except ValueError as e:
+            logger.error("Error adding to blacklist: %s", e)
             return False
 
+        previous = self._pending_blacklist.get(chat_id)
+        self._pending_blacklist[chat_id] = previous.merge(entry) if previous else entry
+        self._log_blacklisted(entry, duration)
+        return True
+
+    @traced("posting.flush_blacklist")
+    async def flush_blacklist(self) -> int:
+        """
+        Write queued blacklist entries in one transaction
+
+        Entries that could not be written stay queued for the next flush.
+
+        Returns:
+            int: Number of chats written
+        """
+        in_flight = self._blacklist_flush
+        if (
+            in_flight is not None
+            and not in_flight.done()
+            and in_flight is not asyncio.current_task()
+        ):
+            # Let a background flush finish first, so writes land in order
+            await asyncio.wait([in_flight])
+        if not self._pending_blacklist:
+            return 0
+        entries = list(self._pending_blacklist.values())
+        self._pending_blacklist = {}
+        try:
+            return await run_in_threadpool(self._write_blacklist, entries)
+        except Exception as e:
+            logger.error("Error writing blacklist: %s", e)
+            for entry in entries:
+                newer = self._pending_blacklist.get(entry.chat_id)
+                self._pending_blacklist[entry.chat_id] = entry.merge(newer) if newer else entry
+            return 0
+
+    def flush_blacklist_soon(self) -> None:
+        """
+        Flush queued blacklist entries in the background
+
+        Called after each group, so a crash loses at most the entries of the
+        group in progress while the cycle carries on without waiting for the
+        commit. A flush already in flight picks up later entries next time.
+        """
+        if not self._pending_blacklist:
+            return
+        if self._blacklist_flush is not None and not self._blacklist_flush.done():
+            return
+        self._blacklist_flush = asyncio.create_task(self.flush_blacklist())
+
+    @staticmethod
+    def _write_blacklist(entries: List[BlacklistEntry]) -> int:
+        """Upsert blacklist entries in a dedicated session"""
+        db = get_db_session()
+        try:
+            return BlacklistRepository(db).upsert_blacklist(entries)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _blacklist_entry(
+        chat_id: str, reason: str, duration: Optional[int]
+    ) -> BlacklistEntry:
+        """Build a blacklist entry, temporary if a duration is given"""
+        if duration:
+            expiry_time = datetime.utcnow() + timedelta(seconds=duration)
+            return BlacklistEntry(chat_id, reason, False, expiry_time)
+        return BlacklistEntry(chat_id, reason, True, None)
+
+    @staticmethod
+    def _log_blacklisted(entry: BlacklistEntry, duration: Optional[int]) -> None:
+        """Log a blacklisted chat"""
+        if entry.is_permanent:
+            logger.info("Chat %s permanently blacklisted: %s", entry.chat_id, entry.reason)
+        else:
+            logger.info(
+                "Chat %s temporarily blacklisted for %s seconds: %s",
+                entry.chat_id,
+                duration,
+                entry.reason,
+            )
+
     def remove_from_blacklist(self, chat_id: str) -> bool:
         """
         Remove a chat from the blacklist
@@ -458,10 +608,10 @@ Telegram Userbot Commands:
         try:
             result = self.blacklist_repo.remove_from_blacklist(chat_id)
             if result:
-                logger.info(f"Chat {chat_id} removed from blacklist")
+                logger.info("Chat %s removed from blacklist", chat_id)
             return result
         except Exception as e:
-            logger.error(f"Error removing from blacklist: {e}")
+            logger.error("Error removing from blacklist: %s", e)
             return False
 
     def clean_temporary_blacklist(self) -> int:
@@ -474,12 +624,163 @@ Telegram Userbot Commands:
         try:
             cleaned_count = self.blacklist_repo.clean_expired_blacklist()
             if cleaned_count > 0:
-                logger.info(f"Cleaned {cleaned_count} expired blacklist entries")
+                logger.info("Cleaned %s expired blacklist entries", cleaned_count)
             return cleaned_count
         except Exception as e:
-            logger.error(f"Error cleaning temporary blacklist: {e}")
+            logger.error("Error cleaning temporary blacklist: %s", e)
+            return 0
+
+    def prune_change_log(self) -> int:
+        """
+        Drop change log entries beyond the sync retention window
+
+        Returns:
+            int: Number of entries pruned
+        """
+        try:
+            pruned_count = self.change_log_repo.prune(CHANGE_LOG_RETENTION)
+            if pruned_count > 0:
+                logger.info("Pruned %s change log entries", pruned_count)
+            return pruned_count
+        except Exception as e:
+            logger.error("Error pruning change log: %s", e)
             return 0
 
+    def _get_data_versions(self, db: Optional[Session] = None) -> Tuple[int, int]:
+        """
+        Change log version and configuration fingerprint of the database
+
+        Args:
+            db: Session to read with (defaults to the engine's own)
+        """
+        config_repo = self.config_repo if db is None else ConfigRepository(db)
+        change_log_repo = self.change_log_repo if db is None else ChangeLogRepository(db)
+        configs = config_repo.get_all_configs()
+        return (
+            change_log_repo.get_current_version(),
+            config_fingerprint((c.key, c.value) for c in configs),
+        )
+
+    def _read_cycle_inputs(self, db: Optional[Session] = None) -> SnapshotData:
+        """
+        Read the groups, messages and blacklist a cycle works from
+
+        Args:
+            db: Session to read with (defaults to the engine's own)
+        """
+        blacklist_repo = self.blacklist_repo if db is None else BlacklistRepository(db)
+        group_repo = self.group_repo if db is None else GroupRepository(db)
+        message_repo = self.message_repo if db is None else MessageRepository(db)
+        data_version, config_version = self._get_data_versions(db)
+        blacklist = []
+        for chat in blacklist_repo.get_all_blacklisted_chats():
+            expires_at = None
+            if not chat.is_permanent and chat.expiry_time:
+                expires_at = chat.expiry_time.replace(tzinfo=timezone.utc).timestamp()
+            blacklist.append((chat.chat_id, expires_at))
+
+        return SnapshotData(
+            data_version=data_version,
+            config_version=config_version,
+            groups=group_rows(group_repo.get_all_groups()),
+            messages=message_rows(message_repo.get_cycle_messages()),
+            blacklist=blacklist,
+            message_interval=self.config["message_interval"],
+            cycle_interval=self.config["cycle_interval"],
+        )
+
+    def load_snapshot(self) -> Optional[SnapshotData]:
+        """
+        Load the engine snapshot written by the previous leader
+
+        Resolved chat IDs and the cycle position are always reused; the cycle
+        inputs only if the database has not changed since.
+
+        Returns:
+            SnapshotData: The snapshot, or None if there is no usable one
+        """
+        try:
+            stored = self.snapshot_repo.get_snapshot()
+            if stored is None:
+                return None
+            snapshot = SnapshotData.decode(stored.data)
+            snapshot.last_group_id = stored.last_group_id
+            fresh = snapshot.is_fresh(*self._get_data_versions())
+        except Exception as e:
+            logger.warning("Ignoring engine snapshot: %s", e)
+            return None
+
+        self.resolved_peers.update(snapshot.resolved_peers)
+        self.chat_titles.update(snapshot.chat_titles)
+        if fresh:
+            self.config["message_interval"] = snapshot.message_interval
+            self.config["cycle_interval"] = snapshot.cycle_interval
+        self._warm_start = snapshot
+        self._warm_start_fresh = fresh
+        logger.info(
+            "Loaded engine snapshot (%s, %s resolved chats)",
+            "fresh" if fresh else "stale",
+            len(snapshot.resolved_peers),
+        )
+        return snapshot
+
+    @property
+    def resume_requested(self) -> bool:
+        """Whether posting was running when the snapshot was taken"""
+        return bool(self._warm_start and self._warm_start.running)
+
+    def save_snapshot(self, running: Optional[bool] = None) -> None:
+        """
+        Write the engine snapshot
+
+        Args:
+            running: Running flag to record (defaults to the current state)
+        """
+        try:
+            data_version, config_version = self._get_data_versions()
+            snapshot = self._snapshot
+            if snapshot is None or not snapshot.is_fresh(data_version, config_version):
+                # Inputs changed (e.g. a chat was blacklisted): capture them again
+                inputs = self._read_cycle_inputs()
+                if snapshot is not None:
+                    inputs.last_group_id = snapshot.last_group_id
+                    inputs.next_cycle_at = snapshot.next_cycle_at
+                snapshot = self._snapshot = inputs
+
+            snapshot.running = self.is_running if running is None else running
+            snapshot.resolved_peers = dict(self.resolved_peers)
+            snapshot.chat_titles = dict(self.chat_titles)
+            snapshot.created_at = time.time()
+            self.snapshot_repo.save_snapshot(snapshot.encode(), snapshot.last_group_id)
+        except Exception as e:
+            logger.error("Error saving engine snapshot: %s", e)
+
+    async def save_position(self, last_group_id: Optional[int]) -> None:
+        """
+        Record the cycle position after a group, off the event loop
+
+        Only the position is written; the snapshot itself is written once
+        per cycle, see `save_snapshot`.
+
+        Args:
+            last_group_id: Last group handled in the cycle in progress
+        """
+        if self._snapshot is not None:
+            self._snapshot.last_group_id = last_group_id
+        try:
+            await run_in_threadpool(self._write_position, last_group_id)
+        except Exception as e:
+            logger.error("Error saving cycle position: %s", e)
+
+    @staticmethod
+    def _write_position(last_group_id: Optional[int]) -> None:
+        """Write the cycle position in a dedicated session"""
+        db = get_db_session()
+        try:
+            EngineSnapshotRepository(db).save_position(last_group_id)
+        finally:
+            db.close()
+
     def is_blacklisted(self, chat_id: str) -> bool:
         """
         Check if a chat is blacklisted
@@ -493,61 +794,165 @@ Telegram Userbot Commands:
         try:
             return self.blacklist_repo.is_blacklisted(chat_id)
         except Exception as e:
-            logger.error(f"Error checking blacklist status: {e}")
+            logger.error("Error checking blacklist status: %s", e)
             return False
 
-    async def send_messages_to_groups(self) -> bool:
+    async def send_messages_to_groups(
+        self,
+        inputs: Optional[SnapshotData] = None,
+        resume_after: Optional[int] = None,
+        messages: Optional[List[Tuple[int, str]]] = None,
+    ) -> bool:
         """
         Send messages to all managed groups
 
+        Args:
+            inputs: Cycle inputs from a fresh snapshot (read from the database if None)
+            resume_after: Skip groups up to this ID, already handled before a restart
+            messages: Scheduled messages to send instead of the cycle's; the
+                cycle position and snapshot are left as they are
+
         Returns:
             bool: True if messages sent successfully
         """
+        from pyrogram.errors import (
+            FloodWait,
+            ChatWriteForbidden,
+            ChatForbidden,
+            ChatIdInvalid,
+            UserBlocked,
+            PeerIdInvalid,
+            ChannelInvalid,
+            UserBannedInChannel,
+            ChatRestricted,
+            SlowmodeWait,
+            MessageTooLong,
+            MessageEmpty,
+            EntitiesTooLong,
+            EntityBoundsInvalid,
+        )
+
         try:
             if not self.client or not self.client.is_connected:
                 raise Exception("Client not connected")
 
+            if inputs is None:
+                # Clean temporary blacklist
+                self.clean_temporary_blacklist()
+                inputs = self._read_cycle_inputs()
+            cycle = messages is None
+            if messages is None:
+                self._snapshot = inputs
+                inputs.last_group_id = resume_after
+                inputs.next_cycle_at = None
+                # The inputs are written once per cycle, then only the position
+                self.save_snapshot()
+                messages = inputs.messages
+
             # Get all active messages
-            messages = self.message_repo.get_all_messages()
-            if not messages:
+            now = time.time()
+            active = [
+                message
+                for message in (SnapshotMessage(*row) for row in messages)
+                if message.is_active(now)
+            ]
+            if not active:
                 logger.info("No messages to send")
                 return True
 
             # Get all active groups
-            groups = self.group_repo.get_all_groups()
+            groups = [
+                SnapshotGroup(*row)
+                for row in inputs.groups
+                if resume_after is None or row[0] > resume_after
+            ]
             if not groups:
                 logger.info("No groups to send messages to")
                 return True
 
-            # Clean temporary blacklist
-            self.clean_temporary_blacklist()
+            blacklisted = inputs.active_blacklist()
+            # Chats posted to this cycle, so groups resolving to the same chat get one send
+            posted_chats = set()
 
             # Send messages to each group
-            for group in groups:
+            for index, group in enumerate(groups):
                 if not self.is_running:
                     break
 
-                # Skip blacklisted groups
-                if self.is_blacklisted(group.identifier):
-                    logger.info(f"Skipping blacklisted group: {group.identifier}")
+                if cycle:
+                    event_bus.publish(
+                        "cycle",
+                        phase="progress",
+                        groups_done=index,
+                        groups_total=len(groups),
+                    )
+
+                # Skip blacklisted groups, listed by identifier or resolved chat ID
+                resolved_id = self.resolved_peers.get(group.identifier)
+                if group.identifier in blacklisted or str(resolved_id) in blacklisted:
+                    logger.info("Skipping blacklisted group: %s", group.identifier)
+                    if cycle:
+                        inputs.last_group_id = group.id
+                    continue
+                if resolved_id in posted_chats:
+                    logger.info("Skipping group already posted this cycle: %s", group.identifier)
+                    if cycle:
+                        inputs.last_group_id = group.id
                     continue
 
+                # Values of the group's message variables
+                context = TemplateContext(
+                    group=self.chat_titles.get(group.identifier, group.identifier),
+                    identifier=group.identifier,
+                    date=datetime.now(timezone.utc).date().isoformat(),
+                    rotation=self.cycles_started + index,
+                )
+
                 # Send each message to the group
-                for message in messages:
+                for message in active:
                     if not self.is_running:
                         break
 
                     try:
-                        # Send message
-                        await self.client.send_message(group.identifier, message.text)
+                        text = template_renderer.render(message.text, context)
+                    except TemplateError as e:
+                        # The message is at fault, not the group
+                        logger.warning(
+                            "Not sending message %s to %s: %s", message.id, group.identifier, e
+                        )
+                        self._publish_send_failure(group, message, "MessageTooLong")
+                        continue
+
+                    try:
+                        # Send message, by chat ID once the link has been resolved
+                        chat_id = self.resolved_peers.get(group.identifier, group.identifier)
+                        with tracer.span("telegram.send_message", chat=str(chat_id)):
+                            sent = await self.client.send_message(chat_id, text)
+                        chat = getattr(sent, "chat", None)
+                        resolved_id = getattr(chat, "id", None)
+                        if isinstance(resolved_id, int):
+                            self.resolved_peers[group.identifier] = resolved_id
+                        title = getattr(chat, "title", None)
+                        if isinstance(title, str):
+                            self.chat_titles[group.identifier] = title
+                        event_bus.publish(
+                            "send",
+                            group=group.identifier,
+                            message_id=message.id,
+                            status="sent",
+                        )
+                        # One line per send adds up; only a sample is kept
                         logger.info(
-                            f"Message sent to {group.identifier}: "
-                            f"{message.text[:50]}..."
+                            "Message sent to %s: %.50s...",
+                            group.identifier,
+                            text,
+                            extra=SAMPLED,
                         )
 
                         # Wait for random interval between messages
                         interval = random.randint(*self.config["message_interval"])
-                        await asyncio.sleep(interval)
+                        with tracer.span("posting.sleep", reason="message_interval"):
+                            await asyncio.sleep(interval)
 
                     except (
                         ChatWriteForbidden,
@@ -560,88 +965,278 @@ Telegram Userbot Commands:
                         ChatRestricted,
                     ) as e:
                         logger.warning(
-                            f"Chat error for {group.identifier}: "
-                            f"{type(e).__name__}, adding to permanent blacklist"
+                            "Chat error for %s: %s, adding to permanent blacklist",
+                            group.identifier,
+                            type(e).__name__,
                         )
-                        self.add_to_blacklist(group.identifier, type(e).__name__)
+                        self._publish_send_failure(group, message, type(e).__name__)
+                        self.queue_blacklist(self._blacklist_id(group), type(e).__name__)
                         break
+                    except (
+                        MessageTooLong,
+                        MessageEmpty,
+                        EntitiesTooLong,
+                        EntityBoundsInvalid,
+                    ) as e:
+                        # Rejected for its content, which other groups would reject too
+                        logger.warning(
+                            "Message %s rejected by %s: %s",
+                            message.id,
+                            group.identifier,
+                            type(e).__name__,
+                        )
+                        self._publish_send_failure(group, message, type(e).__name__)
                     except SlowmodeWait as e:
                         logger.warning(
-                            f"Slow mode wait for {e.value} seconds "
-                            f"for {group.identifier}"
+                            "Slow mode wait for %s seconds for %s",
+                            e.value,
+                            group.identifier,
                         )
-                        self.add_to_blacklist(group.identifier, "SlowmodeWait", e.value)
-                        await asyncio.sleep(e.value)
+                        self._publish_send_failure(group, message, "SlowmodeWait")
+                        self.queue_blacklist(self._blacklist_id(group), "SlowmodeWait", e.value)
+                        with tracer.span("posting.sleep", reason="SlowmodeWait"):
+                            await asyncio.sleep(e.value)
                     except FloodWait as e:
                         logger.warning(
-                            f"Flood wait for {e.value} seconds for {group.identifier}"
+                            "Flood wait for %s seconds for %s", e.value, group.identifier
                         )
-                        self.add_to_blacklist(group.identifier, "FloodWait", e.value)
-                        await asyncio.sleep(e.value)
+                        self._publish_send_failure(group, message, "FloodWait")
+                        self.queue_blacklist(self._blacklist_id(group), "FloodWait", e.value)
+                        with tracer.span("posting.sleep", reason="FloodWait"):
+                            await asyncio.sleep(e.value)
                     except Exception as e:
                         logger.error(
-                            f"Error sending message to {group.identifier}: {e}"
+                            "Error sending message to %s: %s", group.identifier, e
                         )
+                        self._publish_send_failure(group, message, "UnknownError")
                         # Add to permanent blacklist for other errors
-                        self.add_to_blacklist(
-                            group.identifier, f"UnknownError: {str(e)}"
+                        self.queue_blacklist(
+                            self._blacklist_id(group), f"UnknownError: {str(e)}"
                         )
                         break
 
+                if group.identifier in self.resolved_peers:
+                    posted_chats.add(self.resolved_peers[group.identifier])
+                self.flush_blacklist_soon()
+                if cycle:
+                    await self.save_position(group.id)
+                    # Scheduled messages due mid-cycle are not held up until it ends
+                    await self.run_scheduled_messages()
+
                 # Wait for random interval between groups
                 if self.is_running and group != groups[-1]:
                     interval = random.randint(*self.config["message_interval"])
-                    await asyncio.sleep(interval)
+                    with tracer.span("posting.sleep", reason="group_interval"):
+                        await asyncio.sleep(interval)
 
+            if cycle:
+                event_bus.publish(
+                    "cycle",
+                    phase="progress",
+                    groups_done=len(groups),
+                    groups_total=len(groups),
+                )
             return True
 
         except Exception as e:
-            logger.error(f"Error sending messages to groups: {e}")
+            logger.error("Error sending messages to groups: %s", e)
             raise
 
-    async def run_automatic_posting_cycle(self) -> bool:
+    def _blacklist_id(self, group: Any) -> str:
+        """Chat ID to blacklist a group under, its identifier while unresolved"""
+        resolved_id = self.resolved_peers.get(group.identifier)
+        return str(resolved_id) if resolved_id is not None else group.identifier
+
+    def _publish_send_failure(self, group: Any, message: Any, error: str) -> None:
+        """Publish a failed send event"""
+        event_bus.publish(
+            "send",
+            group=group.identifier,
+            message_id=message.id,
+            status="failed",
+            error=error,
+        )
+
+    @traced("posting.cycle")
+    async def run_automatic_posting_cycle(
+        self, inputs: Optional[SnapshotData] = None, resume_after: Optional[int] = None
+    ) -> bool:
         """
         Run one complete automatic posting cycle
 
+        Args:
+            inputs: Cycle inputs from a fresh snapshot (read from the database if None)
+            resume_after: Skip groups up to this ID, already handled before a restart
+
         Returns:
             bool: True if cycle completed successfully
         """
         try:
             logger.info("Starting automatic posting cycle")
+            event_bus.publish("cycle", phase="started")
+            self.cycles_started += 1
 
-            # Clean temporary blacklist at the beginning of each cycle
-            self.clean_temporary_blacklist()
+            with collect_queries("cycle"):
+                # Clean temporary blacklist at the beginning of each cycle
+                if inputs is None:
+                    self.clean_temporary_blacklist()
+                self.prune_change_log()
 
-            # Send messages
-            await self.send_messages_to_groups()
+                # Send messages, then write the cycle's blacklist entries together
+                try:
+                    await self.send_messages_to_groups(inputs, resume_after)
+                finally:
+                    await self.flush_blacklist()
 
             logger.info("Automatic posting cycle completed")
+            event_bus.publish("cycle", phase="completed")
             return True
 
         except Exception as e:
-            logger.error(f"Error in automatic posting cycle: {e}")
+            logger.error("Error in automatic posting cycle: %s", e)
+            event_bus.publish("cycle", phase="failed", error=str(e))
             raise
 
+    async def run_scheduled_messages(self) -> int:
+        """
+        Send the scheduled messages that are due to all groups
+
+        The schedule is owned by the event loop: it is loaded, taken from
+        and advanced only here, and the worker threads just run the queries.
+
+        Returns:
+            int: Number of messages sent
+        """
+        try:
+            now = datetime.utcnow()
+            version, rows = await run_in_threadpool(
+                self._read_schedule, self.scheduler.version
+            )
+            if rows is not None:
+                self.scheduler.load(rows, now, version)
+            due = self.scheduler.pop_due(now)
+            if not due:
+                return 0
+
+            messages = []
+            runs = []
+            for message, occurrence in due:
+                runs.append((message.id, self.scheduler.complete(message.id, occurrence, now)))
+                messages.append((message.id, message.text))
+            # Stored before sending: a restart mid-send skips the rest of
+            # this run rather than posting it again to the same groups
+            inputs = await run_in_threadpool(self._write_scheduled_runs, runs)
+
+            logger.info("Sending %s scheduled messages", len(messages))
+            with collect_queries("scheduled"):
+                try:
+                    await self.send_messages_to_groups(inputs, messages=messages)
+                finally:
+                    await self.flush_blacklist()
+            return len(messages)
+        except Exception as e:
+            logger.error("Error sending scheduled messages: %s", e)
+            return 0
+
+    @staticmethod
+    def _read_schedule(
+        loaded_version: Optional[int],
+    ) -> Tuple[int, Optional[List[ScheduledMessage]]]:
+        """
+        Read the scheduled messages if they changed, in a dedicated session
+
+        Args:
+            loaded_version: Data version the schedule was last loaded at
+
+        Returns:
+            tuple: Current data version, and the scheduled messages or None
+                if they are unchanged since loaded_version
+        """
+        db = get_db_session()
+        try:
+            version = ChangeLogRepository(db).get_current_version()
+            if version == loaded_version:
+                return version, None
+            return version, scheduled_message_rows(MessageRepository(db).get_scheduled_messages())
+        finally:
+            db.close()
+
+    def _write_scheduled_runs(self, runs: List[Tuple[int, datetime]]) -> SnapshotData:
+        """
+        Store when scheduled messages last ran, in a dedicated session
+
+        Args:
+            runs: (ID, last run time) of each message taken off the schedule
+
+        Returns:
+            SnapshotData: Inputs to send the messages with
+        """
+        db = get_db_session()
+        try:
+            message_repo = MessageRepository(db)
+            for message_id, last_run_at in runs:
+                message_repo.set_last_run(message_id, last_run_at)
+            return self._read_cycle_inputs(db)
+        finally:
+            db.close()
+
+    def _seconds_until_scheduled(self) -> float:
+        """Seconds until the next scheduled message is due (inf if none)"""
+        due = self.scheduler.next_due_at()
+        if due is None:
+            return float("inf")
+        return (due - datetime.utcnow()).total_seconds()
+
+    async def _wait_while_running(self, seconds: float) -> None:
+        """
+        Sleep in small intervals to allow for graceful shutdown, sending
+        scheduled messages as they fall due
+        """
+        deadline = time.monotonic() + seconds
+        while self.is_running:
+            await self.run_scheduled_messages()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # At least a second, so a message that keeps failing does not spin the loop
+            until_due = max(1.0, self._seconds_until_scheduled())
+            await asyncio.sleep(min(SCHEDULE_CHECK_INTERVAL, remaining, until_due))
+
     async def run_continuous_posting(self) -> None:
         """Run continuous automatic posting cycles"""
         try:
+            # Resume the cycle or wait that was in progress before a restart
+            warm_start, self._warm_start = self._warm_start, None
+            inputs: Optional[SnapshotData] = None
+            resume_after: Optional[int] = None
+            if warm_start is not None:
+                resume_after = warm_start.last_group_id
+                if self._warm_start_fresh:
+                    inputs = warm_start
+                if warm_start.next_cycle_at is not None:
+                    delay = warm_start.next_cycle_at - time.time()
+                    if delay > 0:
+                        logger.info("Resuming: next cycle due in %.0f seconds", delay)
+                        await self._wait_while_running(delay)
+
             while self.is_running:
                 # Run one cycle
-                await self.run_automatic_posting_cycle()
+                await self.run_automatic_posting_cycle(inputs, resume_after)
+                inputs, resume_after = None, None
 
                 # Wait for random interval between cycles
                 interval = random.randint(*self.config["cycle_interval"])
-                logger.info(f"Waiting {interval} seconds before next cycle")
+                logger.info("Waiting %s seconds before next cycle", interval)
+                if self._snapshot is not None:
+                    self._snapshot.last_group_id = None
+                    self._snapshot.next_cycle_at = time.time() + interval
+                self.save_snapshot()
 
-                # Wait in small intervals to allow for graceful shutdown
-                for _ in range(interval // 10):
-                    if not self.is_running:
-                        break
-                    await asyncio.sleep(10)
+                await self._wait_while_running(interval)
 
                 if not self.is_running:
                     break
 
         except Exception as e:
-            logger.error(f"Error in continuous posting: {e}")
+            logger.error("Error in continuous posting: %s", e)
             raise
@@ -0,0 +1,240 @@
+"""
+Validation Module
+Shared input rules for groups, messages, schedules, configuration and the blacklist
+
+Every write path validates once, where data enters the application: the API
+request models and the posting engine call these functions, repositories do
+not repeat them. Patterns are compiled once at import. The harmful content
+checks are a single combined pattern, and the batch functions check whole
+lists in one regular expression scan for bulk imports.
+"""
+
+import re
+from bisect import bisect_right
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import List, Optional, Sequence
+from .scheduler import parse_cron
+
+MAX_GROUP_IDENTIFIER_LENGTH = 255
+MAX_MESSAGE_LENGTH = 4096  # Telegram message limit
+MAX_CONFIG_KEY_LENGTH = 100
+MAX_CONFIG_VALUE_LENGTH = 1000
+MAX_CHAT_ID_LENGTH = 50
+MAX_REASON_LENGTH = 500
+MAX_RECURRENCE_LENGTH = 100
+MAX_BLACKLIST_DURATION = 365 * 24 * 3600
+
+# Script tags, javascript: URLs and inline event handlers
+HARMFUL_PATTERN = re.compile(r"<script|javascript:|on\w+\s*=", re.IGNORECASE)
+
+# Group link, username or numeric ID
+GROUP_IDENTIFIER_PATTERN = re.compile(r"https://t\.me/|@|-*\d+\Z")
+
+CONFIG_KEY_PATTERN = re.compile(r"[a-zA-Z0-9_-]+")
+
+# Telegram chat IDs are negative for groups and channels
+CHAT_ID_PATTERN = re.compile(r"-?\d+")
+
+# t.me links: invite (+hash or joinchat/hash), private message (c/<id>) or public username
+TELEGRAM_LINK_PATTERN = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:t|telegram)\.me/"
+    r"(?:(?:\+|joinchat/)(?P<invite>[\w-]+)|c/(?P<channel>\d+)|(?P<username>\w+))",
+    re.IGNORECASE,
+)
+
+# Never matched by HARMFUL_PATTERN, so matches cannot span two joined values
+_BATCH_SEPARATOR = "\0"
+
+
+def is_harmful(value: str) -> bool:
+    """Check a value for potentially harmful content"""
+    return HARMFUL_PATTERN.search(value) is not None
+
+
+def find_harmful(values: Sequence[str]) -> List[int]:
+    """
+    Find values with potentially harmful content
+
+    Args:
+        values: Values to check
+
+    Returns:
+        list: Indexes of the harmful values, in order
+    """
+    if not values:
+        return []
+    # Start offset of each value in the joined text
+    starts = list(accumulate((len(v) + 1 for v in values[:-1]), initial=0))
+    found: List[int] = []
+    for match in HARMFUL_PATTERN.finditer(_BATCH_SEPARATOR.join(values)):
+        index = bisect_right(starts, match.start()) - 1
+        if not found or found[-1] != index:
+            found.append(index)
+    return found
+
+
+def validate_group_identifier(identifier: str) -> str:
+    """Validate a group link, username or ID"""
+    if len(identifier) > MAX_GROUP_IDENTIFIER_LENGTH:
+        raise ValueError("Group identifier must be at most 255 characters")
+    if not GROUP_IDENTIFIER_PATTERN.match(identifier):
+        raise ValueError("Group identifier must be a valid group link, username, or ID")
+    return identifier
+
+
+def validate_group_identifiers(identifiers: Sequence[str]) -> List[str]:
+    """
+    Validate a batch of group identifiers
+
+    Args:
+        identifiers: Group links, usernames or IDs
+
+    Returns:
+        list: The identifiers, if all are valid
+    """
+    match = GROUP_IDENTIFIER_PATTERN.match
+    for index, identifier in enumerate(identifiers):
+        if len(identifier) > MAX_GROUP_IDENTIFIER_LENGTH:
+            raise ValueError(
+                f"Each group identifier must be at most 255 characters (item {index})"
+            )
+        if not match(identifier):
+            raise ValueError(
+                "Each group identifier must be a valid group link, username, or ID "
+                f"(item {index})"
+            )
+    return list(identifiers)
+
+
+def canonical_group_key(identifier: str) -> str:
+    """
+    Normalize a group identifier to the key that identifies its chat
+
+    `https://t.me/Foo`, `t.me/foo/` and `@foo` all become `username:foo`,
+    invite links become `invite:<hash>` and numeric or private message links
+    become `id:<chat id>`.
+
+    Args:
+        identifier: Group link, username or ID
+
+    Returns:
+        str: Canonical group key
+    """
+    value = identifier.strip()
+    link = TELEGRAM_LINK_PATTERN.match(value)
+    if link:
+        if link.group("invite"):
+            return f"invite:{link.group('invite')}"
+        if link.group("channel"):
+            return f"id:-100{link.group('channel')}"
+        return f"username:{link.group('username').lower()}"
+    if value.startswith("@"):
+        return f"username:{value[1:].rstrip('/').lower()}"
+    digits = value.lstrip("-")
+    if digits.isdigit():
+        return f"id:{'-' if digits != value else ''}{int(digits)}"
+    return f"raw:{value}"
+
+
+def validate_message_text(text: str) -> str:
+    """Validate the text of a message"""
+    if not text or len(text) > MAX_MESSAGE_LENGTH:
+        raise ValueError("Message text must be between 1 and 4096 characters")
+    if is_harmful(text):
+        raise ValueError("Message contains potentially harmful content")
+    return text
+
+
+def validate_message_texts(texts: Sequence[str]) -> List[str]:
+    """
+    Validate a batch of message texts
+
+    Args:
+        texts: Message texts
+
+    Returns:
+        list: The texts, if all are valid
+    """
+    for index, text in enumerate(texts):
+        if not text or len(text) > MAX_MESSAGE_LENGTH:
+            raise ValueError(
+                f"Message text must be between 1 and 4096 characters (item {index})"
+            )
+    harmful = find_harmful(texts)
+    if harmful:
+        raise ValueError(f"Message contains potentially harmful content (item {harmful[0]})")
+    return list(texts)
+
+
+def validate_schedule_time(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalize a schedule time to naive UTC, as stored; naive input is taken as UTC"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def validate_recurrence(expression: Optional[str]) -> Optional[str]:
+    """Validate a cron expression of a recurring message"""
+    if expression is None:
+        return None
+    expression = " ".join(expression.split())
+    if not expression or len(expression) > MAX_RECURRENCE_LENGTH:
+        raise ValueError("Recurrence must be between 1 and 100 characters")
+    parse_cron(expression)
+    return expression
+
+
+def validate_active_window(
+    active_from: Optional[datetime], active_until: Optional[datetime]
+) -> None:
+    """Validate that an active window does not end before it starts"""
+    if active_from is not None and active_until is not None and active_until <= active_from:
+        raise ValueError("Active window must end after it starts")
+
+
+def validate_config_key(key: str) -> str:
+    """Validate a configuration key"""
+    if not key or len(key) > MAX_CONFIG_KEY_LENGTH:
+        raise ValueError("Config key must be between 1 and 100 characters")
+    if not CONFIG_KEY_PATTERN.fullmatch(key):
+        raise ValueError(
+            "Config key can only contain letters, numbers, underscores, and hyphens"
+        )
+    return key
+
+
+def validate_config_value(value: str) -> str:
+    """Validate a configuration value"""
+    if len(value) > MAX_CONFIG_VALUE_LENGTH:
+        raise ValueError("Config value must be at most 1000 characters")
+    if is_harmful(value):
+        raise ValueError("Config value contains potentially harmful content")
+    return value
+
+
+def validate_chat_id(chat_id: str) -> str:
+    """Validate a Telegram chat ID"""
+    if not chat_id or len(chat_id) > MAX_CHAT_ID_LENGTH:
+        raise ValueError("Chat ID must be between 1 and 50 characters")
+    if not CHAT_ID_PATTERN.fullmatch(chat_id):
+        raise ValueError("Chat ID must be a valid integer (with optional negative sign)")
+    return chat_id
+
+
+def validate_reason(reason: str) -> str:
+    """Validate a blacklist reason"""
+    if not reason or len(reason) > MAX_REASON_LENGTH:
+        raise ValueError("Reason must be between 1 and 500 characters")
+    if is_harmful(reason):
+        raise ValueError("Reason contains potentially harmful content")
+    return reason
+
+
+def validate_duration(duration: Optional[int]) -> Optional[int]:
+    """Validate a temporary blacklist duration in seconds"""
+    if duration is not None and duration <= 0:
+        raise ValueError("Duration must be a positive integer if provided")
+    if duration and duration > MAX_BLACKLIST_DURATION:
+        raise ValueError("Duration cannot be more than 1 year")
+    return duration
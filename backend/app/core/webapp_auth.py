@@ -0,0 +1,241 @@
+"""
+WebApp Authentication Module
+Verifies Telegram Mini App initData and issues short-lived access tokens
+
+The Mini App proves who opened it with `initData`, signed by Telegram with a
+key derived from the bot token. Verifying it is an HMAC over the whole
+payload, so it is done once: the client exchanges initData for an HS256 JWT
+and sends that as a bearer token. Verified tokens are kept in a bounded LRU,
+making the check on later requests a dictionary lookup.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl
+from .config import settings
+
+# Seconds an issued access token stays valid
+ACCESS_TOKEN_TTL = 15 * 60
+
+# Seconds after Telegram signed initData during which it can be exchanged
+INIT_DATA_MAX_AGE = 24 * 3600
+
+# Number of verified tokens kept in memory
+TOKEN_CACHE_SIZE = 4096
+
+_JWT_HEADER = base64.urlsafe_b64encode(
+    json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode()
+).rstrip(b"=")
+
+
+class WebAppAuthError(Exception):
+    """Raised when initData or an access token cannot be verified"""
+
+
+@dataclass(frozen=True)
+class WebAppUser:
+    """Telegram user verified from initData"""
+
+    id: int
+    username: Optional[str] = None
+    first_name: Optional[str] = None
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def verify_init_data(
+    init_data: str, bot_token: str, max_age: int = INIT_DATA_MAX_AGE
+) -> WebAppUser:
+    """
+    Verify the signature and age of Telegram WebApp initData
+
+    Args:
+        init_data: Raw query string from Telegram.WebApp.initData
+        bot_token: Token of the bot serving the Mini App
+        max_age: Maximum age of the signature in seconds
+
+    Returns:
+        WebAppUser: The user who opened the Mini App
+    """
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", None)
+    if not received_hash:
+        raise WebAppAuthError("initData is not signed")
+
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received_hash):
+        raise WebAppAuthError("initData signature mismatch")
+
+    try:
+        auth_date = int(fields.get("auth_date", "0"))
+        user = json.loads(fields["user"])
+        user_id = int(user["id"])
+    except (KeyError, ValueError, TypeError):
+        raise WebAppAuthError("initData has no valid user")
+    if time.time() - auth_date > max_age:
+        raise WebAppAuthError("initData has expired")
+
+    return WebAppUser(
+        id=user_id, username=user.get("username"), first_name=user.get("first_name")
+    )
+
+
+class WebAppAuthenticator:
+    """Exchange initData for access tokens and verify them with an LRU cache"""
+
+    def __init__(
+        self,
+        bot_token: Optional[str],
+        secret_key: str,
+        allowed_user_ids: Iterable[int] = (),
+        token_ttl: int = ACCESS_TOKEN_TTL,
+        cache_size: int = TOKEN_CACHE_SIZE,
+    ):
+        """
+        Initialize authenticator
+
+        Args:
+            bot_token: Bot token used by Telegram to sign initData (None disables auth)
+            secret_key: Key signing the access tokens
+            allowed_user_ids: Telegram users allowed in (empty denies every user)
+            token_ttl: Seconds an access token stays valid
+            cache_size: Maximum number of verified tokens kept in memory
+        """
+        self.bot_token = bot_token
+        self.secret_key = secret_key.encode()
+        self.allowed_user_ids = frozenset(allowed_user_ids)
+        self.token_ttl = token_ttl
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether requests must be authenticated"""
+        return bool(self.bot_token)
+
+    def is_allowed(self, user_id: int) -> bool:
+        """Whether a user may log in; nobody is until the allowlist names them"""
+        return user_id in self.allowed_user_ids
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        return _b64encode(hmac.new(self.secret_key, signing_input, hashlib.sha256).digest())
+
+    def login(self, init_data: str) -> Dict[str, Any]:
+        """
+        Verify initData and issue an access token
+
+        Args:
+            init_data: Raw query string from Telegram.WebApp.initData
+
+        Returns:
+            dict: Access token, its lifetime and the verified user
+        """
+        if not self.bot_token:
+            raise WebAppAuthError("WebApp authentication is not configured")
+        user = verify_init_data(init_data, self.bot_token)
+        if not self.is_allowed(user.id):
+            raise WebAppAuthError(f"User {user.id} is not allowed")
+
+        return {
+            "access_token": self.issue_token(user.id),
+            "token_type": "bearer",
+            "expires_in": self.token_ttl,
+            "user": {"id": user.id, "username": user.username, "first_name": user.first_name},
+        }
+
+    def issue_token(self, user_id: int) -> str:
+        """
+        Create a signed access token for a user
+
+        Args:
+            user_id: Telegram user ID
+
+        Returns:
+            str: HS256 JWT
+        """
+        now = int(time.time())
+        payload = _b64encode(
+            json.dumps(
+                {"sub": str(user_id), "iat": now, "exp": now + self.token_ttl},
+                separators=(",", ":"),
+            ).encode()
+        )
+        signing_input = _JWT_HEADER + b"." + payload
+        token = (signing_input + b"." + self._sign(signing_input)).decode()
+
+        with self._lock:
+            self._remember(token, user_id, now + self.token_ttl)
+        return token
+
+    def authenticate(self, token: str) -> int:
+        """
+        Verify an access token
+
+        Args:
+            token: Token issued by `issue_token`
+
+        Returns:
+            int: Telegram user ID the token was issued to
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(token)
+            if cached is not None:
+                user_id, expires_at = cached
+                if expires_at > now:
+                    self._cache.move_to_end(token)
+                    return user_id
+                del self._cache[token]
+                raise WebAppAuthError("Access token has expired")
+
+        # Cache miss, e.g. another worker issued the token
+        try:
+            header, payload, signature = token.split(".")
+            expected = self._sign(f"{header}.{payload}".encode()).decode()
+            if not hmac.compare_digest(expected, signature):
+                raise WebAppAuthError("Access token signature mismatch")
+            claims = json.loads(_b64decode(payload))
+            user_id, expires_at = int(claims["sub"]), float(claims["exp"])
+        except WebAppAuthError:
+            raise
+        except (ValueError, KeyError, TypeError):
+            raise WebAppAuthError("Malformed access token")
+        if expires_at <= now:
+            raise WebAppAuthError("Access token has expired")
+        if not self.is_allowed(user_id):
+            raise WebAppAuthError(f"User {user_id} is not allowed")
+
+        with self._lock:
+            self._remember(token, user_id, expires_at)
+        return user_id
+
+    def _remember(self, token: str, user_id: int, expires_at: float) -> None:
+        """Cache a verified token, evicting the least recently used one"""
+        self._cache[token] = (user_id, expires_at)
+        self._cache.move_to_end(token)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+# Shared authenticator; disabled until TELEGRAM_BOT_TOKEN is set
+webapp_auth = WebAppAuthenticator(
+    bot_token=settings.telegram_bot_token if settings else None,
+    secret_key=settings.secret_key if settings else "",
+    allowed_user_ids=settings.tma_allowed_user_ids if settings else (),
+)
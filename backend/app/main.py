@@ -5,26 +5,47 @@ Main application file for the Telegram Userbot Backend (TMA API).
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 from .api.routes import router as api_router
 from .api.routes import initialize_userbot, cleanup_userbot
+from .core.config import settings
 from .core.database import init_db
+from .core.logging_config import setup_logging, shutdown_logging
+from .core.loop_monitor import loop_monitor
 from .core.middleware import add_middleware
+from .core.tracing import tracer
 
 
 def init_app(app: FastAPI):
-    """Initialize the application, including database tables and middleware"""
-    init_db()
+    """Initialize the application middleware"""
     add_middleware(app)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    # Startup
+    # Startup; the schema is prepared here rather than on import so that
+    # importing the app (tests, tooling, workers) has no side effects
+    setup_logging(
+        settings.log_level,
+        settings.log_format,
+        settings.log_sample_every,
+        settings.log_levels,
+    )
+    tracer.configure(settings.tracing_enabled, settings.tracing_buffer_size)
+    if settings.loop_monitor_interval_ms > 0:
+        loop_monitor.interval = settings.loop_monitor_interval_ms / 1000
+        loop_monitor.threshold = settings.slow_callback_threshold_ms / 1000
+        loop_monitor.start()
+    await run_in_threadpool(init_db)
     await initialize_userbot()
     yield
     # Shutdown
     await cleanup_userbot()
+    loop_monitor.stop()
+    if settings.tracing_export_path:
+        tracer.export_to_file(settings.tracing_export_path)
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -37,7 +58,7 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# Initialize the app, including database tables
+# Initialize the app middleware
 init_app(app)
 
 # Add CORS middleware
@@ -5,7 +5,17 @@ Contains all SQLAlchemy database models for the application
 
 # mypy: disable-error-code="valid-type,misc"
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
 from sqlalchemy.orm import declarative_base
 import datetime
 
@@ -22,7 +32,10 @@ class Group(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     identifier = Column(String, unique=True, index=True, nullable=False)
+    # Normalized identity, so every form of the same link or username is one group
+    canonical_key = Column(String, unique=True, index=True, nullable=False)
     name = Column(String, nullable=True)  # Will be fetched from Telegram API
+    version = Column(Integer, default=0, nullable=False, index=True)  # Last change log entry
 
 
 class Message(Base):
@@ -35,6 +48,13 @@ class Message(Base):
     id = Column(Integer, primary_key=True, index=True)
     text = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    version = Column(Integer, default=0, nullable=False, index=True)  # Last change log entry
+    # Schedule (UTC, see app.core.scheduler); unscheduled messages go out every cycle
+    send_at = Column(DateTime, nullable=True)
+    recurrence = Column(String, nullable=True)  # Cron expression
+    active_from = Column(DateTime, nullable=True)
+    active_until = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
 
 
 class BlacklistedChat(Base):
@@ -49,6 +69,7 @@ class BlacklistedChat(Base):
     reason = Column(String, nullable=False)
     is_permanent = Column(Boolean, default=False)
     expiry_time = Column(DateTime, nullable=True)  # For temporary blacklists
+    version = Column(Integer, default=0, nullable=False, index=True)  # Last change log entry
 
 
 class Config(Base):
@@ -62,3 +83,149 @@ class Config(Base):
     key = Column(String, unique=True, index=True, nullable=False)
     value = Column(String, nullable=False)
     description = Column(String, nullable=True)
+
+
+class ChangeLog(Base):
+    """
+    ChangeLog model recording every write to synced tables
+
+    The autoincrement ID is the global, monotonic sync version. Delete
+    entries act as tombstones for clients syncing incrementally.
+    """
+
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    operation = Column(String, nullable=False)  # "upsert" or "delete"
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class ControlCommand(Base):
+    """
+    ControlCommand model for forwarding engine commands to the leader process
+    """
+
+    __tablename__ = "control_commands"
+
+    id = Column(Integer, primary_key=True, index=True)
+    command = Column(String, nullable=False)
+    arguments = Column(Text, nullable=True)  # JSON-encoded keyword arguments
+    status = Column(String, default="pending", index=True, nullable=False)
+    result = Column(Text, nullable=True)  # JSON-encoded result
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+
+class EngineState(Base):
+    """
+    EngineState model holding the status heartbeat of the leader process
+    """
+
+    __tablename__ = "engine_state"
+
+    id = Column(Integer, primary_key=True)
+    leader_id = Column(String, nullable=False)
+    state = Column(Text, nullable=False)  # JSON-encoded status snapshot
+    updated_at = Column(DateTime, nullable=False)
+
+
+class EngineSnapshot(Base):
+    """
+    EngineSnapshot model holding the latest warm-start snapshot of the posting engine
+    """
+
+    __tablename__ = "engine_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    data = Column(LargeBinary, nullable=False)  # Encoded SnapshotData
+    # Cycle position, written after every group without re-encoding the data
+    last_group_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class RateLimit(Base):
+    """
+    RateLimit model storing the GCRA state of each rate-limited caller
+    """
+
+    __tablename__ = "rate_limits"
+
+    key = Column(String, primary_key=True)
+    tat = Column(Float, nullable=False)  # Theoretical arrival time (Unix seconds)
+
+
+class TelegramSession(Base):
+    """
+    TelegramSession model storing the MTProto authorization of a Pyrogram client
+    """
+
+    __tablename__ = "telegram_sessions"
+
+    name = Column(String, primary_key=True)  # Pyrogram client name
+    dc_id = Column(Integer, nullable=False)
+    api_id = Column(Integer, nullable=True)
+    test_mode = Column(Boolean, nullable=True)
+    auth_key = Column(LargeBinary, nullable=True)
+    date = Column(Integer, nullable=False, default=0)
+    user_id = Column(BigInteger, nullable=True)
+    is_bot = Column(Boolean, nullable=True)
+
+
+class TelegramPeer(Base):
+    """
+    TelegramPeer model caching resolved peers so they survive restarts
+    """
+
+    __tablename__ = "telegram_peers"
+
+    session_name = Column(String, primary_key=True)
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    access_hash = Column(BigInteger, nullable=True)
+    type = Column(String, nullable=False)  # user, bot, group, channel or supergroup
+    username = Column(String, nullable=True, index=True)
+    phone_number = Column(String, nullable=True, index=True)
+    last_update_on = Column(Integer, nullable=False)  # Unix seconds
+
+
+class TelegramUsername(Base):
+    """
+    TelegramUsername model mapping the extra usernames of a peer to its ID
+    """
+
+    __tablename__ = "telegram_usernames"
+
+    session_name = Column(String, primary_key=True)
+    username = Column(String, primary_key=True)
+    peer_id = Column(BigInteger, nullable=False, index=True)
+    last_update_on = Column(Integer, nullable=False)  # Unix seconds
+
+
+class TableVersion(Base):
+    """
+    TableVersion model counting committed writes per table
+
+    Bumped in the writing transaction, so cached reads of every worker see
+    writes made by any other worker or by the posting engine.
+    """
+
+    __tablename__ = "table_versions"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class SchemaInfo(Base):
+    """
+    SchemaInfo model recording the migration revision and model fingerprint the schema was verified at
+    """
+
+    __tablename__ = "schema_info"
+
+    id = Column(Integer, primary_key=True)
+    revision = Column(String, nullable=False)  # Alembic head the schema was migrated to
+    fingerprint = Column(String, nullable=False)  # Hash of the model metadata
+    updated_at = Column(DateTime, nullable=False)
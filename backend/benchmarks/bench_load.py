@@ -0,0 +1,247 @@
+"""
+API Load Benchmark
+Drives the API with concurrent clients and reports latency percentiles and
+throughput, compared with a stored baseline
+
+Scenarios cover Mini App list reads, bulk group imports, config writes and
+status polling. By default the app runs in-process over ASGI against a fresh
+SQLite database, so no server or network is involved and rate limits are
+off. With --url the requests go to a running server instead; use a test
+deployment, as the write scenarios add groups and config keys.
+
+Baselines are only comparable on the machine that recorded them; record one
+with --save-baseline before a change and compare with --compare after it.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_load [--scenario NAME ...] [--concurrency N]
+        [--requests N] [--url URL --token TOKEN] [--save-baseline | --compare]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "bench_load.json")
+
+# Groups per bulk import request
+BULK_SIZE = 50
+
+# Allowed slowdown before a result counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+RequestSpec = Tuple[str, str, Optional[Dict[str, Any]]]
+
+LIST_PATHS = ("/api/v1/groups", "/api/v1/messages", "/api/v1/blacklist")
+
+
+def list_reads(run_id: str, i: int) -> RequestSpec:
+    return "GET", LIST_PATHS[i % len(LIST_PATHS)], None
+
+
+def bulk_import(run_id: str, i: int) -> RequestSpec:
+    identifiers = [f"@load_{run_id}_{i}_{j}" for j in range(BULK_SIZE)]
+    return "POST", "/api/v1/groups/bulk", {"identifiers": identifiers}
+
+
+def config_writes(run_id: str, i: int) -> RequestSpec:
+    return "POST", "/api/v1/config", {"key": f"load_test_{i % 10}", "value": str(i)}
+
+
+def status_polling(run_id: str, i: int) -> RequestSpec:
+    return "GET", "/api/v1/userbot/status", None
+
+
+SCENARIOS: Dict[str, Callable[[str, int], RequestSpec]] = {
+    "list_reads": list_reads,
+    "bulk_import": bulk_import,
+    "config_writes": config_writes,
+    "status_polling": status_polling,
+}
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, name: str, concurrency: int, requests: int
+) -> Dict[str, float]:
+    """
+    Send `requests` requests of a scenario from `concurrency` concurrent clients
+
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles
+    """
+    make_request = SCENARIOS[name]
+    run_id = uuid.uuid4().hex[:8]
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+
+    async def worker() -> None:
+        nonlocal errors, issued
+        while issued < requests:
+            index = issued
+            issued += 1
+            method, path, body = make_request(run_id, index)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput": len(ordered) / seconds if seconds else 0.0,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """
+    Find results worse than the baseline
+
+    Returns:
+        list: One message per regression
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.1f} ms, baseline {base['p95_ms']:.1f} ms"
+            )
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['throughput']:.0f} req/s, "
+                f"baseline {base['throughput']:.0f} req/s"
+            )
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: {result['errors']} errors, baseline {base['errors']}")
+    return regressions
+
+
+def in_process_client() -> httpx.AsyncClient:
+    """Client calling the app over ASGI, backed by a fresh SQLite database"""
+    directory = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    os.environ.setdefault("TELEGRAM_API_ID", "1")
+    os.environ.setdefault("TELEGRAM_API_HASH", "bench")
+    os.environ.setdefault("SECRET_KEY", "bench_secret_key_of_32_characters")
+    os.environ["TELEGRAM_BOT_TOKEN"] = ""
+
+    # Imported here, after the environment points the app at the new database
+    from app.api import routes
+    from app.core.database import init_db
+    from app.core.rate_limiter import limiter
+    from app.core.userbot import TelegramUserbot
+    from app.main import app
+
+    init_db()
+    # Database access only; the Telegram client is never started
+    routes.userbot = TelegramUserbot()
+    limiter.enabled = False
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    )
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    print(
+        f"{'scenario':<16} {'requests':>8} {'errors':>6} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<16} {r['requests']:8.0f} {r['errors']:6.0f} {r['throughput']:8.0f} "
+            f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f}"
+        )
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    if args.url:
+        headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+        client = httpx.AsyncClient(base_url=args.url, headers=headers, timeout=30)
+    else:
+        client = in_process_client()
+    results = {}
+    async with client:
+        for name in args.scenario or list(SCENARIOS):
+            # A short warm-up fills caches and connection pools
+            await run_scenario(client, name, args.concurrency, args.concurrency)
+            results[name] = await run_scenario(
+                client, name, args.concurrency, args.requests
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--url", help="Base URL of a running server")
+    parser.add_argument("--token", help="Mini App access token for --url")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save-baseline", action="store_true")
+    mode.add_argument("--compare", action="store_true")
+    args = parser.parse_args(argv)
+
+    print(f"{args.concurrency} concurrent clients, {args.requests} requests per scenario")
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            rounded = {
+                name: {metric: round(value, 3) for metric, value in result.items()}
+                for name, result in results.items()
+            }
+            json.dump(rounded, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Serialization Benchmark
+Compares the ORM + jsonable_encoder + json path with the row + orjson path
+on large list responses
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_serialization [rows]
+"""
+
+import datetime
+import json
+import sys
+import time
+from typing import Callable
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.database import Base, BlacklistedChat
+from app.core.repository import BlacklistRepository
+from app.core.serialization import CompressedBody, dumps, rows_to_dicts, orjson
+
+FIELDS = ("id", "chat_id", "reason", "is_permanent", "expiry_time")
+
+
+def orm_path(repo: BlacklistRepository) -> bytes:
+    """Serialization path used by the routes before the fast path"""
+    chats = repo.get_all_blacklisted_chats()
+    payload = {
+        "blacklisted_chats": [
+            {
+                "id": b.id,
+                "chat_id": b.chat_id,
+                "reason": b.reason,
+                "is_permanent": b.is_permanent,
+                "expiry_time": b.expiry_time.isoformat() if b.expiry_time else None,
+            }
+            for b in chats
+        ]
+    }
+    return json.dumps(jsonable_encoder(payload)).encode()
+
+
+def row_path(repo: BlacklistRepository) -> bytes:
+    """Rows straight from SQL to JSON bytes"""
+    rows = repo.get_rows(FIELDS)
+    return dumps({"blacklisted_chats": rows_to_dicts(rows, FIELDS)})
+
+
+def measure(name: str, func: Callable[[], bytes], repeat: int = 5) -> float:
+    """Run a function several times and print the best time"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<28} {best * 1000:8.1f} ms  {len(body) / 1024:8.1f} KiB")
+    return best
+
+
+def main(count: int = 10000) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        expiry = datetime.datetime(2030, 1, 1, 12, 30)
+        db.add_all(
+            BlacklistedChat(
+                chat_id=str(-1000000000000 - i),
+                reason="FloodWait",
+                is_permanent=i % 2 == 0,
+                expiry_time=None if i % 2 == 0 else expiry,
+            )
+            for i in range(count)
+        )
+        db.commit()
+
+    print(f"{count} rows, orjson {'available' if orjson else 'missing'}")
+
+    def run(path: Callable[[BlacklistRepository], bytes]) -> Callable[[], bytes]:
+        def wrapper() -> bytes:
+            # Fresh session per run so the ORM identity map is not reused
+            with Session() as db:
+                return path(BlacklistRepository(db))
+        return wrapper
+
+    baseline = measure("ORM + jsonable_encoder", run(orm_path))
+    fast = measure("rows + fast dumps", run(row_path))
+    print(f"speedup: {baseline / fast:.1f}x")
+
+    body = run(row_path)()
+    start = time.perf_counter()
+    compressed, _ = CompressedBody(body).encode("gzip")
+    elapsed = time.perf_counter() - start
+    print(f"{'gzip':<28} {elapsed * 1000:8.1f} ms  {len(compressed) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,124 @@
+"""
+SQLite Profile Benchmark
+Measures concurrent read/write throughput on a SQLite file with the driver
+defaults and with the production profile
+
+Readers list the blacklist while writers commit blacklist entries, as the API
+and the posting loop do.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_sqlite [seconds] [readers] [writers]
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.exc import OperationalError
+from app.core.sqlite_profile import SQLiteProfile, apply_sqlite_profile
+from app.models.database import Base, BlacklistedChat
+
+SEED_ROWS = 1000
+
+
+def run(profile: Optional[SQLiteProfile], seconds: float, readers: int, writers: int) -> Dict[str, float]:
+    """Run readers and writers against a fresh database file"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = create_engine(f"sqlite:///{path}", pool_size=readers + writers)
+        if profile is not None:
+            apply_sqlite_profile(engine, profile)
+        Base.metadata.create_all(bind=engine)
+
+        table = BlacklistedChat.__table__
+        with engine.begin() as connection:
+            connection.execute(
+                insert(table),
+                [
+                    {"chat_id": f"seed{i}", "reason": "FloodWait", "is_permanent": True}
+                    for i in range(SEED_ROWS)
+                ],
+            )
+
+        counts = {"reads": 0, "writes": 0, "locked": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def reader() -> None:
+            done = locked = 0
+            with engine.connect() as connection:
+                while time.perf_counter() < deadline:
+                    try:
+                        connection.execute(
+                            select(table.c.chat_id, table.c.expiry_time)
+                            .order_by(table.c.id.desc())
+                            .limit(100)
+                        ).all()
+                        connection.execute(select(func.count()).select_from(table)).scalar()
+                        connection.commit()
+                        done += 1
+                    except OperationalError:
+                        connection.rollback()
+                        locked += 1
+            with lock:
+                counts["reads"] += done
+                counts["locked"] += locked
+
+        def writer(number: int) -> None:
+            done = locked = 0
+            expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+            while time.perf_counter() < deadline:
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(
+                            insert(table).values(
+                                chat_id=f"w{number}-{done}-{locked}",
+                                reason="SlowModeWait",
+                                is_permanent=False,
+                                expiry_time=expiry,
+                            )
+                        )
+                    done += 1
+                except OperationalError:
+                    locked += 1
+            with lock:
+                counts["writes"] += done
+                counts["locked"] += locked
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    return {name: value / seconds for name, value in counts.items()}
+
+
+def main(seconds: float = 3.0, readers: int = 4, writers: int = 2) -> None:
+    print(f"{readers} readers, {writers} writers, {seconds:.0f} s per profile")
+    print(f"{'profile':<12} {'reads/s':>10} {'writes/s':>10} {'locked/s':>10}")
+    results = {}
+    for name, profile in (("default", None), ("production", SQLiteProfile())):
+        results[name] = run(profile, seconds, readers, writers)
+        rates = results[name]
+        print(f"{name:<12} {rates['reads']:10.0f} {rates['writes']:10.0f} {rates['locked']:10.1f}")
+
+    for metric in ("reads", "writes"):
+        before, after = results["default"][metric], results["production"][metric]
+        if before:
+            print(f"{metric} speedup: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        float(args[0]) if len(args) > 0 else 3.0,
+        int(args[1]) if len(args) > 1 else 4,
+        int(args[2]) if len(args) > 2 else 2,
+    )
@@ -0,0 +1,66 @@
+"""
+Startup Benchmark
+Measures how long an API worker takes to import the app and to prepare the
+database on startup, compared with eagerly importing pyrogram as before
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_startup [repeat]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_APP = "import app.main"
+IMPORT_EAGER = "import app.main, pyrogram, app.core.telegram_auth"
+STARTUP = (
+    "import time; start = time.perf_counter(); "
+    "from app.core.database import init_db; init_db(); "
+    "print(time.perf_counter() - start)"
+)
+
+
+def run(code: str, env: dict) -> float:
+    """Run code in a fresh interpreter and return the wall time"""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def measure(name: str, code: str, env: dict, repeat: int) -> float:
+    """Print the best wall time over several runs"""
+    best = min(run(code, env) for _ in range(repeat))
+    print(f"{name:<36} {best * 1000:8.1f} ms")
+    return best
+
+
+def main(repeat: int = 5) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            TELEGRAM_API_ID=os.environ.get("TELEGRAM_API_ID", "1"),
+            TELEGRAM_API_HASH=os.environ.get("TELEGRAM_API_HASH", "benchmark"),
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            DATABASE_URL=f"sqlite:///{directory}/bench.db",
+        )
+
+        baseline = measure("interpreter", "pass", env, repeat)
+        lazy = measure("import app.main", IMPORT_APP, env, repeat)
+        eager = measure("import app.main + pyrogram", IMPORT_EAGER, env, repeat)
+        measure("database import + init_db", STARTUP, env, repeat)
+        print(
+            f"pyrogram deferred: {(eager - lazy) * 1000:.0f} ms saved, "
+            f"app import {(lazy - baseline) * 1000:.0f} ms over a bare interpreter"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
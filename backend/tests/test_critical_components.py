@@ -2,9 +2,24 @@
 Test file for the Telegram Userbot backend - Critical Components
 """
 
+import asyncio
+import datetime
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import logging
 import pytest
 import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+from alembic import command
+from fastapi import Request
 from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, inspect, text
 from unittest.mock import patch, AsyncMock, MagicMock
 
 # Set test environment variables before importing app
@@ -16,10 +31,85 @@ os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///./test_telegram_bot.db"
 from app.main import app
 from app.core.userbot import TelegramUserbot
 from app.core.telegram_auth import TelegramAuth
+from app.core.session_manager import SessionManager
+from app.core.telegram_storage import DatabaseStorage
+from app.core.snapshot import SnapshotData, SnapshotError
+from app.core.event_bus import EventBus
+from app.core.logging_config import (
+    SAMPLED,
+    get_log_levels,
+    set_log_levels,
+    setup_logging,
+    shutdown_logging,
+)
+from app.core import serialization
+from app.core.read_cache import ReadCache, TableVersions, bump_table_versions, table_versions
+from app.core.database import SessionLocal, init_db
+from app.core.repository import (
+    BlacklistEntry,
+    BlacklistRepository,
+    ChangeLogRepository,
+    ConfigRepository,
+    ControlCommandRepository,
+    GroupRepository,
+    MessageRepository,
+)
+from app.core.control import (
+    CONTROL_TIMEOUT,
+    ControlChannel,
+    ControlError,
+    decrypt_arguments,
+    encrypt_arguments,
+    engine_control,
+)
+from app.core.leader import FileLeaderLock
+from app.core import validation
+from app.core.config import settings
+from app.core import profiler
+from app.core.loop_monitor import LoopMonitor
+from app.core.query_stats import QueryBudgetExceeded, collect_queries, query_metrics
+from app.core.scheduler import CronSchedule, MessageScheduler, ScheduledMessage
+from app.core.templates import (
+    TemplateContext,
+    TemplateError,
+    TemplateRenderer,
+    compile_template,
+)
+from app.core.tracing import NOOP_SPAN, Tracer, tracer
+from app.core.sqlite_profile import SQLiteProfile, apply_sqlite_profile
+from app.core.schema import (
+    LEGACY_REVISION,
+    SchemaDriftError,
+    _alembic_config,
+    ensure_schema,
+    head_revision,
+    schema_fingerprint,
+)
+from app.core.rate_limiter import DatabaseBackend, MemoryBackend, RateLimitItem
+from app.core.database import engine
+from app.core.webapp_auth import (
+    WebAppAuthenticator,
+    WebAppAuthError,
+    verify_init_data,
+    webapp_auth,
+)
+
+# The app prepares the schema on startup; these tests skip the lifespan
+init_db()
 
 client = TestClient(app)
 
 
+@contextmanager
+def as_admin(user_id=7):
+    """Turn on Mini App authentication and yield headers of an admin user"""
+    token = WebAppAuthenticator(BOT_TOKEN, settings.secret_key).issue_token(user_id)
+    with patch.object(webapp_auth, "bot_token", BOT_TOKEN), patch.object(
+        webapp_auth, "allowed_user_ids", frozenset({user_id})
+    ), patch.object(settings, "tma_admin_user_ids", [user_id]):
+        yield {"Authorization": f"Bearer {token}"}
+
+
 def test_root_endpoint():
     """Test the root endpoint"""
     response = client.get("/")
@@ -40,7 +130,7 @@ def test_userbot_status_endpoint(mock_userbot):
     # Mock userbot instance
     mock_userbot.is_running = True
     mock_userbot.auth = MagicMock()
-    mock_userbot.auth.get_me = AsyncMock(
+    mock_userbot.auth.get_cached_me = MagicMock(
         return_value={
             "id": 123456789,
             "username": "testuser",
@@ -54,7 +144,9 @@ def test_userbot_status_endpoint(mock_userbot):
     assert response.status_code == 200
     data = response.json()
     assert data["running"] == True
-    assert "user_info" in data
+    assert data["user_info"]["username"] == "testuser"
+    assert "lag_p99_ms" in data["event_loop"]
+    mock_userbot.auth.get_me.assert_not_called()
 
 
 @patch("app.api.routes.userbot")
@@ -171,6 +263,35 @@ class TestTelegramAuth:
         # This would normally be async, but we're testing the structure
         assert auth is not None
 
+    def test_get_me_single_flight(self):
+        """Test that concurrent get_me calls share one RPC and are cached"""
+        auth = TelegramAuth(123456, "test_hash", "+1234567890")
+        auth.client = MagicMock(is_connected=True)
+
+        async def slow_get_me():
+            await asyncio.sleep(0.01)
+            return MagicMock(id=1, username="testuser")
+
+        auth.client.get_me = AsyncMock(side_effect=slow_get_me)
+
+        async def run():
+            results = await asyncio.gather(*(auth.get_me() for _ in range(5)))
+            results.append(await auth.get_me())
+            return results
+
+        results = asyncio.run(run())
+        assert auth.client.get_me.await_count == 1
+        assert all(r["username"] == "testuser" for r in results)
+
+    def test_get_me_serves_stale_value_when_disconnected(self):
+        """Test that cached info is returned while the client is offline"""
+        auth = TelegramAuth(123456, "test_hash", "+1234567890")
+        auth._account_info = {"id": 1, "username": "testuser"}
+        auth.client = MagicMock(is_connected=False)
+
+        assert asyncio.run(auth.get_me())["username"] == "testuser"
+        assert auth.get_cached_me()["username"] == "testuser"
+
 
 class TestTelegramUserbot:
     """Test TelegramUserbot class"""
@@ -183,6 +304,1530 @@ class TestTelegramUserbot:
             assert userbot.is_running == False
             assert userbot.client is None
 
+    def test_warm_start_from_snapshot(self):
+        """A new leader reuses resolved chats and resumes posting"""
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        group = userbot.group_repo.create_group("https://t.me/snapshot_test_group")
+        message = userbot.message_repo.create_message("Snapshot test message")
+
+        sent = MagicMock()
+        sent.chat.id = -100123
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock(return_value=sent)
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        try:
+            asyncio.run(userbot.send_messages_to_groups())
+            userbot.save_snapshot(running=True)
+
+            with patch("app.core.userbot.SessionManager"):
+                restarted = TelegramUserbot()
+            snapshot = restarted.load_snapshot()
+            assert snapshot is not None
+            assert restarted.resume_requested
+            assert restarted._warm_start_fresh
+            assert restarted.resolved_peers[group.identifier] == -100123
+            assert (group.id, group.identifier) in snapshot.groups
+
+            # Inputs are re-read once the database changes
+            restarted.message_repo.create_message("Another message")
+            restarted.load_snapshot()
+            assert not restarted._warm_start_fresh
+        finally:
+            userbot.group_repo.delete_group(group.id)
+            for m in userbot.message_repo.get_all_messages():
+                if m.id >= message.id:
+                    userbot.message_repo.delete_message(m.id)
+            userbot.db.close()
+
+    def test_cycle_writes_inputs_once_and_position_per_group(self):
+        """The snapshot is encoded once per cycle; each group only moves the position"""
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock()
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        inputs = SnapshotData(
+            data_version=0,
+            config_version=0,
+            groups=[(1, "@first"), (2, "@second"), (3, "@third")],
+            messages=[(1, "Hello")],
+        )
+        try:
+            with patch.object(userbot, "_get_data_versions", return_value=(0, 0)), patch.object(
+                userbot.snapshot_repo, "save_snapshot", wraps=userbot.snapshot_repo.save_snapshot
+            ) as save_snapshot:
+                asyncio.run(userbot.send_messages_to_groups(inputs))
+            assert save_snapshot.call_count == 1
+
+            stored = userbot.snapshot_repo.get_snapshot()
+            assert stored.last_group_id == 3
+            with patch("app.core.userbot.SessionManager"):
+                restarted = TelegramUserbot()
+            with patch.object(restarted, "_get_data_versions", return_value=(0, 0)):
+                assert restarted.load_snapshot().last_group_id == 3
+            restarted.db.close()
+        finally:
+            userbot.db.close()
+
+
+class TestBlacklistUpsert:
+    """Test cases for upserted and batched blacklist writes"""
+
+    CHAT_ID = "-100555000111"
+
+    def test_upsert_extends_expiry_and_escalates(self):
+        db = SessionLocal()
+        repo = BlacklistRepository(db)
+        now = datetime.datetime.utcnow()
+        try:
+            repo.add_to_blacklist(self.CHAT_ID, "FloodWait", False, now + datetime.timedelta(hours=1))
+            version = repo.get_blacklisted_chat_by_id(self.CHAT_ID).version
+
+            # A later expiry extends the entry, an earlier one does not shorten it
+            later = now + datetime.timedelta(hours=2)
+            repo.add_to_blacklist(self.CHAT_ID, "SlowmodeWait", False, later)
+            repo.add_to_blacklist(self.CHAT_ID, "FloodWait", False, now + datetime.timedelta(minutes=5))
+            chat = repo.get_blacklisted_chat_by_id(self.CHAT_ID)
+            assert chat.expiry_time == later and chat.reason == "FloodWait"
+            assert chat.version > version
+            assert ChangeLogRepository(db).get_current_version() == chat.version
+
+            # Permanent wins over any later temporary entry
+            repo.add_to_blacklist(self.CHAT_ID, "ChatWriteForbidden", True)
+            repo.add_to_blacklist(self.CHAT_ID, "FloodWait", False, later)
+            chat = repo.get_blacklisted_chat_by_id(self.CHAT_ID)
+            assert chat.is_permanent and chat.expiry_time is None
+            assert db.query(chat.__class__).filter_by(chat_id=self.CHAT_ID).count() == 1
+        finally:
+            repo.remove_from_blacklist(self.CHAT_ID)
+            db.close()
+
+    def test_cycle_writes_are_flushed_together(self):
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        assert userbot.queue_blacklist(self.CHAT_ID, "FloodWait", 60)
+        assert userbot.queue_blacklist(self.CHAT_ID, "ChatWriteForbidden")
+        assert not userbot.queue_blacklist("not a chat id", "FloodWait")
+        assert userbot.blacklist_repo.get_blacklisted_chat_by_id(self.CHAT_ID) is None
+
+        try:
+            with patch.object(
+                BlacklistRepository, "upsert_blacklist", autospec=True,
+                side_effect=BlacklistRepository.upsert_blacklist,
+            ) as upsert:
+                assert asyncio.run(userbot.flush_blacklist()) == 1
+            assert upsert.call_count == 1
+            chat = userbot.blacklist_repo.get_blacklisted_chat_by_id(self.CHAT_ID)
+            assert chat.is_permanent and chat.reason == "ChatWriteForbidden"
+            assert asyncio.run(userbot.flush_blacklist()) == 0
+        finally:
+            userbot.blacklist_repo.remove_from_blacklist(self.CHAT_ID)
+            userbot.db.close()
+
+    def test_group_entries_are_flushed_during_the_cycle(self):
+        """A chat blacklisted in one group is written before the cycle ends"""
+        from pyrogram.errors import ChatWriteForbidden
+
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock(side_effect=[ChatWriteForbidden(), None])
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        inputs = SnapshotData(
+            data_version=0,
+            config_version=0,
+            groups=[(1, self.CHAT_ID), (2, "@second")],
+            messages=[(1, "Hello")],
+        )
+
+        async def run():
+            with patch.object(userbot, "save_snapshot"):
+                await userbot.send_messages_to_groups(inputs)
+            # Flushed in the background, not by the end of the cycle
+            assert userbot._blacklist_flush is not None
+            await userbot._blacklist_flush
+
+        try:
+            asyncio.run(run())
+            assert userbot._pending_blacklist == {}
+            chat = userbot.blacklist_repo.get_blacklisted_chat_by_id(self.CHAT_ID)
+            assert chat.is_permanent and chat.reason == "ChatWriteForbidden"
+        finally:
+            userbot.blacklist_repo.remove_from_blacklist(self.CHAT_ID)
+            userbot.db.close()
+
+    def test_entries_merge_like_the_upsert(self):
+        now = datetime.datetime.utcnow()
+        short = BlacklistEntry("1", "FloodWait", False, now)
+        long = BlacklistEntry("1", "SlowmodeWait", False, now + datetime.timedelta(hours=1))
+        assert long.merge(short) == short._replace(expiry_time=long.expiry_time)
+        assert BlacklistEntry("1", "Banned").merge(short).is_permanent
+
+
+@patch("app.api.routes.userbot")
+def test_harmful_content_rejected_before_userbot(mock_userbot):
+    """Test that request models apply the shared validation rules"""
+    response = client.post("/api/v1/messages", json={"text": "<script>alert(1)</script>"})
+    assert response.status_code == 422
+    response = client.post(
+        "/api/v1/blacklist", json={"chat_id": "-100", "reason": "x onload=1"}
+    )
+    assert response.status_code == 422
+    mock_userbot.add_message.assert_not_called()
+    mock_userbot.add_to_blacklist.assert_not_called()
+
+
+class TestValidation:
+    """Test cases for the shared validation rules"""
+
+    def test_find_harmful_reports_each_value_once(self):
+        values = ["hello", "<SCRIPT>x</script><script>", "fine", "a onclick = 1", "on", "=x"]
+        assert validation.find_harmful(values) == [1, 3]
+        assert validation.find_harmful([]) == []
+
+    def test_batch_matches_single_value_rules(self):
+        identifiers = ["@group", "https://t.me/group", "-100123", "group", "--5", "-"]
+        valid = []
+        for identifier in identifiers:
+            try:
+                validation.validate_group_identifier(identifier)
+                valid.append(identifier)
+            except ValueError:
+                pass
+        assert valid == ["@group", "https://t.me/group", "-100123", "--5"]
+        assert validation.validate_group_identifiers(valid) == valid
+        with pytest.raises(ValueError, match="item 3"):
+            validation.validate_group_identifiers(identifiers)
+        with pytest.raises(ValueError, match="item 1"):
+            validation.validate_message_texts(["ok", "javascript:alert(1)"])
+
+
+class TestGroupIdentity:
+    """Test cases for canonical group keys"""
+
+    def test_forms_of_the_same_group_share_a_key(self):
+        key = validation.canonical_group_key
+        assert key("https://t.me/Foo") == key("t.me/foo/") == key("@foo") == "username:foo"
+        assert key("https://t.me/+AbC") == key("https://t.me/joinchat/AbC") == "invite:AbC"
+        assert key("https://t.me/c/123/7") == key("-100123") == "id:-100123"
+
+    def test_add_group_rejects_other_forms_of_existing_group(self):
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        try:
+            assert userbot.add_group("@Identity_Test") is True
+            assert userbot.add_group("https://t.me/identity_test") is False
+            group = userbot.group_repo.get_group_by_identifier("https://t.me/IDENTITY_TEST/")
+            assert group is not None and group.identifier == "@Identity_Test"
+        finally:
+            userbot.remove_group("@identity_test")
+            userbot.db.close()
+
+    def test_groups_resolving_to_one_chat_get_one_send(self):
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock()
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        userbot.resolved_peers = {"@alias": -100777, "-100777": -100777}
+        inputs = SnapshotData(
+            data_version=0,
+            config_version=0,
+            groups=[(1, "@alias"), (2, "-100777")],
+            messages=[(1, "Hello")],
+        )
+        with patch.object(userbot, "save_snapshot"):
+            asyncio.run(userbot.send_messages_to_groups(inputs))
+        userbot.client.send_message.assert_awaited_once_with(-100777, "Hello")
+        userbot.db.close()
+
+
+class TestSnapshotData:
+    """Test cases for the engine snapshot format"""
+
+    def test_roundtrip(self):
+        snapshot = SnapshotData(
+            data_version=7,
+            config_version=42,
+            running=True,
+            groups=[(1, "@group")],
+            messages=[(2, "Hello")],
+            blacklist=[("@banned", None), ("@expired", 1.0)],
+            resolved_peers={"@group": -1001},
+            last_group_id=1,
+        )
+        decoded = SnapshotData.decode(snapshot.encode())
+        assert decoded == snapshot
+        assert decoded.is_fresh(7, 42) and not decoded.is_fresh(8, 42)
+        assert decoded.active_blacklist() == {"@banned"}
+
+    def test_rejects_corrupt_data(self):
+        encoded = SnapshotData(data_version=1, config_version=1).encode()
+        with pytest.raises(SnapshotError):
+            SnapshotData.decode(encoded[:-1] + bytes([encoded[-1] ^ 1]))
+        with pytest.raises(SnapshotError):
+            SnapshotData.decode(b"XXXX" + encoded[4:])
+
+
+class TestSchemaCheck:
+    """Test cases for startup migrations and the schema fingerprint"""
+
+    def test_migrates_fresh_database_once(self, tmp_path):
+        db_engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+        assert ensure_schema(db_engine) is True
+        assert inspect(db_engine).has_table("groups")
+
+        # Matching revision and fingerprint skip reflection entirely
+        with patch("app.core.schema._migrate") as migrate:
+            assert ensure_schema(db_engine) is False
+        migrate.assert_not_called()
+
+    def test_schema_drift_is_an_error(self, tmp_path):
+        db_engine = create_engine(f"sqlite:///{tmp_path / 'drift.db'}")
+        ensure_schema(db_engine)
+        with db_engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_config_key"))
+            connection.execute(text("DELETE FROM schema_info"))
+
+        with pytest.raises(SchemaDriftError):
+            ensure_schema(db_engine)
+
+    def test_upgrades_unversioned_baseline_database(self, tmp_path):
+        """A database built with create_all before migrations is upgraded to head"""
+        db_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        with db_engine.begin() as connection:
+            command.upgrade(_alembic_config(connection), LEGACY_REVISION)
+            connection.execute(text("DROP TABLE alembic_version"))
+            connection.execute(
+                text("INSERT INTO groups (identifier) VALUES ('@legacy')")
+            )
+
+        assert ensure_schema(db_engine) is True
+        with db_engine.connect() as connection:
+            revision = connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+            assert revision == head_revision()
+            groups = connection.execute(text("SELECT identifier FROM groups")).scalars().all()
+            assert groups == ["@legacy"]
+
+    def test_group_key_migration_merges_duplicates(self, tmp_path):
+        """Groups written before canonical keys existed are merged by key"""
+        db_engine = create_engine(f"sqlite:///{tmp_path / 'duplicates.db'}")
+        with db_engine.begin() as connection:
+            command.upgrade(_alembic_config(connection), "c8f31e5b9a72")
+            for identifier in ("@DupGroup", "https://t.me/dupgroup", "@other"):
+                connection.execute(
+                    text("INSERT INTO groups (identifier) VALUES (:identifier)"),
+                    {"identifier": identifier},
+                )
+        with db_engine.begin() as connection:
+            command.upgrade(_alembic_config(connection), "f3b96a2c5d18")
+
+        with db_engine.connect() as connection:
+            groups = connection.execute(
+                text("SELECT id, identifier, canonical_key FROM groups ORDER BY id")
+            ).all()
+            assert [tuple(g) for g in groups] == [
+                (1, "@DupGroup", "username:dupgroup"),
+                (3, "@other", "username:other"),
+            ]
+            tombstones = connection.execute(
+                text("SELECT row_id FROM change_log WHERE operation = 'delete'")
+            ).scalars().all()
+            assert tombstones == [2]
+        # The rest of the chain applies on top of the merged groups
+        assert ensure_schema(db_engine) is True
+
+    def test_fingerprint_tracks_model_changes(self):
+        metadata = MetaData()
+        table = Table("example", metadata, Column("id", Integer, primary_key=True))
+        before = schema_fingerprint(metadata)
+        table.append_column(Column("name", String, nullable=True))
+        assert schema_fingerprint(metadata) != before
+        assert schema_fingerprint() == schema_fingerprint()
+
+
+def test_sqlite_profile_applies_pragmas(tmp_path):
+    """Test that the SQLite profile is applied to new connections"""
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    apply_sqlite_profile(db_engine, SQLiteProfile(busy_timeout=1234))
+    with db_engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+        assert connection.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+
+
+class TestSessionManager:
+    """Test cases for SessionManager storage"""
+
+    def make_manager(self, tmp_path, key):
+        manager = SessionManager(encryption_key=key)
+        manager.session_file = str(tmp_path / "sessions.json")
+        return manager
+
+    def test_roundtrip_is_cached_and_compact(self, tmp_path):
+        from cryptography.fernet import Fernet
+
+        manager = self.make_manager(tmp_path, Fernet.generate_key())
+        assert manager.save_session("default", {"session_string": "abc", "dc": 2})
+
+        with patch.object(manager, "decrypt_data", wraps=manager.decrypt_data) as decrypt:
+            assert manager.load_session("default") == {"session_string": "abc", "dc": 2}
+            assert manager.load_session("default") == {"session_string": "abc", "dc": 2}
+            assert decrypt.call_count == 1
+
+        content = (tmp_path / "sessions.json").read_text()
+        assert "\n" not in content and ": " not in content
+        assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+    def test_reloads_when_file_changes(self, tmp_path):
+        from cryptography.fernet import Fernet
+
+        key = Fernet.generate_key()
+        reader = self.make_manager(tmp_path, key)
+        writer = self.make_manager(tmp_path, key)
+        writer.save_session("default", {"session_string": "old"})
+        assert reader.load_session("default") == {"session_string": "old"}
+
+        writer.save_session("default", {"session_string": "new"})
+        writer.save_session("other", {"session_string": "x"})
+        assert reader.load_session("default") == {"session_string": "new"}
+
+        assert reader.delete_session("other")
+        assert writer.load_session("other") is None
+        assert writer.load_session("default") == {"session_string": "new"}
+
+
+class TestDatabaseStorage:
+    """Test cases for the database-backed Pyrogram storage"""
+
+    def make_session_string(self, auth_key=b"k" * 256):
+        import base64
+        import struct
+
+        packed = struct.pack(">BI?256sQ?", 2, 123456, False, auth_key, 42, False)
+        return base64.urlsafe_b64encode(packed).decode().rstrip("=")
+
+    def test_session_and_peers_survive_restart(self):
+        async def run():
+            session_string = self.make_session_string()
+            storage = DatabaseStorage("test_storage", engine, session_string=session_string)
+            await storage.delete()
+            await storage.open()
+            assert await storage.user_id() == 42
+
+            await storage.update_peers([(1001, 555, "user", "alice", None)])
+            await storage.update_usernames([(-1001234, "channel_alias")])
+            # Buffered lookups work before the batch is written
+            assert (await storage.get_peer_by_id(1001)).access_hash == 555
+            await storage.update_peers([(-1001234, 777, "supergroup", "chan", None)])
+            await storage.save()
+            await storage.close()
+
+            restarted = DatabaseStorage("test_storage", engine)
+            await restarted.open()
+            assert await restarted.export_session_string() == session_string
+            assert (await restarted.get_peer_by_id(1001)).access_hash == 555
+            assert (await restarted.get_peer_by_username("alice")).user_id == 1001
+            assert (await restarted.get_peer_by_username("channel_alias")).access_hash == 777
+            with pytest.raises(KeyError):
+                await restarted.get_peer_by_id(999)
+            await restarted.delete()
+
+        asyncio.run(run())
+
+    def test_different_session_string_replaces_stored_session(self):
+        async def run():
+            storage = DatabaseStorage("test_storage", engine, self.make_session_string())
+            await storage.delete()
+            await storage.open()
+            await storage.update_peers([(1001, 555, "user", "alice", None)])
+            await storage.close()
+
+            other = DatabaseStorage("test_storage", engine, self.make_session_string(b"o" * 256))
+            await other.open()
+            assert await other.auth_key() == b"o" * 256
+            with pytest.raises(KeyError):
+                await other.get_peer_by_id(1001)
+            await other.delete()
+
+        asyncio.run(run())
+
+    def test_new_login_keeps_peers_of_the_same_account(self):
+        async def run():
+            storage = DatabaseStorage("test_storage", engine, self.make_session_string())
+            await storage.delete()
+            await storage.open()
+            await storage.update_peers([(1001, 555, "user", "alice", None)])
+            await storage.close()
+
+            # A new login forgets the authorization but not the peers
+            login = DatabaseStorage("test_storage", engine)
+            await login.reset_authorization()
+            await login.open()
+            assert await login.auth_key() is None
+            await login.user_id(42)
+            assert (await login.get_peer_by_id(1001)).access_hash == 555
+
+            # Another account cannot use the access hashes
+            other = DatabaseStorage("test_storage", engine)
+            await other.reset_authorization()
+            await other.open()
+            await other.user_id(43)
+            with pytest.raises(KeyError):
+                await other.get_peer_by_id(1001)
+            await other.delete()
+
+        asyncio.run(run())
+
+
+@patch("app.api.routes.userbot")
+def test_list_endpoint_etag(mock_userbot):
+    """Test that list endpoints answer 304 when the ETag is current"""
+    response = client.get("/api/v1/groups")
+    assert response.status_code == 200
+    assert "groups" in response.json()
+    etag = response.headers["etag"]
+
+    response = client.get("/api/v1/groups", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+@patch("app.api.routes.userbot")
+def test_sync_endpoint_returns_changes_since_version(mock_userbot):
+    """Test that sync returns only rows changed after the given version"""
+    version = client.get("/api/v1/sync").json()["version"]
+
+    with SessionLocal() as db:
+        repo = GroupRepository(db)
+        group = repo.create_group("@sync_test_group")
+        group_id = group.id
+        assert group.version > version
+
+    data = client.get(f"/api/v1/sync?since={version}").json()
+    assert data["reset"] is False
+    assert [g["identifier"] for g in data["groups"]["upserts"]] == ["@sync_test_group"]
+    assert data["messages"]["upserts"] == []
+
+    version = data["version"]
+    with SessionLocal() as db:
+        GroupRepository(db).delete_group(group_id)
+
+    data = client.get(f"/api/v1/sync?since={version}").json()
+    assert data["groups"]["upserts"] == []
+    assert data["groups"]["deletes"] == [group_id]
+
+
+@patch("app.api.routes.userbot")
+def test_full_sync_includes_rows_from_before_versions(mock_userbot):
+    """Test that a full sync returns rows left at version 0 by the versioning migration"""
+    groups = GroupRepository(None).model.__table__
+    with SessionLocal() as db:
+        db.execute(
+            groups.insert().values(
+                identifier="@pre_version_group",
+                canonical_key="username:pre_version_group",
+                version=0,
+            )
+        )
+        db.commit()
+    try:
+        data = client.get("/api/v1/sync?since=0").json()
+        assert "@pre_version_group" in [g["identifier"] for g in data["groups"]["upserts"]]
+    finally:
+        with SessionLocal() as db:
+            db.execute(groups.delete().where(groups.c.identifier == "@pre_version_group"))
+            db.commit()
+
+
+@patch("app.api.routes.userbot")
+def test_rate_limit_headers(mock_userbot):
+    """Test that rate-limited endpoints report the remaining quota"""
+    mock_userbot.auth.get_cached_me = MagicMock(return_value=None)
+    response = client.get("/api/v1/userbot/status")
+    assert response.status_code == 200
+    assert response.headers["x-ratelimit-limit"] == "100"
+    assert int(response.headers["x-ratelimit-remaining"]) < 100
+
+
+class TestLogging:
+    """Test the queued logging setup"""
+
+    def setup_method(self):
+        root = logging.getLogger()
+        self.handlers, self.level = list(root.handlers), root.level
+
+    def teardown_method(self):
+        shutdown_logging()
+        root = logging.getLogger()
+        for handler in self.handlers:
+            root.addHandler(handler)
+        root.setLevel(self.level)
+        logging.getLogger("tests.logging").setLevel(logging.NOTSET)
+
+    def test_json_lines_and_sampling(self):
+        """Test that records are written as JSON and sampled records thinned out"""
+        stream = io.StringIO()
+        setup_logging("INFO", "json", sample_every=3, stream=stream)
+        logger = logging.getLogger("tests.logging")
+        items = [1, 2]
+        logger.info("Sent to %s", items, extra={"chat": "@a"})
+        items.append(3)
+        for i in range(7):
+            logger.info("Message sent to %s", i, extra=SAMPLED)
+        logger.debug("Hidden")
+        shutdown_logging()
+
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        # Mutable arguments are formatted when logged, not when written
+        assert lines[0]["message"] == "Sent to [1, 2]"
+        assert lines[0]["chat"] == "@a" and lines[0]["level"] == "INFO"
+        sampled = [line["message"] for line in lines[1:]]
+        assert sampled == ["Message sent to 0", "Message sent to 3", "Message sent to 6"]
+        assert lines[1]["sample_rate"] == 3
+
+    def test_runtime_levels(self):
+        """Test that logger levels change at runtime and unknown levels are rejected"""
+        assert set_log_levels({"tests.logging": "debug"})["tests.logging"] == "DEBUG"
+        assert get_log_levels()["tests.logging"] == "DEBUG"
+        with pytest.raises(ValueError):
+            set_log_levels({"tests.logging": "LOUD"})
+
+        levels = {"levels": {"tests.logging": "WARNING"}}
+        assert client.put("/api/v1/logging/levels", json=levels).status_code == 403
+        with as_admin() as headers:
+            response = client.put("/api/v1/logging/levels", json=levels, headers=headers)
+            assert response.status_code == 200
+            assert response.json()["levels"]["tests.logging"] == "WARNING"
+            response = client.put(
+                "/api/v1/logging/levels",
+                json={"levels": {"tests.logging": "LOUD"}},
+                headers=headers,
+            )
+            assert response.status_code == 400
+
+
+class TestTracing:
+    """Test tracing spans"""
+
+    def teardown_method(self):
+        tracer.configure(False)
+        tracer.clear()
+
+    def test_disabled_tracer_records_nothing(self):
+        """Test that a disabled tracer hands out the shared no-op span"""
+        assert Tracer().span("work") is NOOP_SPAN
+        with Tracer().span("work") as span:
+            span.set_attribute("key", "value")
+
+    def test_spans_nest_across_threads_and_export(self):
+        """Test that repository spans in the threadpool are children of the caller"""
+        from starlette.concurrency import run_in_threadpool
+
+        tracer.configure(True)
+
+        async def run():
+            with tracer.span("cycle", groups=2):
+                with SessionLocal() as db:
+                    await run_in_threadpool(GroupRepository(db).get_all_groups)
+
+        asyncio.run(run())
+        repository_span, cycle_span = tracer.spans()
+        assert repository_span.name == "GroupRepository.get_all_groups"
+        assert repository_span.parent_id == cycle_span.span_id
+        assert repository_span.trace_id == cycle_span.trace_id
+        assert cycle_span.end_time_ns >= repository_span.end_time_ns
+
+        spans = tracer.export(clear=True)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert spans[1]["attributes"] == [{"key": "groups", "value": {"intValue": "2"}}]
+        assert "parentSpanId" not in spans[1]
+        assert tracer.spans() == []
+
+    def test_ring_buffer_drops_oldest(self):
+        """Test that the buffer keeps the most recent spans"""
+        ring = Tracer(buffer_size=2, enabled=True)
+        for i in range(3):
+            with ring.span(f"span{i}"):
+                pass
+        assert [span.name for span in ring.spans()] == ["span1", "span2"]
+        assert ring.dropped == 1
+
+    def test_request_span(self):
+        """Test that requests are recorded under their route name"""
+        tracer.configure(True)
+        with as_admin() as headers:
+            response = client.get("/api/v1/tracing/spans", headers=headers)
+        assert response.status_code == 200
+        request_span = tracer.spans()[-1]
+        assert request_span.name == "GET get_trace_spans"
+        assert request_span.attributes["http.status_code"] == 200
+
+    def test_runtime_state_routes_require_admin(self):
+        """Test that tracing and metrics cannot be switched or exported by non-admins"""
+        assert client.put("/api/v1/tracing", json={"enabled": True}).status_code == 403
+        assert not tracer.enabled
+        assert client.get("/api/v1/tracing/spans?clear=true").status_code == 403
+        assert client.get("/api/v1/metrics").status_code == 403
+        with as_admin() as headers:
+            response = client.put("/api/v1/tracing", json={"enabled": True}, headers=headers)
+        assert response.status_code == 200
+        assert tracer.enabled
+
+
+class TestQueryStats:
+    """Test per-scope SQL statement counting"""
+
+    def test_counts_and_flags_repeated_statements(self):
+        """Test that a statement run once per row is reported as N+1"""
+        query_metrics.reset()
+        with SessionLocal() as db:
+            with collect_queries("cycle") as stats:
+                for chat_id in ("1", "2", "3"):
+                    BlacklistRepository(db).get_blacklisted_chat_by_id(chat_id)
+        assert stats.count == 3
+        assert stats.repeated()[0][1] == 3
+        assert "repeated=1" in stats.header_value()
+        assert query_metrics.snapshot()["cycle"]["n_plus_one"] == 1
+
+        with pytest.raises(QueryBudgetExceeded):
+            with SessionLocal() as db, collect_queries("request", budget=1):
+                GroupRepository(db).get_all_groups()
+                GroupRepository(db).get_all_groups()
+
+    def test_remove_group_selects_once(self):
+        """Test that deleting a group already loaded does not select it again"""
+        with SessionLocal() as db:
+            repo = GroupRepository(db)
+            repo.create_group("@query_stats_group")
+            with collect_queries("request") as stats:
+                group = repo.get_group_by_identifier("@query_stats_group")
+                assert repo.delete_group(group.id)
+        selects = [s for s in stats.statements if s.lstrip().upper().startswith("SELECT")]
+        assert len(selects) == 1
+
+    @patch("app.api.routes.userbot")
+    def test_request_header_and_budget(self, mock_userbot):
+        """Test the debug header and the request budget"""
+        with patch.object(settings, "query_stats_header", True):
+            response = client.get("/api/v1/sync")
+        assert response.status_code == 200
+        assert response.headers["x-query-stats"].startswith("count=")
+        with as_admin() as headers:
+            metrics = client.get("/api/v1/metrics", headers=headers).json()
+        assert "request" in metrics["queries"]
+
+        with patch.object(settings, "query_budget", 0):
+            with pytest.raises(QueryBudgetExceeded):
+                client.get("/api/v1/sync")
+
+
+class TestProfiler:
+    """Test the profiling endpoints"""
+
+    def test_cpu_profile_returns_collapsed_stacks(self):
+        """Test that sampled stacks come back in collapsed format"""
+        with as_admin() as headers:
+            response = client.post(
+                "/api/v1/admin/profile/cpu?seconds=0.05&interval_ms=5", headers=headers
+            )
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) >= 1 and ";" in stack
+
+    def test_memory_diff_and_busy_profiler(self):
+        """Test the tracemalloc diff and that runs do not overlap"""
+        with as_admin() as headers:
+            response = client.post(
+                "/api/v1/admin/profile/memory?seconds=0&limit=5", headers=headers
+            )
+        assert response.status_code == 200
+        assert len(response.json()["top"]) <= 5
+
+        with profiler._running:
+            with pytest.raises(profiler.ProfilerBusyError):
+                profiler.sample_stacks(0)
+
+    def test_profiling_requires_admin(self):
+        """Test that only admins can profile once authentication is enabled"""
+        token = WebAppAuthenticator(BOT_TOKEN, settings.secret_key).issue_token(7)
+        headers = {"Authorization": f"Bearer {token}"}
+        with patch.object(webapp_auth, "bot_token", BOT_TOKEN), patch.object(
+            webapp_auth, "allowed_user_ids", frozenset({7})
+        ):
+            response = client.post("/api/v1/admin/profile/cpu?seconds=0.01", headers=headers)
+            assert response.status_code == 403
+            with patch.object(settings, "tma_admin_user_ids", [7]):
+                response = client.post(
+                    "/api/v1/admin/profile/cpu?seconds=0.01", headers=headers
+                )
+            assert response.status_code == 200
+
+    def test_profiling_denied_without_authentication(self):
+        """Test that profiling is off while Mini App authentication is disabled"""
+        assert not webapp_auth.enabled
+        with patch.object(settings, "tma_admin_user_ids", [7]):
+            assert client.post("/api/v1/admin/profile/cpu?seconds=0.01").status_code == 403
+            assert client.post("/api/v1/admin/profile/memory?seconds=0").status_code == 403
+
+
+class TestLoopMonitor:
+    """Test the event loop monitor"""
+
+    def test_measures_lag_and_records_blocking_call(self):
+        """Test that a blocking call is caught with its stack"""
+        monitor = LoopMonitor(interval=0.01, threshold=0.05)
+
+        def blocking_query():
+            time.sleep(0.2)
+
+        async def run():
+            monitor.start()
+            await asyncio.sleep(0.05)
+            blocking_query()
+            await asyncio.sleep(0.05)
+            monitor.stop()
+
+        asyncio.run(run())
+        snapshot = monitor.snapshot()
+        assert snapshot["slow_callbacks"] == 1
+        assert snapshot["lag_max_ms"] >= 100
+        block = snapshot["recent_slow_callbacks"][0]
+        assert block["duration_ms"] >= 100
+        assert any("blocking_query" in line for line in block["stack"])
+        assert not monitor.running
+
+    def test_watches_loop_started_from_another_thread(self):
+        """Test that the stack is taken from the loop's thread, not the caller's"""
+        monitor = LoopMonitor(interval=0.01, threshold=0.05)
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+        loop_thread.start()
+
+        def blocking_query():
+            time.sleep(0.2)
+
+        try:
+            monitor.start(loop)
+            time.sleep(0.05)
+            assert monitor._loop_thread_id == loop_thread.ident
+            loop.call_soon_threadsafe(blocking_query)
+            time.sleep(0.3)
+        finally:
+            monitor.stop()
+            loop.call_soon_threadsafe(loop.stop)
+            loop_thread.join(timeout=1)
+            loop.close()
+        block = monitor.snapshot()["recent_slow_callbacks"][0]
+        assert any("blocking_query" in line for line in block["stack"])
+
+    def test_metrics_endpoint_reports_event_loop(self):
+        """Test that the metrics endpoint includes the event loop summary"""
+        with as_admin() as headers:
+            data = client.get("/api/v1/metrics", headers=headers).json()
+        assert data["event_loop"]["threshold_ms"] == 100
+
+
+@patch("app.api.routes.userbot")
+def test_load_benchmark_reports_percentiles(mock_userbot):
+    """Test the load benchmark scenarios and its baseline comparison"""
+    import httpx
+    from benchmarks import bench_load
+
+    mock_userbot.is_running = False
+    mock_userbot.auth = None
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await bench_load.run_scenario(c, "status_polling", 4, 20)
+
+    result = asyncio.run(run())
+    assert result["requests"] == 20 and result["errors"] == 0
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+    assert bench_load.compare({"status_polling": result}, {"status_polling": result}) == []
+    slower = {**result, "p95_ms": result["p95_ms"] * 2 + 1}
+    assert bench_load.compare({"status_polling": slower}, {"status_polling": result})
+
+
+class TestTemplates:
+    """Test message templates"""
+
+    def test_compile_and_render(self):
+        """Test that variables are substituted and other braces kept"""
+        template = compile_template("Hi {group} ({identifier}) on {date}, {unknown} {rotate:a|b}")
+        assert not template.is_static
+        context = TemplateContext("Chat", "@chat", "2026-10-19", rotation=3)
+        assert template.render(context) == "Hi Chat (@chat) on 2026-10-19, {unknown} b"
+        assert compile_template("Plain {text}").is_static
+        assert compile_template("Plain {text}") is compile_template("Plain {text}")
+
+    def test_render_cache(self):
+        """Test that renders are cached per variable values and bounded"""
+        renderer = TemplateRenderer(cache_size=2)
+        text = "Join {rotate:x|y} in {group}"
+        first = TemplateContext("A", "@a", "2026-10-19", rotation=0)
+        assert renderer.render(text, first) == "Join x in A"
+        # Same options two rotations later, and the date is not used
+        assert renderer.render(text, first._replace(rotation=2, date="2026-10-20")) == "Join x in A"
+        assert renderer.hits == 1
+        renderer.render(text, first._replace(group="B"))
+        renderer.render(text, first._replace(group="C"))
+        assert len(renderer._cache) == 2
+        assert renderer.render("No variables", first) == "No variables"
+        assert renderer.misses == 3
+
+    def test_send_loop_renders_per_group(self):
+        """Test that each group gets the message rendered with its title"""
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock()
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        userbot.chat_titles = {"@one": "Group One"}
+        inputs = SnapshotData(
+            data_version=0,
+            config_version=0,
+            groups=[(1, "@one"), (2, "@two")],
+            messages=[(1, "Hello {group}")],
+        )
+        with patch.object(userbot, "save_snapshot"):
+            asyncio.run(userbot.send_messages_to_groups(inputs))
+        sent = [c.args for c in userbot.client.send_message.await_args_list]
+        assert sent == [("@one", "Hello Group One"), ("@two", "Hello @two")]
+        userbot.db.close()
+
+    def test_message_errors_do_not_blacklist_the_group(self):
+        """Test that an over-length render or a rejected text skips only that message"""
+        from pyrogram.errors import MessageEmpty
+
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock(side_effect=[MessageEmpty(), None])
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        userbot.chat_titles = {"@one": "x" * 4096}
+        inputs = SnapshotData(
+            data_version=0,
+            config_version=0,
+            groups=[(1, "@one")],
+            messages=[(1, "Hello {group}"), (2, "  "), (3, "Plain")],
+        )
+        with patch.object(userbot, "save_snapshot"):
+            asyncio.run(userbot.send_messages_to_groups(inputs))
+        sent = [c.args for c in userbot.client.send_message.await_args_list]
+        assert sent == [("@one", "  "), ("@one", "Plain")]
+        assert userbot._pending_blacklist == {}
+        userbot.db.close()
+
+    def test_over_length_render_is_rejected(self):
+        renderer = TemplateRenderer(max_length=10)
+        context = TemplateContext(group="A long group title", identifier="@g", date="2026-10-19")
+        assert renderer.render("Hi {identifier}", context) == "Hi @g"
+        with pytest.raises(TemplateError):
+            renderer.render("Hi {group}", context)
+
+
+class TestScheduler:
+    """Test scheduled and recurring messages"""
+
+    def test_cron_next_after(self):
+        """Test that cron expressions find the next matching minute"""
+        weekdays = CronSchedule.parse("0 9 * * 1-5")
+        # Saturday evening to Monday morning
+        assert weekdays.next_after(datetime.datetime(2026, 10, 17, 18, 0)) == datetime.datetime(
+            2026, 10, 19, 9, 0
+        )
+        every_quarter = CronSchedule.parse("*/15 * * * *")
+        assert every_quarter.next_after(
+            datetime.datetime(2026, 10, 19, 10, 15)
+        ) == datetime.datetime(2026, 10, 19, 10, 30)
+        # Day and weekday both restricted: either matches (the 1st or a Sunday)
+        either = CronSchedule.parse("0 12 1 * 0")
+        assert either.next_after(datetime.datetime(2026, 10, 19)) == datetime.datetime(
+            2026, 10, 25, 12, 0
+        )
+        assert CronSchedule.parse("0 0 29 2 *").next_after(
+            datetime.datetime(2026, 3, 1)
+        ) == datetime.datetime(2028, 2, 29)
+        for expression in ("* * *", "60 * * * *", "*/0 * * * *", "a * * * *"):
+            with pytest.raises(ValueError):
+                validation.validate_recurrence(expression)
+
+    def test_pop_due_in_order_and_reschedule(self):
+        """Test that due messages come off the heap earliest first and recur"""
+        now = datetime.datetime(2026, 10, 19, 9, 0)
+        scheduler = MessageScheduler("skip")
+        scheduler.load(
+            [
+                ScheduledMessage(1, "Daily", recurrence="30 9 * * *", created_at=now),
+                ScheduledMessage(2, "Once", send_at=now + datetime.timedelta(minutes=10)),
+                ScheduledMessage(
+                    3, "Expired", send_at=now + datetime.timedelta(hours=1),
+                    active_until=now,
+                ),
+            ],
+            now,
+            version=1,
+        )
+        assert len(scheduler) == 2
+        assert scheduler.pop_due(now) == []
+        later = now + datetime.timedelta(hours=1)
+        due = scheduler.pop_due(later)
+        assert [(message.id, occurrence.minute) for message, occurrence in due] == [
+            (2, 10), (1, 30)
+        ]
+        for message, occurrence in due:
+            scheduler.complete(message.id, occurrence, later)
+        # The one-shot message is done, the daily one is due tomorrow
+        assert len(scheduler) == 1
+        assert scheduler.next_due_at() == datetime.datetime(2026, 10, 20, 9, 30)
+
+    @pytest.mark.parametrize(
+        "policy,expected", [("skip", 0), ("once", 1), ("all", 4)]
+    )
+    def test_catch_up_policies(self, policy, expected):
+        """Test how occurrences missed while stopped are handled"""
+        now = datetime.datetime(2026, 10, 19, 12, 30)
+        message = ScheduledMessage(
+            1, "Hourly", recurrence="0 * * * *",
+            last_run_at=datetime.datetime(2026, 10, 19, 8, 0),
+        )
+        scheduler = MessageScheduler(policy)
+        scheduler.load([message], now)
+        sent = 0
+        while True:
+            due = scheduler.pop_due(now)
+            if not due:
+                break
+            for item, occurrence in due:
+                scheduler.complete(item.id, occurrence, now)
+                sent += 1
+        # 09:00 to 12:00 were missed
+        assert sent == expected
+        assert scheduler.next_due_at() == datetime.datetime(2026, 10, 19, 13, 0)
+
+    def test_engine_sends_due_messages_outside_the_cycle(self):
+        """Test that due messages go to every group without moving the cycle position"""
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock()
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        cycle = SnapshotData(
+            data_version=0, config_version=0, groups=[(1, "@one")], last_group_id=1
+        )
+        userbot._snapshot = cycle
+        change_log_repo = MagicMock()
+        change_log_repo.get_current_version.return_value = 7
+        message_repo = MagicMock()
+        message_repo.get_scheduled_messages.return_value = [
+            MagicMock(
+                id=5, text="Sale today", send_at=datetime.datetime(2026, 10, 19, 8, 0),
+                recurrence=None, active_from=None, active_until=None, last_run_at=None,
+                created_at=None,
+            )
+        ]
+        inputs = SnapshotData(
+            data_version=7, config_version=0, groups=[(1, "@one"), (2, "@two")],
+            messages=[(9, "Regular")],
+        )
+        # The schedule is only changed on the event loop's thread
+        scheduler_threads = set()
+        for name in ("load", "pop_due", "complete"):
+            method = getattr(userbot.scheduler, name)
+
+            def record(*args, _method=method, **kwargs):
+                scheduler_threads.add(threading.current_thread())
+                return _method(*args, **kwargs)
+
+            setattr(userbot.scheduler, name, record)
+        with patch.object(userbot, "_read_cycle_inputs", return_value=inputs), patch.object(
+            userbot, "flush_blacklist", AsyncMock()
+        ), patch("app.core.userbot.ChangeLogRepository", return_value=change_log_repo), patch(
+            "app.core.userbot.MessageRepository", return_value=message_repo
+        ):
+            assert asyncio.run(userbot.run_scheduled_messages()) == 1
+            # Sent once, then off the schedule
+            assert asyncio.run(userbot.run_scheduled_messages()) == 0
+        assert scheduler_threads == {threading.main_thread()}
+        sent = [c.args for c in userbot.client.send_message.await_args_list]
+        assert sent == [("@one", "Sale today"), ("@two", "Sale today")]
+        message_repo.set_last_run.assert_called_once()
+        assert userbot._snapshot is cycle and cycle.last_group_id == 1
+        userbot.db.close()
+
+    def test_cycle_checks_the_schedule_between_groups(self):
+        """Test that a long cycle does not hold up scheduled messages until it ends"""
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock()
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        inputs = SnapshotData(
+            data_version=0, config_version=0, groups=[(1, "@one"), (2, "@two")],
+            messages=[(9, "Regular")],
+        )
+        with patch.object(userbot, "save_snapshot"), patch.object(
+            userbot, "run_scheduled_messages", AsyncMock(return_value=0)
+        ) as run_scheduled:
+            asyncio.run(userbot.send_messages_to_groups(inputs))
+        assert run_scheduled.await_count == 2
+        userbot.db.close()
+
+    def test_cycle_leaves_out_scheduled_and_inactive_messages(self):
+        """Test that the cycle reads unscheduled messages and honours their windows"""
+        db = SessionLocal()
+        try:
+            repo = MessageRepository(db)
+            past = datetime.datetime(2020, 1, 1)
+            regular = repo.create_message("Regular message")
+            scheduled = repo.create_message("Scheduled message", recurrence="0 9 * * *")
+            expired = repo.create_message("Expired message", active_until=past)
+            cycle_ids = {message.id for message in repo.get_cycle_messages()}
+            assert regular.id in cycle_ids and expired.id in cycle_ids
+            assert scheduled.id not in cycle_ids
+            assert scheduled.id in {message.id for message in repo.get_scheduled_messages()}
+            repo.set_last_run(scheduled.id, past)
+            db.refresh(scheduled)
+            assert scheduled.last_run_at == past
+            for message in (regular, scheduled, expired):
+                repo.delete_message(message.id)
+        finally:
+            db.close()
+
+        with patch("app.core.userbot.SessionManager"):
+            userbot = TelegramUserbot()
+        userbot.client = MagicMock(is_connected=True)
+        userbot.client.send_message = AsyncMock()
+        userbot.config["message_interval"] = (0, 0)
+        userbot.is_running = True
+        inputs = SnapshotData(
+            data_version=0,
+            config_version=0,
+            groups=[(1, "@one")],
+            messages=[(1, "Current", None, None), (2, "Expired", None, 1_000_000.0)],
+        )
+        with patch.object(userbot, "save_snapshot"):
+            asyncio.run(userbot.send_messages_to_groups(inputs))
+        sent = [c.args for c in userbot.client.send_message.await_args_list]
+        assert sent == [("@one", "Current")]
+        userbot.db.close()
+
+
+class TestEventBus:
+    """Test EventBus class"""
+
+    def test_publish_reaches_subscribers(self):
+        """Test that published events are delivered in order"""
+        bus = EventBus()
+        subscription = bus.subscribe()
+        bus.publish("send", group="@a", status="sent")
+        bus.publish("send", group="@b", status="sent")
+
+        async def drain():
+            return [await subscription.get(timeout=1) for _ in range(2)]
+
+        events = asyncio.run(drain())
+        assert [e.data["group"] for e in events] == ["@a", "@b"]
+
+    def test_coalesces_status_events(self):
+        """Test that pending status events are replaced by newer ones"""
+        bus = EventBus()
+        subscription = bus.subscribe()
+        bus.publish("status", running=True)
+        bus.publish("status", running=False)
+
+        assert len(subscription) == 1
+        event = asyncio.run(subscription.get(timeout=1))
+        assert event.data["running"] is False
+
+    def test_slow_subscriber_drops_oldest(self):
+        """Test that a full queue drops the oldest events"""
+        bus = EventBus(queue_size=3)
+        subscription = bus.subscribe()
+        for i in range(5):
+            bus.publish("send", message_id=i)
+
+        assert len(subscription) == 3
+        assert subscription.dropped == 2
+        event = asyncio.run(subscription.get(timeout=1))
+        assert event.data["message_id"] == 2
+
+    def test_new_subscriber_receives_latest_status(self):
+        """Test that the latest status is replayed on subscribe"""
+        bus = EventBus()
+        bus.publish("status", running=True)
+        subscription = bus.subscribe()
+
+        event = asyncio.run(subscription.get(timeout=1))
+        assert event.type == "status"
+        assert "event: status" in event.to_sse()
+
+    def test_get_times_out(self):
+        """Test that get returns None when no event arrives"""
+        subscription = EventBus().subscribe()
+        assert asyncio.run(subscription.get(timeout=0.01)) is None
+
+
+class TestReadCache:
+    """Test ReadCache class"""
+
+    def test_commit_bumps_table_version(self):
+        """Test that committed writes bump the table version"""
+        before = table_versions.get("config")
+        with SessionLocal() as db:
+            ConfigRepository(db).set_config("read_cache_test", "1")
+        assert table_versions.get("config") == before + 1
+
+    def test_concurrent_requests_share_one_load(self):
+        """Test that concurrent identical requests run the loader once"""
+        cache = ReadCache(TableVersions())
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return {"items": [1, 2, 3]}
+
+        async def run():
+            return await asyncio.gather(
+                *(cache.get("items", ("items",), loader) for _ in range(10))
+            )
+
+        entries = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(e.body == b'{"items":[1,2,3]}' for e in entries)
+
+    def test_version_change_reloads(self):
+        """Test that a version bump invalidates the cached entry"""
+        versions = TableVersions()
+        cache = ReadCache(versions)
+        payloads = iter([{"v": 1}, {"v": 2}])
+
+        first = asyncio.run(cache.get("items", ("items",), lambda: next(payloads)))
+        versions.bump("items")
+        second = asyncio.run(cache.get("items", ("items",), lambda: next(payloads)))
+
+        assert first.body != second.body
+        assert first.etag != second.etag
+
+    def test_write_by_another_worker_invalidates(self):
+        """Test that versions are shared through the database, not per process"""
+        other_worker = create_engine(str(engine.url))
+        cache = ReadCache(table_versions)
+        payloads = iter([{"v": 1}, {"v": 2}])
+        try:
+            asyncio.run(cache.get("shared", ("config",), lambda: next(payloads)))
+            with other_worker.begin() as connection:
+                bump_table_versions(connection, ("config",))
+            second = asyncio.run(cache.get("shared", ("config",), lambda: next(payloads)))
+        finally:
+            other_worker.dispose()
+        assert second.body == b'{"v":2}'
+
+
+class TestSerialization:
+    """Test JSON encoding and response compression"""
+
+    def test_dumps_fallback_matches_orjson(self):
+        """Test that the standard library fallback encodes like orjson"""
+        payload = {
+            "text": "Привет",
+            "at": datetime.datetime(2026, 10, 19, 12, 30),
+            "items": [1, None, True],
+        }
+        fast = serialization.dumps(payload)
+        with patch.object(serialization, "orjson", None):
+            fallback = serialization.dumps(payload)
+            with pytest.raises(TypeError):
+                serialization.dumps({"value": object()})
+        assert json.loads(fallback) == json.loads(fast)
+        assert b'"2026-10-19T12:30:00"' in fallback
+
+    def test_compression_negotiation(self):
+        """Test that bodies are compressed with an encoding the client accepts"""
+        def request(accept_encoding):
+            headers = [(b"accept-encoding", accept_encoding.encode())]
+            return Request({"type": "http", "headers": headers})
+
+        large = serialization.CompressedBody(b'{"items":[' + b"1," * 2000 + b"1]}")
+        small = serialization.CompressedBody(b'{"items":[]}')
+
+        assert small.encode("gzip") == (small.body, None)
+        assert large.encode("identity") == (large.body, None)
+        content, encoding = large.encode("br;q=1.0, gzip;q=0.8")
+        assert encoding == ("br" if serialization.brotli is not None else "gzip")
+        with patch.object(serialization, "brotli", None):
+            content, encoding = large.encode("br, gzip")
+        assert encoding == "gzip" and gzip.decompress(content) == large.body
+        # Compressed variants are computed once per body
+        assert large.encode("gzip")[0] is content
+
+        response = serialization.compressed_response(request("gzip"), large, {"ETag": '"x"'})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == '"x"'
+        response = serialization.compressed_response(request(""), large.body)
+        assert "content-encoding" not in response.headers
+        assert response.body == large.body
+
+
+class TestLeaderElection:
+    """Test leader lock and control channel"""
+
+    def test_file_lock_is_exclusive(self, tmp_path):
+        """Test that only one holder can take the leader file lock"""
+        path = str(tmp_path / "leader.lock")
+        first, second = FileLeaderLock(path), FileLeaderLock(path)
+
+        assert first.try_acquire() is True
+        assert second.try_acquire() is False
+        first.release()
+        assert second.try_acquire() is True
+        second.release()
+
+    def test_follower_forwards_commands_to_leader(self):
+        """Test that a non-leader runs commands through the leader"""
+        leader, follower = ControlChannel(SessionLocal), ControlChannel(SessionLocal)
+
+        @leader.handler("double")
+        async def double(value: int):
+            return value * 2
+
+        @leader.handler("fail")
+        async def fail():
+            raise Exception("engine error")
+
+        async def run():
+            leader.start(is_leader=True)
+            follower.is_leader = False
+            try:
+                result = await follower.dispatch("double", value=21)
+                with pytest.raises(ControlError, match="engine error"):
+                    await follower.dispatch("fail")
+                return result
+            finally:
+                await leader.stop()
+
+        assert asyncio.run(run()) == 42
+
+    @patch("app.api.routes.userbot")
+    def test_config_update_on_follower_reaches_leader(self, mock_userbot):
+        """Test that a config change made on a follower is applied by the leader"""
+        # The leader serves from its own thread and loop, like another worker
+        leader = ControlChannel(SessionLocal)
+        leader._handlers = dict(engine_control._handlers)
+        applied = []
+
+        def update_config(key, value):
+            applied.append((key, value, threading.get_ident()))
+            return True
+
+        mock_userbot.update_config.side_effect = update_config
+        loop = asyncio.new_event_loop()
+        leader_thread = threading.Thread(target=loop.run_forever, daemon=True)
+        leader_thread.start()
+        loop.call_soon_threadsafe(leader.start, True)
+        try:
+            with patch.object(engine_control, "is_leader", False):
+                response = client.post(
+                    "/api/v1/config", json={"key": "message_interval", "value": "7-9"}
+                )
+            assert response.status_code == 200
+            assert response.json()["message"] == "Configuration updated successfully"
+            assert applied == [("message_interval", "7-9", leader_thread.ident)]
+        finally:
+            asyncio.run_coroutine_threadsafe(leader.stop(), loop).result(timeout=5)
+            loop.call_soon_threadsafe(loop.stop)
+            leader_thread.join(timeout=1)
+            loop.close()
+
+    def test_follower_relays_leader_events(self):
+        """Test that cycle and send events reach the event bus of other workers"""
+        leader, follower = ControlChannel(SessionLocal), ControlChannel(SessionLocal)
+        leader.set_state_provider(lambda: {"running": True, "message": "Userbot is running"})
+        leader_bus, follower_bus = EventBus(), EventBus()
+
+        def heartbeat():
+            with patch("app.core.control.event_bus", leader_bus):
+                asyncio.run(leader._write_state())
+
+        def follow():
+            with patch("app.core.control.event_bus", follower_bus):
+                asyncio.run(follower._follow())
+
+        leader_bus.publish("send", group="@old", message_id=1, status="sent")
+        heartbeat()
+        follow()
+        # Only the status: events from before following are not replayed
+        assert [e.type for e in follower_bus.recent()] == ["status"]
+        assert follower_bus.latest("status").data["running"] is True
+
+        leader_bus.publish("cycle", phase="progress", groups_done=1, groups_total=2)
+        leader_bus.publish("send", group="@new", message_id=1, status="sent")
+        heartbeat()
+        follow()
+        follow()
+        relayed = follower_bus.recent()[1:]
+        assert [(e.type, e.data.get("group")) for e in relayed] == [
+            ("cycle", None),
+            ("send", "@new"),
+        ]
+
+    def test_unserved_command_expires_without_leader(self):
+        """Test that command arguments are encrypted and cleared once expired"""
+        follower = ControlChannel(SessionLocal)
+        follower.is_leader = False
+        with SessionLocal() as db:
+            command_id = ControlCommandRepository(db).create_command(
+                "sign_in_password", encrypt_arguments({"password": "hunter2"})
+            )
+            stored = ControlCommandRepository(db).get_by_id(command_id)
+            assert "hunter2" not in stored.arguments
+            assert decrypt_arguments(stored.arguments) == {"password": "hunter2"}
+            stored.created_at = datetime.datetime.utcnow() - datetime.timedelta(
+                seconds=CONTROL_TIMEOUT + 1
+            )
+            db.commit()
+
+        assert asyncio.run(follower._expire_stale()) >= 1
+
+        with SessionLocal() as db:
+            stored = ControlCommandRepository(db).get_by_id(command_id)
+            assert stored.status == "expired"
+            assert stored.arguments is None
+
+
+class TestRateLimiter:
+    """Test GCRA rate limit backends"""
+
+    @pytest.mark.parametrize("backend_name", ["memory", "database"])
+    def test_limit_enforced(self, backend_name):
+        """Test that requests beyond the limit are denied until quota returns"""
+        backend = MemoryBackend() if backend_name == "memory" else DatabaseBackend(engine)
+        item = RateLimitItem.parse("3/minute")
+        key = f"test:{backend_name}:{os.getpid()}:{id(backend)}"
+        now = 1_000_000.0
+
+        results = [backend.hit(key, item, now) for _ in range(4)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert [r.remaining for r in results[:3]] == [2, 1, 0]
+        assert results[3].retry_after == pytest.approx(20.0)
+
+        # One emission interval later a single request is allowed again
+        assert backend.hit(key, item, now + 20).allowed is True
+        assert backend.hit(key, item, now + 20).allowed is False
+
+    def test_parse_limit(self):
+        """Test parsing of limit strings"""
+        assert RateLimitItem.parse("100/minute") == RateLimitItem(100, 60)
+        assert RateLimitItem.parse("5 per hour") == RateLimitItem(5, 3600)
+        with pytest.raises(ValueError):
+            RateLimitItem.parse("fast")
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
+
+
+BOT_TOKEN = "123456:test-bot-token"
+
+
+def make_init_data(user_id=42, auth_date=None, bot_token=BOT_TOKEN):
+    """Build initData signed the way Telegram signs it"""
+    fields = {
+        "auth_date": str(int(auth_date if auth_date is not None else time.time())),
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps({"id": user_id, "first_name": "Test", "username": "testuser"}),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+class TestWebAppAuth:
+    """Test cases for Telegram Mini App authentication"""
+
+    def test_verify_init_data(self):
+        user = verify_init_data(make_init_data(user_id=7), BOT_TOKEN)
+        assert user.id == 7
+        assert user.username == "testuser"
+
+    def test_verify_init_data_rejects_tampering_and_age(self):
+        with pytest.raises(WebAppAuthError):
+            verify_init_data(make_init_data(bot_token="other:token"), BOT_TOKEN)
+        with pytest.raises(WebAppAuthError):
+            verify_init_data(make_init_data(auth_date=time.time() - 2 * 86400), BOT_TOKEN)
+
+    def test_token_roundtrip_and_cache(self):
+        auth = WebAppAuthenticator(BOT_TOKEN, "secret", allowed_user_ids=[7], cache_size=2)
+        token = auth.login(make_init_data(user_id=7))["access_token"]
+        assert auth.authenticate(token) == 7
+
+        # Another worker verifies the signature once, then serves from its cache
+        other = WebAppAuthenticator(BOT_TOKEN, "secret", allowed_user_ids=[7], cache_size=2)
+        assert other.authenticate(token) == 7
+        assert token in other._cache
+
+        auth.issue_token(8)
+        auth.issue_token(9)
+        assert len(auth._cache) == 2
+        assert auth.authenticate(token) == 7
+
+        with pytest.raises(WebAppAuthError):
+            WebAppAuthenticator(BOT_TOKEN, "wrong").authenticate(token)
+
+    def test_expired_and_disallowed_tokens(self):
+        auth = WebAppAuthenticator(BOT_TOKEN, "secret", token_ttl=-1)
+        with pytest.raises(WebAppAuthError):
+            auth.authenticate(auth.issue_token(7))
+
+        restricted = WebAppAuthenticator(BOT_TOKEN, "secret", allowed_user_ids=[1])
+        with pytest.raises(WebAppAuthError):
+            restricted.login(make_init_data(user_id=7))
+
+        # An empty allowlist lets nobody in rather than everybody
+        unrestricted = WebAppAuthenticator(BOT_TOKEN, "secret")
+        with pytest.raises(WebAppAuthError):
+            unrestricted.login(make_init_data(user_id=7))
+        with pytest.raises(WebAppAuthError):
+            unrestricted.authenticate(restricted.issue_token(7))
+
+
+@patch("app.api.routes.userbot")
+def test_webapp_auth_required_when_configured(mock_userbot):
+    """Requests need a token once a bot token is configured"""
+    with patch.object(webapp_auth, "bot_token", BOT_TOKEN), patch.object(
+        webapp_auth, "allowed_user_ids", frozenset({7})
+    ):
+        assert client.get("/health").status_code == 200
+        assert client.get("/api/v1/groups").status_code == 401
+
+        response = client.post(
+            "/api/v1/auth/webapp", json={"init_data": make_init_data(user_id=7)}
+        )
+        assert response.status_code == 200
+        token = response.json()["access_token"]
+
+        response = client.get(
+            "/api/v1/groups", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+        assert client.get(f"/api/v1/groups?access_token={token}").status_code == 200
+
+        response = client.post(
+            "/api/v1/auth/webapp", json={"init_data": make_init_data(bot_token="x:y")}
+        )
+        assert response.status_code == 401
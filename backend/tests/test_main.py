@@ -4,6 +4,8 @@ Test file for the Telegram Userbot backend
 
 import pytest
 import os
+import subprocess
+import sys
 from fastapi.testclient import TestClient
 
 # Set test environment variables before importing app
@@ -16,6 +18,10 @@ from app.main import app
 
 client = TestClient(app)
 
+# Optional upper bound in seconds for importing app.main (measured around
+# 0.7 s); off by default, as timings on shared CI runners vary too much
+IMPORT_TIME_BUDGET = os.environ.get("IMPORT_TIME_BUDGET")
+
 
 def test_root_endpoint():
     """Test the root endpoint"""
@@ -31,5 +37,34 @@ def test_health_endpoint():
     assert response.json() == {"status": "healthy"}
 
 
+def test_app_import_is_side_effect_free(tmp_path):
+    """Importing the app must not load pyrogram or create the database"""
+    database = tmp_path / "import_check.db"
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}")
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import sys, app.main; print('pyrogram' in sys.modules)",
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "False"
+    assert not database.exists()
+
+    if IMPORT_TIME_BUDGET:
+        # Last line of -X importtime: "import time: self | cumulative | app.main"
+        lines = [line for line in result.stderr.splitlines() if line.endswith("| app.main")]
+        cumulative_us = int(lines[-1].split("|")[1])
+        assert cumulative_us / 1e6 < float(IMPORT_TIME_BUDGET)
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
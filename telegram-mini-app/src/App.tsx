@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import WebApp from '@twa-dev/sdk';
 import './App.css';
 import { UserbotStatus } from './types';
+import { apiFetch, getAccessToken } from './api';
 import DashboardSection from './components/DashboardSection';
 import AuthSection from './components/AuthSection';
 import GroupsSection from './components/GroupsSection';
@@ -29,10 +30,36 @@ function App() {
     checkStatus();
   }, []);
 
+  // Subscribe to live userbot status updates instead of polling
+  useEffect(() => {
+    let events: EventSource | null = null;
+    let closed = false;
+
+    // EventSource cannot send headers, so the token goes in the query string
+    getAccessToken().then((token) => {
+      if (closed) {
+        return;
+      }
+      const query = token ? `?access_token=${encodeURIComponent(token)}` : '';
+      events = new EventSource(`/api/v1/userbot/events${query}`);
+
+      events.addEventListener('status', (event) => {
+        const data: UserbotStatus = JSON.parse((event as MessageEvent).data);
+        setUserbotStatus(data.running ? 'Running' : 'Stopped');
+      });
+      events.onerror = () => setUserbotStatus('Unknown');
+    });
+
+    return () => {
+      closed = true;
+      events?.close();
+    };
+  }, []);
+
   const checkStatus = async (): Promise<void> => {
     try {
       // Check API status
-      const apiResponse = await fetch('/api/v1/health');
+      const apiResponse = await apiFetch('/api/v1/health');
       if (apiResponse.ok) {
         setApiStatus('Connected');
       } else {
@@ -40,7 +67,7 @@ function App() {
       }
       
       // Check userbot status
-      const userbotResponse = await fetch('/api/v1/userbot/status');
+      const userbotResponse = await apiFetch('/api/v1/userbot/status');
       if (userbotResponse.ok) {
         const data: UserbotStatus = await userbotResponse.json();
         setUserbotStatus(data.running ? 'Running' : 'Stopped');
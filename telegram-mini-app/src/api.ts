@@ -0,0 +1,53 @@
+// Authenticated access to the backend API
+
+import WebApp from '@twa-dev/sdk';
+
+interface WebAppToken {
+  access_token: string;
+  expires_in: number;
+}
+
+let accessToken: string | null = null;
+let expiresAt = 0;
+let pendingLogin: Promise<string | null> | null = null;
+
+// Exchange the signed initData for a short-lived access token
+const login = async (): Promise<string | null> => {
+  if (!WebApp.initData) {
+    return null;
+  }
+  const response = await fetch('/api/v1/auth/webapp', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ init_data: WebApp.initData }),
+  });
+  if (!response.ok) {
+    return null;
+  }
+  const data: WebAppToken = await response.json();
+  accessToken = data.access_token;
+  // Renew a minute before the token expires
+  expiresAt = Date.now() + (data.expires_in - 60) * 1000;
+  return accessToken;
+};
+
+export const getAccessToken = async (): Promise<string | null> => {
+  if (accessToken && Date.now() < expiresAt) {
+    return accessToken;
+  }
+  if (!pendingLogin) {
+    pendingLogin = login().finally(() => {
+      pendingLogin = null;
+    });
+  }
+  return pendingLogin;
+};
+
+export const apiFetch = async (url: string, init: RequestInit = {}): Promise<Response> => {
+  const token = await getAccessToken();
+  const headers = new Headers(init.headers);
+  if (token) {
+    headers.set('Authorization', `Bearer ${token}`);
+  }
+  return fetch(url, { ...init, headers });
+};
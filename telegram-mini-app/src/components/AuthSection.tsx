@@ -1,6 +1,7 @@
 import { useState } from 'react';
 import WebApp from '@twa-dev/sdk';
 import { ActiveSection } from '../types';
+import { apiFetch } from '../api';
 
 interface AuthSectionProps {
   navigateTo: (section: ActiveSection) => void;
@@ -22,7 +23,7 @@ export default function AuthSection({ navigateTo }: AuthSectionProps) {
 
     setLoading(true);
     try {
-      const response = await fetch('/api/v1/auth/send-code', {
+      const response = await apiFetch('/api/v1/auth/send-code', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -54,7 +55,7 @@ export default function AuthSection({ navigateTo }: AuthSectionProps) {
 
     setLoading(true);
     try {
-      const response = await fetch('/api/v1/auth/sign-in', {
+      const response = await apiFetch('/api/v1/auth/sign-in', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -92,7 +93,7 @@ export default function AuthSection({ navigateTo }: AuthSectionProps) {
 
     setLoading(true);
     try {
-      const response = await fetch('/api/v1/auth/sign-in-password', {
+      const response = await apiFetch('/api/v1/auth/sign-in-password', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import WebApp from '@twa-dev/sdk';
 import { BlacklistedChat } from '../types';
 import { ActiveSection } from '../types';
+import { apiFetch } from '../api';
 
 interface BlacklistSectionProps {
   navigateTo: (section: ActiveSection) => void;
@@ -12,7 +13,7 @@ export default function BlacklistSection({ navigateTo }: BlacklistSectionProps)
 
   const fetchBlacklist = async (): Promise<void> => {
     try {
-      const response = await fetch('/api/v1/blacklist');
+      const response = await apiFetch('/api/v1/blacklist');
       if (response.ok) {
         const data = await response.json();
         setBlacklistedChats(data.blacklisted_chats);
@@ -28,7 +29,7 @@ export default function BlacklistSection({ navigateTo }: BlacklistSectionProps)
 
   const handleRemoveFromBlacklist = async (chatId: string): Promise<void> => {
     try {
-      const response = await fetch(`/api/v1/blacklist/${chatId}`, {
+      const response = await apiFetch(`/api/v1/blacklist/${chatId}`, {
         method: 'DELETE'
       });
 
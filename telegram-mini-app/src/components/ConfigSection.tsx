@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import WebApp from '@twa-dev/sdk';
 import { Config } from '../types';
 import { ActiveSection } from '../types';
+import { apiFetch } from '../api';
 
 interface ConfigSectionProps {
   navigateTo: (section: ActiveSection) => void;
@@ -14,7 +15,7 @@ export default function ConfigSection({ navigateTo }: ConfigSectionProps) {
 
   const fetchConfig = async (): Promise<void> => {
     try {
-      const response = await fetch('/api/v1/config');
+      const response = await apiFetch('/api/v1/config');
       if (response.ok) {
         const data = await response.json();
         const messageIntervalConfig = data.config.find((c: Config) => c.key === 'message_interval');
@@ -40,7 +41,7 @@ export default function ConfigSection({ navigateTo }: ConfigSectionProps) {
     setLoading(true);
     try {
       // Save message interval
-      const messageResponse = await fetch('/api/v1/config', {
+      const messageResponse = await apiFetch('/api/v1/config', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -52,7 +53,7 @@ export default function ConfigSection({ navigateTo }: ConfigSectionProps) {
       });
 
       // Save cycle interval
-      const cycleResponse = await fetch('/api/v1/config', {
+      const cycleResponse = await apiFetch('/api/v1/config', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -1,6 +1,7 @@
 import { useEffect } from 'react';
 import WebApp from '@twa-dev/sdk';
 import { ActiveSection } from '../types';
+import { apiFetch } from '../api';
 
 interface DashboardSectionProps {
   apiStatus: string;
@@ -23,7 +24,7 @@ export default function DashboardSection({ apiStatus, userbotStatus, navigateTo,
 
   const handleUserbotAction = async (action: 'start' | 'stop'): Promise<void> => {
     try {
-      const response = await fetch(`/api/v1/userbot/${action}`, {
+      const response = await apiFetch(`/api/v1/userbot/${action}`, {
         method: 'POST'
       });
       
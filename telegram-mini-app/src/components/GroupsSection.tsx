@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import WebApp from '@twa-dev/sdk';
 import { Group } from '../types';
 import { ActiveSection } from '../types';
+import { apiFetch } from '../api';
 
 interface GroupsSectionProps {
   navigateTo: (section: ActiveSection) => void;
@@ -14,7 +15,7 @@ export default function GroupsSection({ navigateTo }: GroupsSectionProps) {
 
   const fetchGroups = async (): Promise<void> => {
     try {
-      const response = await fetch('/api/v1/groups');
+      const response = await apiFetch('/api/v1/groups');
       if (response.ok) {
         const data = await response.json();
         setGroups(data.groups);
@@ -36,7 +37,7 @@ export default function GroupsSection({ navigateTo }: GroupsSectionProps) {
 
     setLoading(true);
     try {
-      const response = await fetch('/api/v1/groups', {
+      const response = await apiFetch('/api/v1/groups', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -61,7 +62,7 @@ export default function GroupsSection({ navigateTo }: GroupsSectionProps) {
 
   const handleRemoveGroup = async (identifier: string): Promise<void> => {
     try {
-      const response = await fetch(`/api/v1/groups/${identifier}`, {
+      const response = await apiFetch(`/api/v1/groups/${identifier}`, {
         method: 'DELETE'
       });
 
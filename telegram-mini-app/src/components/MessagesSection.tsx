@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import WebApp from '@twa-dev/sdk';
 import { Message } from '../types';
 import { ActiveSection } from '../types';
+import { apiFetch } from '../api';
 
 interface MessagesSectionProps {
   navigateTo: (section: ActiveSection) => void;
@@ -14,7 +15,7 @@ export default function MessagesSection({ navigateTo }: MessagesSectionProps) {
 
   const fetchMessages = async (): Promise<void> => {
     try {
-      const response = await fetch('/api/v1/messages');
+      const response = await apiFetch('/api/v1/messages');
       if (response.ok) {
         const data = await response.json();
         setMessages(data.messages);
@@ -36,7 +37,7 @@ export default function MessagesSection({ navigateTo }: MessagesSectionProps) {
 
     setLoading(true);
     try {
-      const response = await fetch('/api/v1/messages', {
+      const response = await apiFetch('/api/v1/messages', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -61,7 +62,7 @@ export default function MessagesSection({ navigateTo }: MessagesSectionProps) {
 
   const handleRemoveMessage = async (messageId: number): Promise<void> => {
     try {
-      const response = await fetch(`/api/v1/messages/${messageId}`, {
+      const response = await apiFetch(`/api/v1/messages/${messageId}`, {
         method: 'DELETE'
       });
 